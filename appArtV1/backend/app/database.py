@@ -1,18 +1,242 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, Delete, Insert, Update
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as WriteTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.util import await_only
+import asyncio
 import os
+import threading
+import time
+from typing import Dict, Optional
 from decouple import config
 
 # Database URL - using SQLite for now
 DATABASE_URL = config("DATABASE_URL", default="sqlite:///./app_art.db")
+IS_SQLITE = make_url(DATABASE_URL).get_backend_name() == "sqlite"
+
+# Production SQLite profile: WAL journaling, tuned pragmas, a pool of read-only
+# connections and one writer at a time, which write bursts queue up for
+SQLITE_PRODUCTION = IS_SQLITE and config("SQLITE_PRODUCTION", default=False, cast=bool)
+SQLITE_READ_POOL_SIZE = config("SQLITE_READ_POOL_SIZE", default=8, cast=int)
+# Seconds a write waits for its turn on the writer before failing
+SQLITE_WRITE_TIMEOUT = config("SQLITE_WRITE_TIMEOUT", default=30.0, cast=float)
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",       # durable at checkpoints; safe with WAL
+    "cache_size": -64000,          # 64 MiB page cache per connection
+    "mmap_size": 268435456,        # 256 MiB memory-mapped reads
+    "busy_timeout": 5000,          # ms; covers writers in other processes
+    "temp_store": "MEMORY",
+}
+
+def _apply_pragmas(engine, read_only: bool = False):
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+def _pool_args(writer: bool, is_async: bool = False) -> dict:
+    if not SQLITE_PRODUCTION:
+        return {}
+    pool = {"poolclass": AsyncAdaptedQueuePool if is_async else QueuePool, "max_overflow": 0}
+    if writer:
+        return {**pool, "pool_size": 1, "pool_timeout": SQLITE_WRITE_TIMEOUT}
+    return {**pool, "pool_size": SQLITE_READ_POOL_SIZE}
 
 # For SQLite, we need to add connect_args
 engine = create_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
+    connect_args={"check_same_thread": False} if IS_SQLITE else {},
+    **_pool_args(writer=True)
+)
+read_engine = engine
+
+if SQLITE_PRODUCTION:
+    _apply_pragmas(engine)
+    read_engine = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        **_pool_args(writer=False)
+    )
+    _apply_pragmas(read_engine, read_only=True)
+
+
+class WriteLock:
+    """The single-writer queue shared by the sync and async sessions.
+
+    A plain ``threading.Lock`` is held from a session's first write until its
+    transaction ends. Sync sessions block on it in their worker thread; async
+    sessions wait for it in the default executor so the event loop keeps
+    running. ``Lock`` (unlike ``RLock``) may be released from any thread.
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self._lock.acquire(timeout=self.timeout):
+            raise WriteTimeoutError(f"Timed out after {self.timeout}s waiting for the SQLite writer")
+
+    async def acquire_async(self):
+        if self._lock.acquire(blocking=False):
+            return
+        waiter = asyncio.get_running_loop().run_in_executor(None, self.acquire)
+        try:
+            await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            # The thread may still win the lock after we stop waiting; give it back
+            waiter.add_done_callback(lambda done: done.exception() is None and self.release())
+            raise
+
+    def release(self):
+        self._lock.release()
+
+write_lock = WriteLock(SQLITE_WRITE_TIMEOUT)
+
+
+class RoutingSession(Session):
+    """Session that reads through ``reader`` and writes through ``writer``.
+
+    Flushes and INSERT/UPDATE/DELETE statements go to the writer, and so does
+    everything after them until the transaction ends, so a handler always
+    reads its own uncommitted changes. The first write of a transaction takes
+    :data:`write_lock`, which is held until commit or rollback.
+    """
+    reader = read_engine
+    writer = engine
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if not self.info.get("wrote") and (self._flushing or isinstance(clause, (Insert, Update, Delete))):
+            self._acquire_write_lock()
+            self.info["wrote"] = True
+        return self.writer if self.info.get("wrote") else self.reader
+
+    def _acquire_write_lock(self):
+        write_lock.acquire()
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _reset_write_routing(session, transaction):
+    if transaction.parent is None and session.info.pop("wrote", None):
+        write_lock.release()
+
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False,
+    **({"class_": RoutingSession} if SQLITE_PRODUCTION else {"bind": engine})
+)
+
+# Async driver for the same database, used by the async routers so queries
+# don't block the event loop: aiosqlite for SQLite, asyncpg for PostgreSQL
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def to_async_url(url: str) -> str:
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend!r} databases")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+# Only derived when not set explicitly, so backends without a mapping above can
+# still be used by providing the URL
+ASYNC_DATABASE_URL = config("ASYNC_DATABASE_URL", default="") or to_async_url(DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_args(writer=True, is_async=True))
+async_read_engine = async_engine
+
+if SQLITE_PRODUCTION:
+    _apply_pragmas(async_engine.sync_engine)
+    async_read_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_args(writer=False, is_async=True))
+    _apply_pragmas(async_read_engine.sync_engine, read_only=True)
+
+class AsyncRoutingSession(RoutingSession):
+    reader = async_read_engine.sync_engine
+    writer = async_engine.sync_engine
+
+    def _acquire_write_lock(self):
+        # Runs inside the AsyncSession's greenlet, so the wait can be awaited
+        await_only(write_lock.acquire_async())
+
+AsyncSessionLocal = async_sessionmaker(
+    class_=AsyncSession, autoflush=False, expire_on_commit=False,
+    **({"sync_session_class": AsyncRoutingSession} if SQLITE_PRODUCTION else {"bind": async_engine})
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Read replica for the read-heavy endpoints (feed, artist portfolios, user
+# search, notification lists); any backend works, e.g. a Postgres streaming
+# replica or a second SQLite file. Unset means those reads use the primary.
+REPLICA_DATABASE_URL = config("REPLICA_DATABASE_URL", default="")
+# After a user writes, their reads stay on the primary for this many seconds so
+# they see their own changes through the replica's lag
+REPLICA_STICKY_SECONDS = config("REPLICA_STICKY_SECONDS", default=5.0, cast=float)
+
+replica_engine = None
+async_replica_engine = None
+ReplicaSessionLocal = SessionLocal
+AsyncReplicaSessionLocal = AsyncSessionLocal
+
+def _read_only_sqlite(engine):
+    @event.listens_for(engine, "connect")
+    def set_query_only(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+if REPLICA_DATABASE_URL:
+    replica_is_sqlite = make_url(REPLICA_DATABASE_URL).get_backend_name() == "sqlite"
+    replica_engine = create_engine(
+        REPLICA_DATABASE_URL,
+        connect_args={"check_same_thread": False} if replica_is_sqlite else {}
+    )
+    ASYNC_REPLICA_DATABASE_URL = (config("ASYNC_REPLICA_DATABASE_URL", default="")
+                                  or to_async_url(REPLICA_DATABASE_URL))
+    async_replica_engine = create_async_engine(ASYNC_REPLICA_DATABASE_URL)
+    if replica_is_sqlite:
+        _read_only_sqlite(replica_engine)
+        _read_only_sqlite(async_replica_engine.sync_engine)
+    ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+    AsyncReplicaSessionLocal = async_sessionmaker(
+        bind=async_replica_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+
+_sticky_until: Dict[str, float] = {}
+_sticky_lock = threading.Lock()
+
+def stick_to_primary(key: Optional[str]):
+    """Pin ``key``'s replica-routed reads to the primary for the sticky window."""
+    if replica_engine is None or not key:
+        return
+    now = time.monotonic()
+    with _sticky_lock:
+        if len(_sticky_until) > 10000:
+            for stale in [k for k, until in _sticky_until.items() if until <= now]:
+                del _sticky_until[stale]
+        _sticky_until[key] = now + REPLICA_STICKY_SECONDS
+
+def reads_from_primary(key: Optional[str]) -> bool:
+    return replica_engine is None or (
+        key is not None and _sticky_until.get(key, 0.0) > time.monotonic()
+    )
+
+def open_read_session(key: Optional[str]) -> Session:
+    """A session for a replica-routed endpoint serving ``key`` (or anonymous)."""
+    if reads_from_primary(key):
+        db = SessionLocal()
+        db.info["sticky"] = replica_engine is not None
+        return db
+    return ReplicaSessionLocal()
+
+def open_async_read_session(key: Optional[str]) -> AsyncSession:
+    if reads_from_primary(key):
+        db = AsyncSessionLocal()
+        db.info["sticky"] = replica_engine is not None
+        return db
+    return AsyncReplicaSessionLocal()
 
 Base = declarative_base()
 
@@ -24,7 +248,45 @@ def get_db():
     finally:
         db.close()
 
+# Async dependency for `async def` endpoints
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def dispose_engines():
+    """Close every pooled connection; aiosqlite keeps a thread per open connection."""
+    for async_target in {async_engine, async_read_engine, async_replica_engine} - {None}:
+        await async_target.dispose()
+    for target in {engine, read_engine, replica_engine} - {None}:
+        target.dispose()
+
+# create_all() skips tables that already exist, so indexes declared after a
+# table was first created have to be added separately
+def create_missing_indexes():
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+# Likewise for columns added to an existing model, as long as they are
+# nullable or have a server default to fill existing rows with
+def create_missing_columns():
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not (column.nullable or column.server_default is not None):
+                continue
+            definition = f"{column.name} {column.type.compile(dialect=engine.dialect)}"
+            if column.server_default is not None:
+                definition += f" NOT NULL DEFAULT '{column.server_default.arg}'"
+            with engine.begin() as connection:
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {definition}")
+
 # Initialize database
 def init_db():
     Base.metadata.create_all(bind=engine)
+    create_missing_columns()
+    create_missing_indexes()
     print("✅ SQLite database initialized successfully!")
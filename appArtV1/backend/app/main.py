@@ -1,17 +1,61 @@
-from fastapi import FastAPI
+import asyncio
+from fastapi import Depends, FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from .routers import auth
 from .routers import users
 from .routers import artworks
-from .database import engine, Base
+from .routers import requests
+from .routers import offers
+from .routers import notifications
+from .routers import media
+from .database import engine, Base, SessionLocal, create_missing_columns, create_missing_indexes, dispose_engines
+from .utils.pagination import NEXT_CURSOR_HEADER
+from .utils.cache import cache_stats
+from .utils import autocomplete, images, near_duplicates, search, similarity, style_tags
+from .utils.passwords import password_hasher
+from .utils.sessions import denylist
+from .utils.notifications import reconcile_unread
+from .utils import notification_stream
+from .utils.push import PushWorker, build_gateway
+from .utils.storage import storage, LocalStorage
+from decouple import config
+
+FEED_CACHE_WARM_PAGES = config("FEED_CACHE_WARM_PAGES", default=2, cast=int)
+# In-memory indexes with the seconds between full reloads in this process; 0
+# relies on the incremental updates alone, which is enough with a single worker
+MEMORY_INDEXES = {
+    "autocomplete": (autocomplete.user_index, config("AUTOCOMPLETE_RELOAD_INTERVAL", default=0.0, cast=float)),
+    "similarity": (similarity.artwork_index, config("SIMILARITY_RELOAD_INTERVAL", default=0.0, cast=float)),
+    "near_duplicates": (near_duplicates.hash_index, config("NEAR_DUPLICATE_RELOAD_INTERVAL", default=0.0, cast=float)),
+    "revoked_sessions": (denylist, config("REVOCATION_SYNC_INTERVAL", default=5.0, cast=float)),
+}
+# Seconds between repairs of the unread-notification counters; 0 only runs it at startup
+UNREAD_RECONCILE_INTERVAL = config("UNREAD_RECONCILE_INTERVAL", default=3600.0, cast=float)
+# Seconds between checks for notifications written by other workers to this
+# worker's open streams; 0 (the default) is enough with a single worker
+STREAM_POLL_INTERVAL = config("STREAM_POLL_INTERVAL", default=0.0, cast=float)
+# Run the push worker in exactly one process per deployment
+PUSH_WORKER_ENABLED = config("PUSH_WORKER_ENABLED", default=False, cast=bool)
+
+push_worker = PushWorker(
+    build_gateway(config("PUSH_GATEWAY", default="fake")),
+    poll_interval=config("PUSH_POLL_INTERVAL", default=1.0, cast=float),
+    batch_size=config("PUSH_BATCH_SIZE", default=500, cast=int),
+    max_attempts=config("PUSH_MAX_ATTEMPTS", default=5, cast=int),
+)
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+create_missing_columns()
+create_missing_indexes()
+search.ensure_index(engine)
 
 app = FastAPI(
     title="AppArt V1 API",
     description="Backend API for AppArt V1 mobile application",
-    version="1.0.0"
+    version="1.0.0",
+    dependencies=[Depends(auth.track_writes)]
 )
 
 # CORS middleware
@@ -21,16 +65,134 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Include routers
 app.include_router(auth.router, prefix="/auth", tags=["authentication"])
 app.include_router(users.router, prefix="/users", tags=["users"])
 app.include_router(artworks.router, prefix="/artworks", tags=["artworks"])
-# TODO: Re-enable other routers after fixing model imports
-# app.include_router(requests.router, prefix="/requests", tags=["requests"])
-# app.include_router(offers.router, prefix="/offers", tags=["offers"])
-# app.include_router(notifications.router, prefix="/notifications", tags=["notifications"])
+app.include_router(requests.router, prefix="/requests", tags=["requests"])
+app.include_router(offers.router, prefix="/offers", tags=["offers"])
+app.include_router(notifications.router, prefix="/notifications", tags=["notifications"])
+
+# Uploaded images, when they are stored on this host
+if isinstance(storage, LocalStorage):
+    app.include_router(media.router, prefix=storage.base_url, tags=["media"])
+
+@app.on_event("startup")
+def warm_caches():
+    db = SessionLocal()
+    try:
+        artworks.warm_feed_cache(db, FEED_CACHE_WARM_PAGES)
+    finally:
+        db.close()
+
+@app.on_event("startup")
+def backfill_style_tags():
+    db = SessionLocal()
+    try:
+        style_tags.backfill_tags(db)
+    finally:
+        db.close()
+
+def load_index(index):
+    db = SessionLocal()
+    try:
+        index.load(db)
+    finally:
+        db.close()
+
+async def reload_index(index, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        await run_in_threadpool(load_index, index)
+
+@app.on_event("startup")
+def build_memory_indexes():
+    for index, _ in MEMORY_INDEXES.values():
+        load_index(index)
+
+@app.on_event("startup")
+async def start_index_reloads():
+    app.state.index_reloads = [
+        asyncio.create_task(reload_index(index, interval))
+        for index, interval in MEMORY_INDEXES.values() if interval > 0
+    ]
+
+@app.on_event("shutdown")
+async def stop_index_reloads():
+    for task in getattr(app.state, "index_reloads", []):
+        task.cancel()
+
+def reconcile_unread_counts():
+    db = SessionLocal()
+    try:
+        reconcile_unread(db)
+    finally:
+        db.close()
+
+async def reconcile_unread_periodically(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        await run_in_threadpool(reconcile_unread_counts)
+
+@app.on_event("startup")
+async def start_unread_reconciliation():
+    await run_in_threadpool(reconcile_unread_counts)
+    if UNREAD_RECONCILE_INTERVAL > 0:
+        app.state.unread_reconciliation = asyncio.create_task(reconcile_unread_periodically(UNREAD_RECONCILE_INTERVAL))
+
+@app.on_event("shutdown")
+async def stop_unread_reconciliation():
+    task = getattr(app.state, "unread_reconciliation", None)
+    if task is not None:
+        task.cancel()
+
+def poll_stream_notifications():
+    db = SessionLocal()
+    try:
+        notification_stream.poll_new(db)
+    finally:
+        db.close()
+
+async def poll_streams_periodically(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        await run_in_threadpool(poll_stream_notifications)
+
+@app.on_event("startup")
+async def start_stream_polling():
+    if STREAM_POLL_INTERVAL > 0:
+        app.state.stream_polling = asyncio.create_task(poll_streams_periodically(STREAM_POLL_INTERVAL))
+
+@app.on_event("shutdown")
+async def stop_notification_streams():
+    task = getattr(app.state, "stream_polling", None)
+    if task is not None:
+        task.cancel()
+    notification_stream.hub.stop()
+
+@app.on_event("startup")
+async def start_push_worker():
+    if PUSH_WORKER_ENABLED:
+        await push_worker.start()
+
+@app.on_event("shutdown")
+async def stop_push_worker():
+    await push_worker.stop()
+
+@app.on_event("shutdown")
+def stop_image_workers():
+    images.shutdown_pool()
+
+@app.on_event("shutdown")
+def stop_password_workers():
+    password_hasher.shutdown()
+
+@app.on_event("shutdown")
+async def close_database():
+    await dispose_engines()
 
 @app.get("/")
 def root():
@@ -39,3 +201,19 @@ def root():
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
+
+@app.get("/cache-stats", dependencies=[Depends(auth.get_current_admin)])
+def get_cache_stats():
+    return {**cache_stats(), **{name: index.stats() for name, (index, _) in MEMORY_INDEXES.items()}}
+
+@app.get("/push-stats", dependencies=[Depends(auth.get_current_admin)])
+def get_push_stats():
+    return push_worker.stats()
+
+@app.get("/stream-stats", dependencies=[Depends(auth.get_current_admin)])
+def get_stream_stats():
+    return notification_stream.hub.stats()
+
+@app.get("/password-stats", dependencies=[Depends(auth.get_current_admin)])
+def get_password_stats():
+    return password_hasher.stats()
@@ -1,9 +1,13 @@
 from .user import User, UserRole
-# Basic Artwork model for feed functionality
 from .artwork import Artwork
-# TODO: Convert these models to MongoDB/Beanie - commented out to avoid SQLAlchemy import errors
-# from .request import Request, RequestStatus
-# from .offer import Offer, OfferStatus
-# from .reference_image import ReferenceImage
-# from .notification import Notification, NotificationType
-# from .device_token import DeviceToken
+from .request import Request, RequestStatus
+from .offer import Offer, OfferStatus
+from .reference_image import ReferenceImage
+from .notification import Notification, NotificationType
+from .device_token import DeviceToken
+from .feed_entry import FeedEntry
+from .push_delivery import PushCursor, PushFailure
+from .artwork_tag import ArtworkTag
+from .image_asset import ImageAsset
+from .near_duplicate import NearDuplicate
+from .user_session import UserSession
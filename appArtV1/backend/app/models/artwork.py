@@ -1,17 +1,23 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, Text, ForeignKey, Index, JSON
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from ..database import Base
 
 class Artwork(Base):
     __tablename__ = "artworks"
+    __table_args__ = (
+        Index("ix_artworks_created_at_id", "created_at", "id"),
+        Index("ix_artworks_artist_created_at_id", "artist_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     artist_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     title = Column(String, nullable=True)
     description = Column(Text, nullable=True)
     image_url = Column(String, nullable=False)
-    style_tags = Column(String, nullable=True)  # Comma-separated tags
+    variants = Column(JSON(none_as_null=True), nullable=True)  # Resized/WebP copies of image_url, see ImageAsset
+    style_tags = Column(String, nullable=True)  # Comma-separated tags, indexed in artwork_tags
+    image_hash = Column(BigInteger, nullable=True)  # 64-bit dHash, see app.utils.near_duplicates
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships - commented out until User.artworks is enabled
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
+from ..database import Base
+
+class ArtworkTag(Base):
+    """Inverted index of ``Artwork.style_tags``: one row per (tag, artwork).
+
+    The primary key keeps each tag's posting list contiguous; rows are
+    maintained by ``app.utils.style_tags`` whenever an artwork's tags change.
+    """
+    __tablename__ = "artwork_tags"
+    __table_args__ = (
+        Index("ix_artwork_tags_artwork_id", "artwork_id"),
+    )
+
+    tag = Column(String, primary_key=True)
+    artwork_id = Column(Integer, ForeignKey("artworks.id"), primary_key=True)
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Index, JSON
+from ..database import Base
+
+class FeedEntry(Base):
+    """Denormalized copy of artworks by verified artists, read by /artworks/feed.
+
+    Rows share the id of the artwork they mirror and are maintained by
+    ``app.utils.feed`` whenever an artwork or the artist's verification changes.
+    """
+    __tablename__ = "feed_entries"
+    __table_args__ = (
+        Index("ix_feed_entries_created_at_id", "created_at", "id"),
+        Index("ix_feed_entries_artist_id", "artist_id"),
+    )
+
+    id = Column(Integer, ForeignKey("artworks.id"), primary_key=True)
+    artist_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    title = Column(String, nullable=True)
+    description = Column(Text, nullable=True)
+    image_url = Column(String, nullable=False)
+    variants = Column(JSON(none_as_null=True), nullable=True)
+    style_tags = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
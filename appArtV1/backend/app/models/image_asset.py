@@ -0,0 +1,31 @@
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, ForeignKey, JSON
+from sqlalchemy.sql import func
+from ..database import Base
+
+class ImageAsset(Base):
+    """An image stored through ``app.utils.storage`` and its derivatives.
+
+    Uploads are content-addressed: ``key`` is derived from ``sha256`` and the
+    same bytes uploaded again resolve to the existing row. ``ref_count``
+    counts the artworks and profile pictures using ``url``; the blob is
+    deleted from storage when the last of them lets go, unless an upload
+    handed the URL out before ``leased_until`` (the uploader may still be
+    about to use it).
+
+    ``variants`` maps a variant name (``w320``, ``w320_webp``, ``placeholder``,
+    ...) to its URL, or to an inline data URI for the placeholder; artworks and
+    profile pictures copy it when they start using ``url``.
+    """
+    __tablename__ = "image_assets"
+
+    id = Column(Integer, primary_key=True)
+    key = Column(String, unique=True, nullable=False)
+    url = Column(String, unique=True, index=True, nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    content_type = Column(String, nullable=False)
+    sha256 = Column(String(64), unique=True, index=True, nullable=True)
+    ref_count = Column(Integer, nullable=False, server_default="0")
+    variants = Column(JSON(none_as_null=True), nullable=True)
+    image_hash = Column(BigInteger, nullable=True)  # perceptual hash, copied onto artworks
+    leased_until = Column(DateTime, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
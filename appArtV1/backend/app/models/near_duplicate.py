@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, ForeignKey, Index
+from ..database import Base
+
+class NearDuplicate(Base):
+    """A pair of artworks whose image hashes are near-duplicates, lower id
+    first; maintained by ``app.utils.near_duplicates``."""
+    __tablename__ = "near_duplicates"
+    __table_args__ = (
+        Index("ix_near_duplicates_duplicate_id", "duplicate_id"),
+    )
+
+    artwork_id = Column(Integer, ForeignKey("artworks.id"), primary_key=True)
+    duplicate_id = Column(Integer, ForeignKey("artworks.id"), primary_key=True)
+    distance = Column(Integer, nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Enum, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Enum, ForeignKey, Index, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -13,6 +13,13 @@ class NotificationType(str, enum.Enum):
 
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ix_notifications_user_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_notifications_user_is_read_created_at_id", "user_id", "is_read", "created_at", "id"),
+        # The push worker's queue: only rows not yet pushed are indexed
+        Index("ix_notifications_unpushed", "id",
+              sqlite_where=text("pushed_at IS NULL"), postgresql_where=text("pushed_at IS NULL")),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -23,6 +30,7 @@ class Notification(Base):
     related_artist_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    pushed_at = Column(DateTime(timezone=True), nullable=True)  # handled by the push worker
 
     # Relationships
     user = relationship("User", foreign_keys=[user_id])
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, DateTime, Text, Float, Enum, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, Text, Float, Enum, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -11,6 +11,10 @@ class OfferStatus(str, enum.Enum):
 
 class Offer(Base):
     __tablename__ = "offers"
+    __table_args__ = (
+        Index("ix_offers_request_id", "request_id"),
+        Index("ix_offers_artist_created_at_id", "artist_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     request_id = Column(Integer, ForeignKey("requests.id"), nullable=False)
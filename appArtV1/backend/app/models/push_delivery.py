@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from ..database import Base
+
+class PushCursor(Base):
+    """The push worker's starting point in the notifications table.
+
+    Notifications record their own delivery (``Notification.pushed_at``);
+    rows at or below ``last_notification_id`` predate that (or the worker's
+    first start) and are marked as handled when the worker starts, so it never
+    pushes old history.
+    """
+    __tablename__ = "push_cursors"
+
+    name = Column(String, primary_key=True)
+    last_notification_id = Column(Integer, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class PushFailure(Base):
+    """A push that was still failing when the worker ran out of attempts."""
+    __tablename__ = "push_failures"
+
+    id = Column(Integer, primary_key=True, index=True)
+    notification_id = Column(Integer, ForeignKey("notifications.id"), nullable=False, index=True)
+    token = Column(String, nullable=False)
+    provider = Column(String, nullable=False)
+    attempts = Column(Integer, nullable=False)
+    failed_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Float, Enum, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, Enum, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -12,6 +12,10 @@ class RequestStatus(str, enum.Enum):
 
 class Request(Base):
     __tablename__ = "requests"
+    __table_args__ = (
+        Index("ix_requests_customer_created_at_id", "customer_id", "created_at", "id"),
+        Index("ix_requests_status_created_at_id", "status", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from ..database import Base
+
+class UserSession(Base):
+    """A login: every access and refresh token carries its ``id`` as ``sid``.
+
+    Refresh tokens rotate; ``refresh_jti`` is the only one of the session's
+    refresh tokens still accepted. Revoking sets ``revoked_at`` and puts the id
+    on the in-memory denylist (``app.utils.sessions``), which rejects the
+    session's access tokens as well. Rows are kept until ``expires_at``, the
+    expiry of the newest refresh token.
+    """
+    __tablename__ = "user_sessions"
+
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    refresh_jti = Column(String(32), nullable=False)
+    user_agent = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_refreshed_at = Column(DateTime(timezone=True), nullable=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    revoked_at = Column(DateTime(timezone=True), nullable=True, index=True)
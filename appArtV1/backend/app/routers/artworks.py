@@ -1,44 +1,47 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-from ..database import get_db
-from ..models import User, Artwork
-from ..schemas import Artwork as ArtworkSchema, ArtworkCreate, ArtworkUpdate
-from .auth import get_current_user
-import boto3
-from botocore.exceptions import NoCredentialsError
-import os
-from decouple import config
+from typing import List, Optional
+from ..database import get_db, get_async_db
+from ..models import User, Artwork, FeedEntry, ImageAsset
+from ..schemas import (
+    Artwork as ArtworkSchema, ArtworkCreate, ArtworkUpdate,
+    ArtworkUploadRequest, ArtworkUploadUrl, ArtworkUploadComplete
+)
+from ..utils.pagination import fetch_page, paginate, set_next_cursor, clamp_limit, DEFAULT_PAGE_SIZE
+from ..utils import autocomplete, feed, images, near_duplicates, ranking, similarity, style_tags
+from .auth import get_current_admin, get_current_user, get_read_db, invalidate_principal
 
 router = APIRouter()
 
-# AWS S3 Configuration
-AWS_ACCESS_KEY_ID = config("AWS_ACCESS_KEY_ID", default="")
-AWS_SECRET_ACCESS_KEY = config("AWS_SECRET_ACCESS_KEY", default="")
-AWS_S3_BUCKET_NAME = config("AWS_S3_BUCKET_NAME", default="appart-bucket")
-AWS_REGION = config("AWS_REGION", default="us-east-1")
-
-s3_client = boto3.client(
-    's3',
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=AWS_REGION
-)
+def _load_feed_page(db: Session, cursor: Optional[str], limit: int):
+    rows, next_cursor = fetch_page(db.query(FeedEntry), FeedEntry, cursor, limit)
+    return [ArtworkSchema.model_validate(row) for row in rows], next_cursor
 
-def upload_image_to_s3(file: UploadFile, filename: str) -> str:
-    """Upload image to S3 and return public URL"""
-    try:
-        s3_client.upload_fileobj(
-            file.file,
-            AWS_S3_BUCKET_NAME,
-            filename,
-            ExtraArgs={'ACL': 'public-read', 'ContentType': file.content_type}
+def _load_artist_page(db: Session, artist_id: int, cursor: Optional[str], limit: int):
+    query = db.query(Artwork).filter(Artwork.artist_id == artist_id)
+    rows, next_cursor = fetch_page(query, Artwork, cursor, limit)
+    return [ArtworkSchema.model_validate(row) for row in rows], next_cursor
+
+def _cached_page(db: Session, key: tuple, loader):
+    # Readers inside their read-your-writes window skip the cache, whose pages
+    # may have been loaded from a lagging replica
+    if db.info.get("sticky"):
+        return loader()
+    return feed.feed_cache.get_or_load(key, loader)
+
+def warm_feed_cache(db: Session, pages: int) -> int:
+    """Preload the first ``pages`` pages of the default feed into the cache"""
+    cursor = None
+    for loaded in range(pages):
+        _, cursor = feed.feed_cache.get_or_load(
+            ("feed", cursor, DEFAULT_PAGE_SIZE),
+            lambda: _load_feed_page(db, cursor, DEFAULT_PAGE_SIZE)
         )
-        return f"https://{AWS_S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{filename}"
-    except NoCredentialsError:
-        raise HTTPException(status_code=500, detail="AWS credentials not configured")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+        if cursor is None:
+            return loaded + 1
+    return pages
 
 @router.post("/", response_model=ArtworkSchema)
 def create_artwork(
@@ -50,53 +53,192 @@ def create_artwork(
     if current_user.role != "artist":
         raise HTTPException(status_code=403, detail="Only artists can upload artworks")
 
+    return _add_artwork(db, current_user, artwork_data, artwork_data.image_url,
+                        images.retain(db, artwork_data.image_url))
+
+def _add_artwork(db: Session, current_user: User, artwork_data, image_url: str, asset: Optional[ImageAsset]):
+    # Refuse images that closely match another artist's artwork (re-posts of
+    # stolen art); artists may post variations of their own work
+    image_hash = asset.image_hash if asset else None
+    matches = near_duplicates.hash_index.near(image_hash) if image_hash is not None else []
+    for artwork_id, artist_id, _ in matches:
+        if artist_id != current_user.id:
+            raise HTTPException(
+                status_code=409, detail=f"This image closely matches artwork {artwork_id} by another artist"
+            )
+
     db_artwork = Artwork(
         artist_id=current_user.id,
         title=artwork_data.title,
         description=artwork_data.description,
-        image_url=artwork_data.image_url,
+        image_url=image_url,
+        variants=asset.variants if asset else None,
+        image_hash=image_hash,
         style_tags=artwork_data.style_tags
     )
     db.add(db_artwork)
-    db.commit()
-    db.refresh(db_artwork)
+    db.flush()
+    style_tags.sync_tags(db, db_artwork)
+    near_duplicates.record_pairs(db, db_artwork.id, matches)
 
     # Update artist verification status (requires 3 artworks + profile + bio)
-    if current_user.role == "artist":
-        artist_artworks = db.query(Artwork).filter(Artwork.artist_id == current_user.id).count()
-        has_profile_complete = (
-            current_user.profile_picture_url is not None and
-            current_user.bio is not None and
-            current_user.bio.strip() != ""
-        )
-        current_user.is_artist_verified = artist_artworks >= 3 and has_profile_complete
-        db.commit()
+    # and publish the artwork to the feed in the same transaction
+    verified = feed.refresh_artist_verification(db, current_user)
+    db.commit()
+    db.refresh(db_artwork)
+    feed.invalidate_cache(current_user.id)
+    invalidate_principal(current_user.email)
+    autocomplete.user_index.set_verified(db_artwork.artist_id, verified)
+    similarity.artwork_index.upsert(db_artwork)
+    near_duplicates.hash_index.upsert(db_artwork)
 
     return db_artwork
 
+@router.post("/images")
+async def upload_image(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Store an image sent as the raw request body; returns the image_url for POST /artworks/"""
+    if current_user.role != "artist":
+        raise HTTPException(status_code=403, detail="Only artists can upload artworks")
+
+    asset = await images.ingest_upload(request, db, current_user.id)
+    return {"image_url": asset.url, "variants": asset.variants}
+
+@router.post("/upload-url", response_model=ArtworkUploadUrl)
+def get_upload_url(
+    upload: ArtworkUploadRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Presigned POST credentials for uploading an image straight to storage"""
+    if current_user.role != "artist":
+        raise HTTPException(status_code=403, detail="Only artists can upload artworks")
+    return images.direct_upload(current_user.id, "artworks", upload.content_type)
+
+@router.post("/uploads/complete", response_model=ArtworkSchema)
+def complete_upload(
+    artwork_data: ArtworkUploadComplete,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Create the artwork for an image sent to a /artworks/upload-url key, once it is in storage"""
+    if current_user.role != "artist":
+        raise HTTPException(status_code=403, detail="Only artists can upload artworks")
+
+    asset = images.complete_direct_upload(db, current_user.id, "artworks", artwork_data.key)
+    is_new = asset in db.new
+    try:
+        db.flush()
+        return _add_artwork(db, current_user, artwork_data, asset.url, images.retain(db, asset.url))
+    except Exception:
+        # e.g. a near-duplicate: the files just stored for it would be orphans
+        if is_new:
+            images.discard(db, asset)
+        raise
+
 @router.get("/feed", response_model=List[ArtworkSchema])
 def get_artwork_feed(
-    skip: int = 0,
-    limit: int = 50,
-    db: Session = Depends(get_db)
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    db: Session = Depends(get_read_db)
 ):
     """Get artwork feed for home screen"""
-    artworks = db.query(Artwork).join(User).filter(
-        User.is_artist_verified == True
-    ).offset(skip).limit(limit).all()
+    limit = clamp_limit(limit)
+    artworks, next_cursor = _cached_page(
+        db, ("feed", cursor, limit),
+        lambda: _load_feed_page(db, cursor, limit)
+    )
+    set_next_cursor(response, next_cursor)
+    return artworks
+
+@router.get("/feed/for-you", response_model=List[ArtworkSchema])
+def get_personalized_feed(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Artwork feed ranked for the current user; newest first until they have a profile"""
+    limit = clamp_limit(limit)
+    page = None
+    if cursor is None or ranking.is_ranked_cursor(cursor):
+        page = ranking.ranked_page(db, current_user.id, cursor, limit)
+    if page is None:
+        page = _cached_page(
+            db, ("feed", cursor, limit),
+            lambda: _load_feed_page(db, cursor, limit)
+        )
+    artworks, next_cursor = page
+    set_next_cursor(response, next_cursor)
     return artworks
 
 @router.get("/artist/{artist_id}", response_model=List[ArtworkSchema])
 def get_artist_artworks(
     artist_id: int,
-    skip: int = 0,
-    limit: int = 50,
-    db: Session = Depends(get_db)
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    db: Session = Depends(get_read_db)
 ):
     """Get all artworks by a specific artist"""
-    artworks = db.query(Artwork).filter(Artwork.artist_id == artist_id).offset(skip).limit(limit).all()
+    limit = clamp_limit(limit)
+    artworks, next_cursor = _cached_page(
+        db, ("artist", artist_id, cursor, limit),
+        lambda: _load_artist_page(db, artist_id, cursor, limit)
+    )
+    set_next_cursor(response, next_cursor)
     return artworks
 
+@router.get("/search", response_model=List[ArtworkSchema])
+def search_artworks(
+    response: Response,
+    tags: str,
+    mode: str = "any",
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    db: Session = Depends(get_read_db)
+):
+    """Artworks carrying any (or, with mode=all, every) of the comma-separated tags"""
+    if mode not in ("any", "all"):
+        raise HTTPException(status_code=400, detail="mode must be 'any' or 'all'")
+    tag_list = style_tags.parse_tags(tags)
+    if not tag_list:
+        raise HTTPException(status_code=400, detail="At least one tag is required")
+    if len(tag_list) > style_tags.MAX_QUERY_TAGS:
+        raise HTTPException(status_code=400, detail=f"At most {style_tags.MAX_QUERY_TAGS} tags are allowed")
+
+    query = db.query(Artwork).filter(Artwork.id.in_(style_tags.tagged_artwork_ids(tag_list, mode == "all")))
+    return paginate(query, Artwork, cursor, limit, response)
+
+@router.get("/near-duplicates", response_model=List[List[ArtworkSchema]],
+            dependencies=[Depends(get_current_admin)])
+def get_near_duplicate_clusters(
+    limit: int = DEFAULT_PAGE_SIZE,
+    db: Session = Depends(get_db)
+):
+    """Groups of artworks with near-identical images, largest first (admin only)"""
+    clusters = near_duplicates.clusters(db)[:clamp_limit(limit)]
+    ids = [artwork_id for cluster in clusters for artwork_id in cluster]
+    artworks = {artwork.id: artwork for artwork in db.query(Artwork).filter(Artwork.id.in_(ids))}
+    return [[artworks[artwork_id] for artwork_id in cluster if artwork_id in artworks] for cluster in clusters]
+
+@router.get("/{artwork_id}/similar", response_model=List[ArtworkSchema])
+def get_similar_artworks(
+    artwork_id: int,
+    limit: int = similarity.DEFAULT_LIMIT,
+    db: Session = Depends(get_read_db)
+):
+    """Artworks whose tags, title and description overlap most with this one"""
+    if db.get(Artwork, artwork_id) is None:
+        raise HTTPException(status_code=404, detail="Artwork not found")
+    similar_ids = similarity.artwork_index.similar(artwork_id, limit)
+    artworks = {artwork.id: artwork for artwork in db.query(Artwork).filter(Artwork.id.in_(similar_ids))}
+    return [artworks[similar_id] for similar_id in similar_ids if similar_id in artworks]
+
 @router.put("/{artwork_id}", response_model=ArtworkSchema)
 def update_artwork(
     artwork_id: int,
@@ -112,11 +254,17 @@ def update_artwork(
     if artwork.artist_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    for field, value in artwork_update.dict(exclude_unset=True).items():
+    update_data = artwork_update.dict(exclude_unset=True)
+    for field, value in update_data.items():
         setattr(artwork, field, value)
 
+    feed.sync_artwork(db, artwork)
+    if "style_tags" in update_data:
+        style_tags.sync_tags(db, artwork)
     db.commit()
     db.refresh(artwork)
+    feed.invalidate_cache(artwork.artist_id)
+    similarity.artwork_index.upsert(artwork)
     return artwork
 
 @router.delete("/{artwork_id}")
@@ -133,13 +281,22 @@ def delete_artwork(
     if artwork.artist_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
 
+    feed.remove_artwork(db, artwork.id)
+    style_tags.remove_tags(db, artwork.id)
+    near_duplicates.remove_pairs(db, artwork.id)
+    released = images.release(db, artwork.image_url)
     db.delete(artwork)
-    db.commit()
+    db.flush()
 
     # Update artist verification status
-    artist_artworks = db.query(Artwork).filter(Artwork.artist_id == current_user.id).count()
-    if artist_artworks < 3:
-        current_user.is_artist_verified = False
-        db.commit()
+    verified = feed.refresh_artist_verification(db, current_user)
+    db.commit()
+    feed.invalidate_cache(current_user.id)
+    invalidate_principal(current_user.email)
+    autocomplete.user_index.set_verified(current_user.id, verified)
+    similarity.artwork_index.remove(artwork_id)
+    near_duplicates.hash_index.remove(artwork_id)
+    if released:
+        anyio.from_thread.run(images.purge, released)
 
     return {"message": "Artwork deleted"}
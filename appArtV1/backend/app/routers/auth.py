@@ -1,29 +1,109 @@
-from datetime import timedelta
-from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+from decouple import config
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from ..database import get_db
-from ..models import User
-from ..schemas import UserCreate, Token, LoginRequest, RefreshTokenRequest
-from ..utils.auth import (
-    verify_password, create_access_token, create_refresh_token,
-    verify_token, get_password_hash
-)
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+from ..database import get_db, get_async_db, open_read_session, open_async_read_session, stick_to_primary
+from ..models import User, UserSession
+from ..schemas import UserCreate, Token, LoginRequest, RefreshTokenRequest, Session as SessionSchema
+from ..utils.auth import decode_token
+from ..utils.passwords import password_hasher
+from ..utils.sessions import denylist, issue_tokens, start_session
+from ..utils import autocomplete, search
+from ..utils.cache import TTLCache
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
+
+# Verified access-token claims, keyed by the raw token. Claims never change for
+# a given token, so entries only need to respect the token's own expiry.
+token_cache = TTLCache(
+    "auth_tokens",
+    maxsize=config("AUTH_TOKEN_CACHE_SIZE", default=4096, cast=int),
+    ttl=config("AUTH_TOKEN_CACHE_TTL", default=300.0, cast=float),
+)
+# Column snapshots of authenticated users, keyed by email (the token "sub").
+# Within this freshness window get_current_user skips the users lookup;
+# set AUTH_USER_CACHE_TTL=0 to always read the user from the database.
+AUTH_USER_CACHE_TTL = config("AUTH_USER_CACHE_TTL", default=30.0, cast=float)
+principal_cache = TTLCache(
+    "auth_principals",
+    maxsize=config("AUTH_USER_CACHE_SIZE", default=4096, cast=int),
+    ttl=AUTH_USER_CACHE_TTL,
+)
+
+def invalidate_principal(*emails: str):
+    """Forget cached snapshots after a user row changes. Call after commit."""
+    for email in emails:
+        principal_cache.invalidate("user", email)
+
+def _token_subject(token: Optional[str]) -> Optional[str]:
+    if not token:
+        return None
+    payload = token_cache.get_or_load(("token", token), lambda: decode_token(token, "access"))
+    return payload["sub"] if payload is not None and payload["exp"] > time.time() else None
+
+def track_writes(request: Request, token: Optional[str] = Depends(optional_oauth2_scheme)):
+    """App-wide dependency: after a write request, keep its user on the primary.
+
+    The code after ``yield`` runs once the response is sent, so the sticky
+    window starts after the handler has committed.
+    """
+    try:
+        yield
+    finally:
+        if request.method not in ("GET", "HEAD", "OPTIONS"):
+            stick_to_primary(_token_subject(token))
+
+# Dependencies for the read-only endpoints routed to the replica
+def get_read_db(token: Optional[str] = Depends(optional_oauth2_scheme)):
+    db = open_read_session(_token_subject(token))
+    try:
+        yield db
+    finally:
+        db.close()
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = db.query(User).filter(User.email == email).first()
+async def get_async_read_db(token: Optional[str] = Depends(optional_oauth2_scheme)):
+    async with open_async_read_session(_token_subject(token)) as db:
+        yield db
+
+def _snapshot(user: User) -> dict:
+    return {column.name: getattr(user, column.name) for column in User.__table__.columns}
+
+def _attach_snapshot(db: Session, snapshot: dict) -> User:
+    # Rebuild the user as a detached, fully loaded instance and add it to this
+    # session, so handlers can still modify and commit it without a SELECT
+    user = db.identity_map.get(db.identity_key(User, snapshot["id"]))
+    if user is None:
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        db.add(user)
+    return user
+
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    """The user with these credentials, or False. Hashes stored with outdated
+    parameters are replaced while the plain password is at hand."""
+    user = await db.scalar(select(User).where(User.email == email))
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    # End the read so the connection goes back to the pool while the hash runs
+    await db.commit()
+    verified, new_hash = await password_hasher.verify(password, user.hashed_password)
+    if not verified:
         return False
+    if new_hash is not None:
+        await db.execute(update(User).where(User.id == user.id).values(hashed_password=new_hash))
+        await db.commit()
+        invalidate_principal(user.email)
     return user
 
-@router.post("/register", response_model=Token)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
+def _check_available(db: Session, user_data: UserCreate):
     # Check if user already exists
     db_user = db.query(User).filter(User.email == user_data.email).first()
     if db_user:
@@ -34,8 +114,7 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
         if existing_username:
             raise HTTPException(status_code=400, detail="Username already taken")
 
-    # Create new user
-    hashed_password = get_password_hash(user_data.password)
+def _create_user(db: Session, user_data: UserCreate, hashed_password: str, user_agent: Optional[str]) -> dict:
     db_user = User(
         email=user_data.email,
         name=user_data.name,
@@ -44,18 +123,30 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
         hashed_password=hashed_password
     )
     db.add(db_user)
+    db.flush()
+    search.index_user(db, db_user)
+    session = start_session(db_user.id, user_agent)
+    tokens = issue_tokens(db_user.email, session)
+    db.add(session)
     db.commit()
     db.refresh(db_user)
+    autocomplete.user_index.upsert(db_user)
+    return tokens
 
-    # Create tokens
-    access_token = create_access_token(data={"sub": db_user.email})
-    refresh_token = create_refresh_token(data={"sub": db_user.email})
+# Async so the slow password hash is awaited on the loop; the database work
+# still runs on the threadpool
+@router.post("/register", response_model=Token)
+async def register(user_data: UserCreate, request: Request, db: Session = Depends(get_db)):
+    if user_data.role == "admin":
+        raise HTTPException(status_code=403, detail="Admin accounts cannot be self-registered")
 
-    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+    await run_in_threadpool(_check_available, db, user_data)
+    hashed_password = await password_hasher.hash(user_data.password)
+    return await run_in_threadpool(_create_user, db, user_data, hashed_password, request.headers.get("user-agent"))
 
 @router.post("/login", response_model=Token)
-def login(login_data: LoginRequest, db: Session = Depends(get_db)):
-    user = authenticate_user(db, login_data.email, login_data.password)
+async def login(login_data: LoginRequest, request: Request, db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user(db, login_data.email, login_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -63,37 +154,136 @@ def login(login_data: LoginRequest, db: Session = Depends(get_db)):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    access_token = create_access_token(data={"sub": user.email})
-    refresh_token = create_refresh_token(data={"sub": user.email})
-
-    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+    session = start_session(user.id, request.headers.get("user-agent"))
+    tokens = issue_tokens(user.email, session)
+    db.add(session)
+    await db.commit()
+    return tokens
 
 @router.post("/refresh", response_model=Token)
-async def refresh_token(refresh_data: RefreshTokenRequest):
-    email = verify_token(refresh_data.refresh_token, "refresh")
-    if email is None:
+async def refresh_token(refresh_data: RefreshTokenRequest, db: AsyncSession = Depends(get_async_db)):
+    invalid = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token"
+    )
+    # Refresh tokens from before sessions existed carry no sid and cannot be revoked
+    payload = decode_token(refresh_data.refresh_token, "refresh")
+    if payload is None or "sid" not in payload:
+        raise invalid
+
+    session = await db.scalar(select(UserSession).where(
+        UserSession.id == payload["sid"],
+        UserSession.revoked_at.is_(None),
+        UserSession.expires_at > datetime.utcnow()
+    ))
+    if session is None:
+        raise invalid
+    if session.refresh_jti != payload.get("jti"):
+        # An already rotated refresh token came back: assume it was stolen and
+        # end the session for whoever holds its newer tokens too
+        session.revoked_at = datetime.utcnow()
+        await db.commit()
+        denylist.add(session.id)
+        raise invalid
+
+    tokens = issue_tokens(payload["sub"], session)
+    session.last_refreshed_at = datetime.utcnow()
+    await db.commit()
+    return tokens
+
+def get_token_claims(token: str = Depends(oauth2_scheme)) -> dict:
+    """The verified claims of the request's access token. Revocation is checked
+    against the in-memory denylist, so this does no I/O for a live token."""
+    payload = token_cache.get_or_load(("token", token), lambda: decode_token(token, "access"))
+    if payload is None or payload["exp"] <= time.time() or denylist.is_revoked(payload.get("sid")):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid refresh token"
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
         )
+    return payload
 
-    access_token = create_access_token(data={"sub": email})
-    refresh_token = create_refresh_token(data={"sub": email})
-
-    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
-
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def get_current_user(payload: dict = Depends(get_token_claims), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    email = payload["sub"]
 
-    email = verify_token(token, "access")
-    if email is None:
-        raise credentials_exception
+    if AUTH_USER_CACHE_TTL <= 0:
+        user = db.query(User).filter(User.email == email).first()
+        if user is None:
+            raise credentials_exception
+        return user
 
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
+    loaded = {}
+    def load_user():
+        loaded["user"] = db.query(User).filter(User.email == email).first()
+        return None if loaded["user"] is None else _snapshot(loaded["user"])
+
+    snapshot = principal_cache.get_or_load(("user", email), load_user)
+    if snapshot is None:
         raise credentials_exception
-    return user
+    return loaded.get("user") or _attach_snapshot(db, snapshot)
+
+def get_current_admin(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+async def _revoke(db: AsyncSession, *conditions) -> List[str]:
+    """Revoke the matching live sessions and return their ids"""
+    revoked = (await db.scalars(
+        update(UserSession)
+        .where(*conditions, UserSession.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+        .returning(UserSession.id)
+    )).all()
+    await db.commit()
+    denylist.add(*revoked)
+    return revoked
+
+@router.post("/logout")
+async def logout(payload: dict = Depends(get_token_claims), db: AsyncSession = Depends(get_async_db)):
+    """Revoke the session the request's token belongs to"""
+    if "sid" in payload:
+        await _revoke(db, UserSession.id == payload["sid"])
+    return {"message": "Logged out"}
+
+@router.get("/sessions", response_model=List[SessionSchema])
+async def list_sessions(
+    payload: dict = Depends(get_token_claims),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """The current user's active sessions, newest first"""
+    sessions = (await db.scalars(select(UserSession).where(
+        UserSession.user_id == current_user.id,
+        UserSession.revoked_at.is_(None),
+        UserSession.expires_at > datetime.utcnow()
+    ).order_by(UserSession.created_at.desc(), UserSession.id))).all()
+    return [
+        SessionSchema.model_validate(session).model_copy(update={"current": session.id == payload.get("sid")})
+        for session in sessions
+    ]
+
+@router.delete("/sessions/{session_id}")
+async def revoke_session(
+    session_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Sign one of the current user's sessions out"""
+    if not await _revoke(db, UserSession.id == session_id, UserSession.user_id == current_user.id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"message": "Session revoked"}
+
+@router.delete("/sessions")
+async def revoke_all_sessions(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Sign the current user out everywhere, including this session"""
+    revoked = await _revoke(db, UserSession.user_id == current_user.id)
+    return {"message": "All sessions revoked", "revoked": len(revoked)}
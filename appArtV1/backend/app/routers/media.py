@@ -0,0 +1,127 @@
+"""Serves ``LocalStorage`` files at ``storage.base_url`` for self-hosted and
+offline deployments.
+
+Stored files never change once written (keys are content hashes or random
+ids), so responses carry a strong ETag and a long-lived immutable
+Cache-Control, answer ``If-None-Match`` with 304 and support single byte
+ranges (``Range`` / ``If-Range``) for resumable and partial downloads.
+
+Bodies are not read into Python buffers: servers implementing the ASGI
+``http.response.zerocopy`` extension get the open file and ``sendfile`` it;
+otherwise the file is memory-mapped and sent as ``memoryview`` slices of the
+mapping, so the page cache is handed to the socket without a ``read()`` copy.
+"""
+import mimetypes
+import mmap
+import os
+import re
+import stat
+from email.utils import formatdate
+from typing import Optional, Tuple
+from decouple import config
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from ..utils.storage import storage
+
+router = APIRouter()
+
+MEDIA_CACHE_MAX_AGE = config("MEDIA_CACHE_MAX_AGE", default=365 * 24 * 3600, cast=int)
+# Bytes per body message on the memory-mapped path
+CHUNK_SIZE = 1024 * 1024
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """The inclusive ``(start, end)`` of a single-range ``Range`` header.
+
+    Returns None when the header should be ignored (not a single byte range)
+    and raises ValueError when the range cannot be satisfied.
+    """
+    match = _RANGE.fullmatch(header.strip())
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        start, end = max(size - int(last), 0), size - 1  # the last N bytes
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise ValueError(f"Range {header!r} is outside the file's {size} bytes")
+    return start, end
+
+
+class MappedFileResponse(Response):
+    """A byte range of a file, sent without copying it through Python."""
+
+    def __init__(self, path: str, start: int, count: int, status_code: int, headers: dict, send_body: bool):
+        super().__init__(status_code=status_code, headers=headers)
+        self.path = path
+        self.start = start
+        self.count = count
+        self.send_body = send_body
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or self.count == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        file = await run_in_threadpool(open, self.path, "rb")
+        try:
+            if "http.response.zerocopy" in scope.get("extensions", {}):
+                await send({"type": "http.response.zerocopy", "file": file,
+                            "offset": self.start, "count": self.count})
+                return
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            file.close()
+        # Slices keep the mapping alive while the transport holds them; it is
+        # unmapped once the last one is dropped
+        end = self.start + self.count
+        for offset in range(self.start, end, CHUNK_SIZE):
+            stop = min(offset + CHUNK_SIZE, end)
+            await send({"type": "http.response.body", "body": memoryview(mapped)[offset:stop],
+                        "more_body": stop < end})
+
+
+@router.api_route("/{key:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def serve_media(key: str, request: Request):
+    try:
+        path = storage.path_for(key)
+        info = await run_in_threadpool(os.stat, path)
+    except (ValueError, OSError):
+        raise HTTPException(status_code=404, detail="Not found")
+    # .part files are uploads still being written
+    if not stat.S_ISREG(info.st_mode) or path.endswith(".part"):
+        raise HTTPException(status_code=404, detail="Not found")
+
+    size = info.st_size
+    etag = f'"{info.st_mtime_ns:x}-{size:x}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={MEDIA_CACHE_MAX_AGE}, immutable",
+        "Last-Modified": formatdate(info.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in {tag.strip() for tag in if_none_match.split(",")}):
+        return Response(status_code=304, headers=headers)
+
+    headers["Content-Type"] = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    byte_range = None
+    # A range is only honoured while the client's copy (If-Range) is current
+    if "range" in request.headers and request.headers.get("if-range", etag) == etag:
+        try:
+            byte_range = parse_range(request.headers["range"], size)
+        except ValueError:
+            raise HTTPException(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    start, count, status_code = 0, size, 200
+    if byte_range is not None:
+        start, end = byte_range
+        count, status_code = end - start + 1, 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(count)
+    return MappedFileResponse(path, start, count, status_code, headers, send_body=request.method == "GET")
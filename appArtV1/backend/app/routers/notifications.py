@@ -1,71 +1,248 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from ..database import get_db
-from ..models import User, Notification
-from ..schemas import Notification as NotificationSchema
-from .auth import get_current_user
+import asyncio
+import time
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from starlette.types import Receive, Scope, Send
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, List, Optional, Tuple
+from ..database import AsyncSessionLocal, get_async_db
+from ..models import User, Notification, DeviceToken
+from ..schemas import Notification as NotificationSchema, DeviceToken as DeviceTokenSchema, DeviceTokenCreate
+from ..utils.pagination import paginate_async, DEFAULT_PAGE_SIZE
+from ..utils.notifications import remove_unread
+from ..utils.notification_stream import (
+    HEARTBEAT_FRAME, RESYNC_FRAME, STREAM_BUFFER, STREAM_RETRY_MS, Subscriber, hub,
+    notification_frame, unread_frame
+)
+from ..utils.sessions import denylist
+from .auth import get_current_user, get_async_read_db, get_token_claims
 
 router = APIRouter()
 
 @router.get("/", response_model=List[NotificationSchema])
 async def get_notifications(
-    skip: int = 0,
-    limit: int = 50,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    unread: bool = False,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """Get user's notifications"""
-    notifications = db.query(Notification).filter(
-        Notification.user_id == current_user.id
-    ).order_by(Notification.created_at.desc()).offset(skip).limit(limit).all()
+    """Get user's notifications, optionally only the unread ones"""
+    statement = select(Notification).where(Notification.user_id == current_user.id)
+    if unread:
+        statement = statement.where(Notification.is_read == False)
+    return await paginate_async(db, statement, Notification, cursor, limit, response)
 
-    return notifications
+async def _commit_and_publish_unread(db: AsyncSession, user_id: int, changed: int):
+    """Commit, then tell the user's open streams the new unread count"""
+    unread_count = None
+    if changed and hub.listening([user_id]):
+        unread_count = await db.scalar(select(User.unread_notifications).where(User.id == user_id))
+    await db.commit()
+    if unread_count is not None:
+        hub.publish(user_id, unread_frame(unread_count))
 
 @router.put("/{notification_id}/read")
 async def mark_notification_read(
     notification_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Mark notification as read"""
-    notification = db.query(Notification).filter(
+    # Only the request that flips is_read moves the unread counter
+    result = await db.execute(update(Notification).where(
         Notification.id == notification_id,
-        Notification.user_id == current_user.id
-    ).first()
+        Notification.user_id == current_user.id,
+        Notification.is_read == False
+    ).values(is_read=True))
 
-    if not notification:
+    if result.rowcount:
+        await db.execute(remove_unread(current_user.id, result.rowcount))
+    elif not await db.scalar(select(Notification.id).where(
+        Notification.id == notification_id,
+        Notification.user_id == current_user.id
+    )):
         raise HTTPException(status_code=404, detail="Notification not found")
-
-    notification.is_read = True
-    db.commit()
+    await _commit_and_publish_unread(db, current_user.id, result.rowcount)
 
     return {"message": "Notification marked as read"}
 
 @router.put("/mark-all-read")
 async def mark_all_notifications_read(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Mark all user's notifications as read"""
-    db.query(Notification).filter(
+    result = await db.execute(update(Notification).where(
         Notification.user_id == current_user.id,
         Notification.is_read == False
-    ).update({"is_read": True})
+    ).values(is_read=True))
+    if result.rowcount:
+        await db.execute(remove_unread(current_user.id, result.rowcount))
 
-    db.commit()
+    await _commit_and_publish_unread(db, current_user.id, result.rowcount)
 
     return {"message": "All notifications marked as read"}
 
 @router.get("/unread-count")
 async def get_unread_count(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get count of unread notifications"""
-    count = db.query(Notification).filter(
-        Notification.user_id == current_user.id,
-        Notification.is_read == False
-    ).count()
+    count = await db.scalar(select(User.unread_notifications).where(User.id == current_user.id))
 
     return {"unread_count": count}
+
+@router.post("/device-tokens", response_model=DeviceTokenSchema)
+async def register_device_token(
+    token_data: DeviceTokenCreate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Register (or re-assign) a push token for the current user's device"""
+    device_token = await db.scalar(select(DeviceToken).where(DeviceToken.token == token_data.token))
+    if device_token is None:
+        device_token = DeviceToken(token=token_data.token)
+        db.add(device_token)
+
+    device_token.user_id = current_user.id
+    device_token.device_type = token_data.device_type
+    await db.commit()
+    await db.refresh(device_token)
+
+    return device_token
+
+@router.delete("/device-tokens/{token}")
+async def delete_device_token(
+    token: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Stop push delivery to a device (e.g. on sign out)"""
+    result = await db.execute(delete(DeviceToken).where(
+        DeviceToken.token == token,
+        DeviceToken.user_id == current_user.id
+    ))
+    await db.commit()
+
+    if not result.rowcount:
+        raise HTTPException(status_code=404, detail="Device token not found")
+
+    return {"message": "Device token removed"}
+
+async def _missed_frames(db: AsyncSession, user_id: int, after: int) -> List[Tuple[Optional[int], bytes]]:
+    """``(event_id, frame)`` for notifications newer than ``after``, then the unread count.
+
+    Only the newest ``STREAM_BUFFER`` are replayed, so an old ``after`` does
+    not load the user's whole history; a ``resync`` event before them tells
+    the client to reload its list for the rest.
+    """
+    newest = (await db.scalars(select(Notification).where(
+        Notification.user_id == user_id,
+        Notification.id > after
+    ).order_by(Notification.id.desc()).limit(STREAM_BUFFER + 1))).all()
+    frames = [(None, RESYNC_FRAME)] if len(newest) > STREAM_BUFFER else []
+    frames += [(notification.id, notification_frame(notification)) for notification in reversed(newest[:STREAM_BUFFER])]
+    unread_count = await db.scalar(select(User.unread_notifications).where(User.id == user_id))
+    return frames + [(None, unread_frame(unread_count))]
+
+async def _catch_up(user_id: int, after: int) -> List[Tuple[Optional[int], bytes]]:
+    async with AsyncSessionLocal() as db:
+        return await _missed_frames(db, user_id, after)
+
+async def _stream(subscriber: Subscriber, claims: dict, floor: int,
+                  pending: List[Tuple[Optional[int], bytes]]) -> AsyncIterator[bytes]:
+    yield f"retry: {STREAM_RETRY_MS}\n\n".encode()
+    while True:
+        for event_id, frame in pending:
+            if event_id is not None:
+                # Ids at or below the starting point were sent on an earlier
+                # connection; above it, only ids already sent on this one are
+                # skipped, so a lower id that commits late still goes out
+                if event_id <= floor or not subscriber.first_send(event_id):
+                    continue
+            yield frame
+        await subscriber.wait()
+        if subscriber.closed:
+            return
+        if subscriber.heartbeat:
+            subscriber.heartbeat = False
+            if claims["exp"] <= time.time() or denylist.is_revoked(claims.get("sid")):
+                return  # the client reconnects with a fresh token
+            yield HEARTBEAT_FRAME
+        if subscriber.overflowed:
+            subscriber.overflowed = False
+            subscriber.frames.clear()
+            # Back to the oldest id it still remembers sending, which covers
+            # late lower ids among those dropped
+            pending = await _catch_up(subscriber.user_id, subscriber.resume_point(floor))
+        else:
+            pending, subscriber.frames = subscriber.frames, []
+
+class EventStreamResponse(Response):
+    """A subscriber's frames as ``text/event-stream``.
+
+    The frames are sent from the request's own task, with one small task
+    waiting for the client to disconnect. StreamingResponse would add a task
+    group and two tasks per connection, which adds up over thousands of idle
+    streams.
+    """
+    media_type = "text/event-stream"
+
+    def __init__(self, subscriber: Subscriber, frames: AsyncIterator[bytes]):
+        # No body, so no Content-Length header (as in StreamingResponse)
+        self.status_code = 200
+        self.background = None
+        self.subscriber = subscriber
+        self.frames = frames
+        self.init_headers({"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    async def _watch_disconnect(self, receive: Receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        self.subscriber.close()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        watcher = asyncio.get_running_loop().create_task(self._watch_disconnect(receive))
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            async for frame in self.frames:
+                await send({"type": "http.response.body", "body": frame, "more_body": True})
+            if not self.subscriber.closed:
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            watcher.cancel()
+            await self.frames.aclose()
+            hub.unsubscribe(self.subscriber)
+
+@router.get("/stream")
+async def stream_notifications(
+    last_event_id: Optional[str] = Header(None),
+    claims: dict = Depends(get_token_claims)
+):
+    """Server-sent events: ``notification`` for every new notification (its id
+    is the event id), ``unread`` with the badge count, and heartbeat comments.
+    Reconnecting with ``Last-Event-ID`` replays the notifications missed since."""
+    # One short-lived session: the stream must not hold a connection while idle
+    async with AsyncSessionLocal() as db:
+        user_id = await db.scalar(select(User.id).where(User.email == claims["sub"]))
+        if user_id is None:
+            raise HTTPException(status_code=401, detail="Could not validate credentials")
+        # Subscribe before reading what exists, so nothing published in between
+        # is lost; the stream skips ids it has already sent
+        subscriber = hub.subscribe(user_id)
+        try:
+            if last_event_id and last_event_id.isdigit():
+                last_id = int(last_event_id)
+            else:
+                last_id = await db.scalar(
+                    select(func.max(Notification.id)).where(Notification.user_id == user_id)
+                ) or 0
+            pending = await _missed_frames(db, user_id, last_id)
+        except BaseException:
+            hub.unsubscribe(subscriber)
+            raise
+
+    return EventStreamResponse(subscriber, _stream(subscriber, claims, last_id, pending))
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from ..database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from ..database import get_async_db
 from ..models import User, Offer, Request, Notification
 from ..schemas import Offer as OfferSchema, OfferCreate, OfferWithArtist, NotificationCreate, NotificationType
+from ..utils.pagination import paginate_async, DEFAULT_PAGE_SIZE
+from ..utils.notifications import add_unread
+from ..utils.notification_stream import publish_notifications
 from .auth import get_current_user
 
 router = APIRouter()
@@ -13,7 +17,7 @@ async def create_offer(
     request_id: int,
     offer_data: OfferCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create offer for a request (artists only)"""
     if current_user.role != "artist":
@@ -23,7 +27,7 @@ async def create_offer(
         raise HTTPException(status_code=403, detail="Artist must be verified to submit offers")
 
     # Check if request exists and is open
-    request = db.query(Request).filter(Request.id == request_id).first()
+    request = await db.get(Request, request_id)
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
 
@@ -31,10 +35,10 @@ async def create_offer(
         raise HTTPException(status_code=400, detail="Request is not open for offers")
 
     # Check if artist already submitted an offer for this request
-    existing_offer = db.query(Offer).filter(
+    existing_offer = await db.scalar(select(Offer).where(
         Offer.request_id == request_id,
         Offer.artist_id == current_user.id
-    ).first()
+    ))
 
     if existing_offer:
         raise HTTPException(status_code=400, detail="You already submitted an offer for this request")
@@ -46,8 +50,8 @@ async def create_offer(
         **offer_data.dict()
     )
     db.add(db_offer)
-    db.commit()
-    db.refresh(db_offer)
+    await db.commit()
+    await db.refresh(db_offer)
 
     # Notify customer
     notification = Notification(
@@ -59,9 +63,10 @@ async def create_offer(
         related_artist_id=current_user.id
     )
     db.add(notification)
-    db.commit()
-
-    return db_offer
+    for statement in add_unread([request.customer_id]):
+        await db.execute(statement)
+    await db.commit()
+    await publish_notifications(db, [notification])
 
     return db_offer
 
@@ -69,60 +74,70 @@ async def create_offer(
 async def get_request_offers(
     request_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all offers for a request (only for request owner)"""
-    request = db.query(Request).filter(Request.id == request_id).first()
+    request = await db.get(Request, request_id)
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
 
     if request.customer_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to view offers")
 
-    offers = db.query(Offer).join(User).filter(Offer.request_id == request_id).all()
+    rows = await db.execute(
+        select(Offer, User.name, User.username, User.profile_picture_url)
+        .join(User, User.id == Offer.artist_id)
+        .where(Offer.request_id == request_id)
+    )
 
     # Format offers with artist info
     offers_with_artist = []
-    for offer in offers:
+    for offer, artist_name, artist_username, artist_profile_picture in rows:
         offers_with_artist.append(OfferWithArtist(
-            **offer.__dict__,
-            artist_name=offer.artist.name,
-            artist_username=offer.artist.username,
-            artist_profile_picture=offer.artist.profile_picture_url
+            **OfferSchema.model_validate(offer).model_dump(),
+            artist_name=artist_name,
+            artist_username=artist_username,
+            artist_profile_picture=artist_profile_picture
         ))
 
     return offers_with_artist
 
 @router.get("/my-offers", response_model=List[OfferSchema])
 async def get_my_offers(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get current user's offers (artists only)"""
     if current_user.role != "artist":
         raise HTTPException(status_code=403, detail="Only artists can view their offers")
 
-    offers = db.query(Offer).filter(Offer.artist_id == current_user.id).all()
-    return offers
+    statement = select(Offer).where(Offer.artist_id == current_user.id)
+    return await paginate_async(db, statement, Offer, cursor, limit, response)
 
 @router.delete("/{offer_id}")
 async def delete_offer(
     offer_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete offer (only by owner, only if request is still open)"""
-    offer = db.query(Offer).join(Request).filter(Offer.id == offer_id).first()
-    if not offer:
+    row = (await db.execute(
+        select(Offer, Request.status).join(Request, Request.id == Offer.request_id).where(Offer.id == offer_id)
+    )).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Offer not found")
+    offer, request_status = row
 
     if offer.artist_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    if offer.request.status != "open":
+    if request_status != "open":
         raise HTTPException(status_code=400, detail="Cannot delete offer for closed request")
 
-    db.delete(offer)
-    db.commit()
+    await db.delete(offer)
+    await db.commit()
 
     return {"message": "Offer deleted"}
@@ -1,18 +1,56 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from ..database import get_db
-from ..models import User, Request, Offer, ReferenceImage, Notification
+from collections import defaultdict
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from ..database import get_async_db
+from ..models import User, Request, Offer, OfferStatus, ReferenceImage, Notification
 from ..schemas import Request as RequestSchema, RequestCreate, RequestUpdate, NotificationCreate, NotificationType
+from ..utils.pagination import paginate_async, DEFAULT_PAGE_SIZE
+from ..utils.notifications import add_unread, fan_out_new_request
+from ..utils.notification_stream import publish_notifications
 from .auth import get_current_user
 
 router = APIRouter()
 
+async def with_offer_counts_and_images(db: AsyncSession, requests: List[Request]) -> List[RequestSchema]:
+    """Attach offer counts and reference image URLs to a page of requests.
+
+    Uses one grouped COUNT and one IN query for the whole page, so the number
+    of queries does not grow with the number of requests.
+    """
+    request_ids = [request.id for request in requests]
+    if not request_ids:
+        return []
+
+    offer_counts = dict((await db.execute(
+        select(Offer.request_id, func.count(Offer.id))
+        .where(Offer.request_id.in_(request_ids))
+        .group_by(Offer.request_id)
+    )).all())
+    reference_images = defaultdict(list)
+    for request_id, image_url in await db.execute(
+        select(ReferenceImage.request_id, ReferenceImage.image_url)
+        .where(ReferenceImage.request_id.in_(request_ids))
+        .order_by(ReferenceImage.id)
+    ):
+        reference_images[request_id].append(image_url)
+
+    return [
+        RequestSchema.model_validate({
+            **{column.name: getattr(request, column.name) for column in Request.__table__.columns},
+            "offers_count": offer_counts.get(request.id, 0),
+            "reference_images": reference_images[request.id],
+        })
+        for request in requests
+    ]
+
 @router.post("/", response_model=RequestSchema)
 async def create_request(
     request_data: RequestCreate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create new art request (customers only)"""
     if current_user.role != "customer":
@@ -24,65 +62,42 @@ async def create_request(
         **request_data.dict(exclude={'reference_images'})
     )
     db.add(db_request)
-    db.commit()
-    db.refresh(db_request)
+    await db.flush()
 
     # Add reference images
-    if request_data.reference_images:
-        for image_url in request_data.reference_images:
-            ref_image = ReferenceImage(
-                request_id=db_request.id,
-                image_url=image_url
-            )
-            db.add(ref_image)
-        db.commit()
-
-    # Notify all eligible artists (verified with complete profiles)
-    eligible_artists = db.query(User).filter(
-        User.role == "artist",
-        User.is_artist_verified == True,
-        User.profile_picture_url.isnot(None),
-        User.bio.isnot(None),
-        User.bio != ""
-    ).all()
-
-    for artist in eligible_artists:
-        notification = Notification(
-            user_id=artist.id,
-            type=NotificationType.NEW_REQUEST,
-            title="New Art Request",
-            message=f"New request: {db_request.title}",
-            related_request_id=db_request.id
-        )
-        db.add(notification)
+    db.add_all([
+        ReferenceImage(request_id=db_request.id, image_url=image_url)
+        for image_url in request_data.reference_images or []
+    ])
+    await db.commit()
+    await db.refresh(db_request)
 
-    db.commit()
+    # Notify all eligible artists (verified with complete profiles) after the response is sent
+    background_tasks.add_task(fan_out_new_request, db_request.id)
 
-    return db_request
+    return (await with_offer_counts_and_images(db, [db_request]))[0]
 
 @router.get("/my-requests", response_model=List[RequestSchema])
 async def get_my_requests(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get current user's requests"""
-    requests = db.query(Request).filter(Request.customer_id == current_user.id).all()
-
-    # Add offer counts and reference images
-    for request in requests:
-        request.offers_count = db.query(Offer).filter(Offer.request_id == request.id).count()
-        request.reference_images = [
-            img.image_url for img in db.query(ReferenceImage).filter(
-                ReferenceImage.request_id == request.id
-            ).all()
-        ]
+    statement = select(Request).where(Request.customer_id == current_user.id)
+    requests = await paginate_async(db, statement, Request, cursor, limit, response)
 
-    return requests
+    return await with_offer_counts_and_images(db, requests)
 
 @router.get("/open", response_model=List[RequestSchema])
 async def get_open_requests(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all open requests (for artists)"""
     if current_user.role != "artist":
@@ -91,27 +106,19 @@ async def get_open_requests(
     if not current_user.is_artist_verified:
         raise HTTPException(status_code=403, detail="Artist must be verified to view requests")
 
-    requests = db.query(Request).filter(Request.status == "open").all()
+    statement = select(Request).where(Request.status == "open")
+    requests = await paginate_async(db, statement, Request, cursor, limit, response)
 
-    # Add offer counts and reference images
-    for request in requests:
-        request.offers_count = db.query(Offer).filter(Offer.request_id == request.id).count()
-        request.reference_images = [
-            img.image_url for img in db.query(ReferenceImage).filter(
-                ReferenceImage.request_id == request.id
-            ).all()
-        ]
-
-    return requests
+    return await with_offer_counts_and_images(db, requests)
 
 @router.get("/{request_id}", response_model=RequestSchema)
 async def get_request(
     request_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get specific request details"""
-    request = db.query(Request).filter(Request.id == request_id).first()
+    request = await db.get(Request, request_id)
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
 
@@ -121,25 +128,17 @@ async def get_request(
         current_user.role != "admin"):
         raise HTTPException(status_code=403, detail="Not authorized to view this request")
 
-    # Add offer count and reference images
-    request.offers_count = db.query(Offer).filter(Offer.request_id == request.id).count()
-    request.reference_images = [
-        img.image_url for img in db.query(ReferenceImage).filter(
-            ReferenceImage.request_id == request.id
-        ).all()
-    ]
-
-    return request
+    return (await with_offer_counts_and_images(db, [request]))[0]
 
 @router.put("/{request_id}/select-artist/{offer_id}")
 async def select_artist(
     request_id: int,
     offer_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Select an artist for the request (atomic operation)"""
-    request = db.query(Request).filter(Request.id == request_id).first()
+    request = await db.get(Request, request_id)
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
 
@@ -150,10 +149,10 @@ async def select_artist(
         raise HTTPException(status_code=400, detail="Request is not open")
 
     # Get the selected offer
-    selected_offer = db.query(Offer).filter(
+    selected_offer = await db.scalar(select(Offer).where(
         Offer.id == offer_id,
         Offer.request_id == request_id
-    ).first()
+    ))
     if not selected_offer:
         raise HTTPException(status_code=404, detail="Offer not found")
 
@@ -163,10 +162,10 @@ async def select_artist(
     selected_offer.status = "accepted"
 
     # Reject all other offers
-    db.query(Offer).filter(
+    await db.execute(update(Offer).where(
         Offer.request_id == request_id,
         Offer.id != offer_id
-    ).update({"status": "rejected"})
+    ).values(status=OfferStatus.REJECTED))
 
     # Create notifications
     # Notify selected artist
@@ -178,23 +177,28 @@ async def select_artist(
         related_request_id=request_id
     )
     db.add(selected_notification)
+    notifications = [selected_notification]
 
     # Notify rejected artists
-    rejected_offers = db.query(Offer).filter(
+    rejected_artist_ids = (await db.scalars(select(Offer.artist_id).where(
         Offer.request_id == request_id,
         Offer.id != offer_id
-    ).all()
+    ))).all()
 
-    for offer in rejected_offers:
+    for artist_id in rejected_artist_ids:
         rejected_notification = Notification(
-            user_id=offer.artist_id,
+            user_id=artist_id,
             type=NotificationType.OFFER_REJECTED,
             title="Offer Not Selected",
             message=f"Your offer for '{request.title}' was not selected",
             related_request_id=request_id
         )
         db.add(rejected_notification)
+        notifications.append(rejected_notification)
 
-    db.commit()
+    for statement in add_unread([selected_offer.artist_id, *rejected_artist_ids]):
+        await db.execute(statement)
+    await db.commit()
+    await publish_notifications(db, notifications)
 
     return {"message": "Artist selected successfully"}
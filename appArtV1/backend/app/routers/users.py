@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from datetime import datetime
-from ..database import get_db
+from ..database import get_db, get_async_db
 from ..models import User
-from ..schemas import User as UserSchema, UserUpdate
-from .auth import get_current_user
+from ..utils import autocomplete, feed, images, search
+from ..utils.pagination import fetch_page, set_next_cursor, DEFAULT_PAGE_SIZE
+from ..schemas import User as UserSchema, UserUpdate, UserSuggestion, UserRole
+from .auth import get_current_user, get_read_db, invalidate_principal
 
 router = APIRouter()
 
@@ -19,55 +23,94 @@ def update_current_user(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    previous_email = current_user.email
+    previous_picture = current_user.profile_picture_url
     update_data = user_update.dict(exclude_unset=True)
+    # Customers and artists may switch roles, but admin is never self-granted
+    # (nor given up here, which would strand the deployment without one)
+    new_role = update_data.get("role", current_user.role)
+    if new_role != current_user.role and UserRole.ADMIN in (new_role, current_user.role):
+        raise HTTPException(status_code=403, detail="The admin role cannot be changed through a profile update")
     for field, value in update_data.items():
         setattr(current_user, field, value)
+    released = []
+    if current_user.profile_picture_url != previous_picture:
+        released = images.release(db, previous_picture)
+        asset = images.retain(db, current_user.profile_picture_url)
+        current_user.profile_picture_variants = asset.variants if asset else None
 
-    # Update artist verification status if profile/bio changed
-    if current_user.role == "artist" and ('profile_picture_url' in update_data or 'bio' in update_data):
-        # TODO: Re-enable when Artwork model is available
-        # artist_artworks = db.query(Artwork).filter(Artwork.artist_id == current_user.id).count()
-        artist_artworks = 0
-        has_profile_complete = (
-            current_user.profile_picture_url is not None and
-            current_user.bio is not None and
-            current_user.bio.strip() != ""
-        )
-        current_user.is_artist_verified = artist_artworks >= 3 and has_profile_complete
+    # Update artist verification status (and the feed with it) if role/profile/bio changed
+    if {'role', 'profile_picture_url', 'bio'} & update_data.keys():
+        feed.refresh_artist_verification(db, current_user)
+
+    if {'name', 'username', 'bio'} & update_data.keys():
+        search.index_user(db, current_user)
 
     current_user.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(current_user)
+    feed.invalidate_cache(current_user.id)
+    autocomplete.user_index.upsert(current_user)
+    invalidate_principal(previous_email, current_user.email)
+    if released:
+        anyio.from_thread.run(images.purge, released)
     return current_user
 
+@router.post("/me/images")
+async def upload_profile_picture(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Store a profile picture sent as the raw request body; pass the returned
+    image_url as profile_picture_url to PUT /users/me"""
+    asset = await images.ingest_upload(request, db, current_user.id)
+    return {"image_url": asset.url, "variants": asset.variants}
+
 @router.get("/search", response_model=List[UserSchema])
 def search_users(
+    response: Response,
     q: str = "",
     role: str = None,
     eligible_only: bool = False,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """Search users with optional filtering"""
-    query = db.query(User)
-
-    # Text search on name or username
-    if q:
-        query = query.filter(
-            (User.name.ilike(f"%{q}%")) |
-            (User.username.ilike(f"%{q}%"))
-        )
+    """Search users with optional filtering; matches are ranked best first"""
+    filters = []
 
     # Role filter
     if role:
-        query = query.filter(User.role == role)
+        filters.append(User.role == role)
 
     # Eligible only filter (artists only for now)
     if eligible_only:
-        query = query.filter(User.role == "artist").filter(User.is_artist_verified == True)
+        filters.extend([User.role == "artist", User.is_artist_verified == True])
 
     # Don't include current user in results
-    query = query.filter(User.id != current_user.id)
+    filters.append(User.id != current_user.id)
 
-    users = query.limit(50).all()
+    # Text search on name, username and bio through the full-text index
+    if q.strip():
+        users, next_cursor = search.search_page(db, q, filters, cursor, limit)
+    else:
+        users, next_cursor = fetch_page(db.query(User).filter(*filters), User, cursor, limit)
+    set_next_cursor(response, next_cursor)
     return users
+
+@router.get("/autocomplete", response_model=List[UserSuggestion])
+def autocomplete_users(
+    q: str = "",
+    role: str = None,
+    eligible_only: bool = False,
+    limit: int = autocomplete.DEFAULT_LIMIT,
+    current_user: User = Depends(get_current_user)
+):
+    """Search-as-you-type on name and username prefixes, served from memory"""
+    return [
+        suggestion._asdict() for suggestion in autocomplete.user_index.complete(
+            q, limit, role=role, eligible_only=eligible_only, exclude_id=current_user.id
+        )
+    ]
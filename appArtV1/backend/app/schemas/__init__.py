@@ -1,6 +1,6 @@
-from .user import User, UserCreate, UserUpdate, UserInDB, UserRole, ArtistProfile
-from .auth import Token, TokenData, LoginRequest, RefreshTokenRequest
-from .artwork import Artwork, ArtworkCreate, ArtworkUpdate
+from .user import User, UserCreate, UserUpdate, UserInDB, UserRole, ArtistProfile, UserSuggestion
+from .auth import Token, TokenData, LoginRequest, RefreshTokenRequest, Session
+from .artwork import Artwork, ArtworkCreate, ArtworkUpdate, ArtworkUploadRequest, ArtworkUploadUrl, ArtworkUploadComplete
 from .request import Request, RequestCreate, RequestUpdate, RequestStatus
 from .offer import Offer, OfferCreate, OfferUpdate, OfferStatus, OfferWithArtist
 from .notification import Notification, NotificationCreate, NotificationType
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 
 class ArtworkBase(BaseModel):
@@ -13,10 +13,23 @@ class ArtworkCreate(ArtworkBase):
 class ArtworkUpdate(ArtworkBase):
     pass
 
+class ArtworkUploadRequest(BaseModel):
+    content_type: str
+
+class ArtworkUploadUrl(BaseModel):
+    key: str
+    url: str
+    fields: Dict[str, str]
+    expires_in: int
+
+class ArtworkUploadComplete(ArtworkBase):
+    key: str
+
 class Artwork(ArtworkBase):
     id: int
     artist_id: int
     image_url: str
+    variants: Optional[Dict[str, str]] = None
     created_at: datetime
 
     class Config:
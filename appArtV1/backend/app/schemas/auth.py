@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Optional
 from pydantic import BaseModel, EmailStr
 
@@ -15,3 +16,14 @@ class LoginRequest(BaseModel):
 
 class RefreshTokenRequest(BaseModel):
     refresh_token: str
+
+class Session(BaseModel):
+    id: str
+    user_agent: Optional[str]
+    created_at: datetime
+    last_refreshed_at: Optional[datetime]
+    expires_at: datetime
+    current: bool = False
+
+    class Config:
+        from_attributes = True
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 from enum import Enum
 
@@ -31,6 +31,7 @@ class User(UserBase):
     role: UserRole
     is_active: bool
     profile_picture_url: Optional[str]
+    profile_picture_variants: Optional[Dict[str, str]] = None
     bio: Optional[str]
     is_artist_verified: bool
     created_at: datetime
@@ -39,6 +40,13 @@ class User(UserBase):
     class Config:
         from_attributes = True
 
+class UserSuggestion(BaseModel):
+    id: int
+    username: Optional[str]
+    name: str
+    role: UserRole
+    is_artist_verified: bool
+
 class UserInDB(User):
     hashed_password: str
 
@@ -1,5 +1,6 @@
+import uuid
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from decouple import config
@@ -9,11 +10,24 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+# Stored hashes with fewer rounds are rehashed at the next successful login
+PASSWORD_HASH_ROUNDS = config("PASSWORD_HASH_ROUNDS", default=29000, cast=int)
+
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=PASSWORD_HASH_ROUNDS,
+    pbkdf2_sha256__min_rounds=PASSWORD_HASH_ROUNDS,
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Whether the password matches, and a replacement hash when the stored one
+    uses outdated parameters."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
@@ -24,6 +38,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
+    to_encode.setdefault("jti", uuid.uuid4().hex)
     to_encode.update({"exp": expire, "type": "access"})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
@@ -31,18 +46,21 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 def create_refresh_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    to_encode.setdefault("jti", uuid.uuid4().hex)
     to_encode.update({"exp": expire, "type": "refresh"})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str, token_type: str = "access"):
+def decode_token(token: str, token_type: str = "access") -> Optional[dict]:
+    """Verify a JWT and return its claims, or None if invalid/expired/wrong type"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        token_type_in_payload: str = payload.get("type")
-
-        if email is None or token_type_in_payload != token_type:
-            return None
-        return email
     except JWTError:
         return None
+    if payload.get("sub") is None or payload.get("type") != token_type:
+        return None
+    return payload
+
+def verify_token(token: str, token_type: str = "access"):
+    payload = decode_token(token, token_type)
+    return None if payload is None else payload["sub"]
@@ -0,0 +1,125 @@
+"""In-process prefix index for ``/users/autocomplete``.
+
+Usernames, full names and each later word of a name are normalized (case and
+accents folded) into one sorted list of ``(key, user_id)`` pairs, so a prefix
+lookup is a bisect plus a short forward scan, with no database round trip.
+Each user's display fields and filter flags are packed in a tuple alongside.
+
+The user write paths update the index after they commit;
+``AUTOCOMPLETE_RELOAD_INTERVAL`` reloads it in full.
+"""
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy.orm import Session
+from ..models import User
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 25
+
+
+class Suggestion(NamedTuple):
+    id: int
+    username: Optional[str]
+    name: str
+    role: str
+    is_artist_verified: bool
+
+
+def normalize(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold().strip()
+
+
+def _keys(suggestion: Suggestion) -> set:
+    keys = set()
+    if suggestion.username:
+        keys.add(normalize(suggestion.username))
+    words = normalize(suggestion.name).split()
+    for start in range(len(words)):
+        keys.add(" ".join(words[start:]))
+    keys.discard("")
+    return keys
+
+
+def _suggestion(user: User) -> Suggestion:
+    role = getattr(user.role, "value", user.role)
+    return Suggestion(user.id, user.username, user.name, role, bool(user.is_artist_verified))
+
+
+class PrefixIndex:
+    """Thread-safe sorted-array prefix index over user names and usernames."""
+
+    def __init__(self):
+        self._entries: List[Tuple[str, int]] = []
+        self._users: Dict[int, Suggestion] = {}
+        self._lock = threading.Lock()
+        self.lookups = 0
+
+    def load(self, db: Session) -> int:
+        """Rebuild the index from ``users`` and return how many it holds."""
+        rows = db.query(User.id, User.username, User.name, User.role, User.is_artist_verified)
+        users = {row.id: _suggestion(row) for row in rows}
+        entries = sorted((key, user_id) for user_id, suggestion in users.items() for key in _keys(suggestion))
+        with self._lock:
+            self._entries, self._users = entries, users
+        return len(users)
+
+    def upsert(self, user: User):
+        """Index a new user or re-index a changed one. Call after commit."""
+        self._put(_suggestion(user))
+
+    def set_verified(self, user_id: int, verified: bool):
+        with self._lock:
+            current = self._users.get(user_id)
+            if current is not None:
+                self._users[user_id] = current._replace(is_artist_verified=verified)
+
+    def _put(self, suggestion: Suggestion):
+        with self._lock:
+            previous = self._users.get(suggestion.id)
+            old_keys = _keys(previous) if previous else set()
+            new_keys = _keys(suggestion)
+            for key in old_keys - new_keys:
+                position = bisect_left(self._entries, (key, suggestion.id))
+                if position < len(self._entries) and self._entries[position] == (key, suggestion.id):
+                    del self._entries[position]
+            for key in new_keys - old_keys:
+                insort(self._entries, (key, suggestion.id))
+            self._users[suggestion.id] = suggestion
+
+    def complete(self, prefix: str, limit: int = DEFAULT_LIMIT, role: Optional[str] = None,
+                 eligible_only: bool = False, exclude_id: Optional[int] = None) -> List[Suggestion]:
+        """Users with a name word or username starting with ``prefix``, in key order."""
+        prefix = normalize(prefix)
+        limit = max(1, min(limit, MAX_LIMIT))
+        if not prefix:
+            return []
+        results: List[Suggestion] = []
+        seen = set()
+        with self._lock:
+            self.lookups += 1
+            position = bisect_left(self._entries, (prefix,))
+            while position < len(self._entries) and len(results) < limit:
+                key, user_id = self._entries[position]
+                position += 1
+                if not key.startswith(prefix):
+                    break
+                if user_id in seen or user_id == exclude_id:
+                    continue
+                seen.add(user_id)
+                suggestion = self._users[user_id]
+                if role and suggestion.role != role:
+                    continue
+                if eligible_only and not (suggestion.role == "artist" and suggestion.is_artist_verified):
+                    continue
+                results.append(suggestion)
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"users": len(self._users), "keys": len(self._entries), "lookups": self.lookups}
+
+
+user_index = PrefixIndex()
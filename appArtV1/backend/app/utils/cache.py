@@ -0,0 +1,114 @@
+"""Small in-process response cache: TTL + LRU eviction with single-flight loads.
+
+Each worker process keeps its own cache, so entries are only invalidated
+locally; the TTL bounds how long another worker can serve a stale page.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+_registry: Dict[str, "TTLCache"] = {}
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire ``ttl`` seconds after load.
+
+    Keys are tuples whose first element is a namespace, which lets writers drop
+    a whole family of entries (e.g. every feed page) with :meth:`invalidate`.
+    Concurrent misses on one key run the loader once and share its result.
+    A loader returning ``None`` means "not found"; that result is not stored, so
+    the next lookup asks the loader again.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 30.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        _registry[name] = self
+
+    def get_or_load(self, key: Tuple, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                generation = self._generation
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                # Skip storing if a writer invalidated while we were loading
+                if flight.error is None and flight.value is not None and generation == self._generation:
+                    self._store(key, flight.value)
+            flight.done.set()
+        return flight.value
+
+    def _store(self, key: Tuple, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *prefix) -> int:
+        """Drop entries whose key starts with ``prefix`` (all entries if empty)."""
+        with self._lock:
+            self._generation += 1
+            stale = [key for key in self._entries if key[:len(prefix)] == prefix]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def cache_stats() -> dict:
+    """Stats for every cache created in this process, keyed by name."""
+    return {name: cache.stats() for name, cache in _registry.items()}
@@ -0,0 +1,91 @@
+"""Maintenance of the materialized verified-artist feed (``feed_entries``).
+
+Every write path that can change what the feed shows goes through here inside
+its own transaction, so ``/artworks/feed`` can read ``feed_entries`` alone
+without joining ``users``. Rows are always copied with ``INSERT ... SELECT`` so
+``created_at`` keeps the exact stored value the cursor paginator compares on.
+"""
+from decouple import config
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+from ..models import Artwork, FeedEntry, User
+from .cache import TTLCache
+
+MIN_VERIFIED_ARTWORKS = 3
+
+# Serialized pages of /artworks/feed ("feed", cursor, limit) and
+# /artworks/artist/{id} ("artist", artist_id, cursor, limit)
+feed_cache = TTLCache(
+    "artworks",
+    maxsize=config("FEED_CACHE_SIZE", default=512, cast=int),
+    ttl=config("FEED_CACHE_TTL", default=30.0, cast=float),
+)
+
+_FEED_COLUMNS = ["id", "artist_id", "title", "description", "image_url", "variants", "style_tags", "created_at"]
+
+
+def _copy_artworks(db: Session, *criteria):
+    source = select(
+        Artwork.id, Artwork.artist_id, Artwork.title, Artwork.description,
+        Artwork.image_url, Artwork.variants, Artwork.style_tags, Artwork.created_at
+    ).join(User, User.id == Artwork.artist_id).where(
+        User.is_artist_verified == True,
+        Artwork.id.not_in(select(FeedEntry.id)),
+        *criteria
+    )
+    db.execute(insert(FeedEntry).from_select(_FEED_COLUMNS, source))
+
+
+def has_complete_profile(user: User) -> bool:
+    return (
+        user.profile_picture_url is not None and
+        user.bio is not None and
+        user.bio.strip() != ""
+    )
+
+
+def refresh_artist_verification(db: Session, artist: User) -> bool:
+    """Recompute ``is_artist_verified`` (3+ artworks and a complete profile)
+    and bring the artist's feed entries in line with it. Does not commit."""
+    artworks_count = db.query(Artwork).filter(Artwork.artist_id == artist.id).count()
+    artist.is_artist_verified = (
+        artist.role == "artist" and
+        artworks_count >= MIN_VERIFIED_ARTWORKS and
+        has_complete_profile(artist)
+    )
+    db.flush()
+    if artist.is_artist_verified:
+        _copy_artworks(db, Artwork.artist_id == artist.id)
+    else:
+        db.execute(delete(FeedEntry).where(FeedEntry.artist_id == artist.id))
+    return artist.is_artist_verified
+
+
+def sync_artwork(db: Session, artwork: Artwork):
+    """Mirror an edited artwork into the feed if it is listed there."""
+    db.execute(update(FeedEntry).where(FeedEntry.id == artwork.id).values(
+        title=artwork.title,
+        description=artwork.description,
+        image_url=artwork.image_url,
+        variants=artwork.variants,
+        style_tags=artwork.style_tags
+    ))
+
+
+def remove_artwork(db: Session, artwork_id: int):
+    db.execute(delete(FeedEntry).where(FeedEntry.id == artwork_id))
+
+
+def invalidate_cache(artist_id: int):
+    """Drop cached feed and portfolio pages touched by a write. Call after commit."""
+    feed_cache.invalidate("feed")
+    feed_cache.invalidate("artist", artist_id)
+
+
+def rebuild_feed(db: Session) -> int:
+    """Repopulate ``feed_entries`` from scratch and return its new size."""
+    db.execute(delete(FeedEntry))
+    _copy_artworks(db)
+    db.commit()
+    feed_cache.invalidate()
+    return db.query(FeedEntry).count()
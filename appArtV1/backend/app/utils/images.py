@@ -0,0 +1,478 @@
+"""Image ingestion and derivatives: resized copies, WebP versions and a blur
+placeholder (LQIP) for every uploaded artwork or profile picture.
+
+:func:`ingest_upload` streams a request body into storage, renders the
+derivatives and records an ``ImageAsset`` whose ``variants`` map is copied
+onto the artwork or user that later references the image URL. Derivatives are
+stored next to the original (``<stem>_w640.webp``). Rendering is CPU-bound,
+so :func:`render_derivatives` runs in a process pool of ``IMAGE_WORKERS``
+processes and the event loop only awaits it.
+
+Uploads are never held whole in memory: while the body streams to storage it
+is hashed and copied into a :class:`Spool` (memory for the first
+``SPOOL_MEMORY_BYTES``, a temporary file after that), which the render reads
+instead of downloading the stored object again. At most
+``INGEST_CONCURRENCY`` ingests run at once per process; others wait their turn.
+
+Large files can bypass the API: :func:`direct_upload` hands out presigned
+credentials for a key under the owner's folder, the client uploads straight to
+storage, and :func:`complete_direct_upload` checks the object before it is used.
+
+Storage is content-addressed (:func:`blob_key`), so an image uploaded twice is
+stored once. Rows using an image take a reference with :func:`retain` and drop
+it with :func:`release`; the last release deletes the blob and its derivatives.
+Every upload that hands out a URL, new or matched, also leases the asset for
+``IMAGE_LEASE_SECONDS``, so it survives until the uploader has had time to
+create the artwork even if its other users let go in the meantime; leases
+that ran out unused are cleaned up by :func:`release_unused`.
+"""
+import asyncio
+import base64
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+import urllib.request
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
+import anyio
+from decouple import config
+from fastapi import HTTPException, Request
+from PIL import Image, ImageFilter, ImageOps
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from ..models import Artwork, ImageAsset, User
+from . import feed, near_duplicates
+from .process_pool import SpawnPool
+from .storage import storage, MAX_UPLOAD_BYTES, UploadTooLarge, io_executor
+
+# Accepted upload types, with the extension originals are stored under
+IMAGE_TYPES = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp", "image/gif": "gif"}
+# Derivatives are JPEG (PNG when the image has transparency) plus WebP
+CONTENT_TYPES = {"jpg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+WIDTHS = (320, 640, 1080)
+PLACEHOLDER_WIDTH = 16
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+# Seconds presigned direct-upload credentials stay valid
+DIRECT_UPLOAD_EXPIRES = config("DIRECT_UPLOAD_EXPIRES", default=900, cast=int)
+IMAGE_WORKERS = config("IMAGE_WORKERS", default=2, cast=int)
+# Seconds an uploaded (or matched) image is kept for its uploader to use
+IMAGE_LEASE_SECONDS = config("IMAGE_LEASE_SECONDS", default=3600, cast=int)
+# Uploads streamed, hashed and rendered at once per process
+INGEST_CONCURRENCY = config("INGEST_CONCURRENCY", default=4, cast=int)
+# Upload bytes kept in memory before the spool moves to a temporary file
+SPOOL_MEMORY_BYTES = 1024 * 1024
+Image.MAX_IMAGE_PIXELS = config("MAX_IMAGE_PIXELS", default=50_000_000, cast=int)
+
+logger = logging.getLogger(__name__)
+_pool = SpawnPool(IMAGE_WORKERS)
+_ingest_slots: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = None
+
+
+class InvalidImage(Exception):
+    pass
+
+
+def _encode(image: Image.Image, extension: str) -> bytes:
+    buffer = io.BytesIO()
+    if extension == "webp":
+        image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+    elif extension == "png":
+        image.save(buffer, "PNG", optimize=True)
+    else:
+        image.save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def render_derivatives(source: Union[bytes, str]) -> Tuple[Dict[str, Tuple[bytes, str]], str, Optional[int]]:
+    """Render every derivative of an encoded image, given as bytes or a file path.
+
+    Returns ``({variant: (encoded bytes, extension)}, placeholder data URI,
+    perceptual hash)``.
+    Widths above the original's are skipped; an image narrower than the
+    smallest width gets one variant at its own width. Runs in the process pool.
+    """
+    try:
+        with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as opened:
+            image = ImageOps.exif_transpose(opened)
+            image.load()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as exc:
+        raise InvalidImage(str(exc))
+
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha else "RGB")
+    extension = "png" if has_alpha else "jpg"
+
+    rendered = {}
+    for width in [w for w in WIDTHS if w < image.width] or [image.width]:
+        resized = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        rendered[f"w{width}"] = (_encode(resized, extension), extension)
+        rendered[f"w{width}_webp"] = (_encode(resized, "webp"), "webp")
+
+    height = max(1, round(image.height * PLACEHOLDER_WIDTH / image.width))
+    tiny = image.convert("RGB").resize((PLACEHOLDER_WIDTH, height), Image.BILINEAR).filter(ImageFilter.GaussianBlur(1))
+    buffer = io.BytesIO()
+    tiny.save(buffer, "JPEG", quality=50)
+    placeholder = "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+    return rendered, placeholder, near_duplicates.to_signed(near_duplicates.dhash(image))
+
+
+def shutdown_pool():
+    _pool.shutdown()
+
+
+async def derive(source: Union[bytes, str], stem: str) -> Tuple[Dict[str, str], Optional[int]]:
+    """Render the derivatives of ``source`` (bytes or a file path), store them as ``<stem>_<variant>.<ext>``
+    and return the variants map and the image hash.
+
+    A pool whose worker died is replaced and the render retried once; a second
+    BrokenProcessPool is raised to the caller.
+    """
+    rendered, placeholder, image_hash = await _pool.run(render_derivatives, source)
+    names = list(rendered)
+    urls = await asyncio.gather(*[
+        storage.put_bytes(f"{stem}_{name.split('_')[0]}.{rendered[name][1]}", rendered[name][0],
+                          CONTENT_TYPES[rendered[name][1]])
+        for name in names
+    ])
+    return {**dict(zip(names, urls)), "placeholder": placeholder}, image_hash
+
+
+async def derive_url(url: str) -> Tuple[Dict[str, str], Optional[int]]:
+    """Derivatives for an existing image URL (backfill). Images in our storage
+    get them next to the original; others under ``derived/``."""
+    key = storage.key_for_url(url)
+    if key is not None:
+        return await derive(await storage.get_bytes(key), key.rsplit(".", 1)[0])
+
+    def download():
+        with urllib.request.urlopen(url, timeout=30) as response:
+            return response.read(MAX_UPLOAD_BYTES + 1)
+    data = await asyncio.get_running_loop().run_in_executor(io_executor, download)
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise InvalidImage(f"{url} is larger than {MAX_UPLOAD_BYTES} bytes")
+    return await derive(data, f"derived/{hashlib.sha256(url.encode()).hexdigest()[:32]}")
+
+
+class Spool:
+    """A local copy of an upload as it streams past, for the render workers:
+    bytes in memory up to ``SPOOL_MEMORY_BYTES``, then a named temporary file
+    (the workers are separate processes, so they open it by path)."""
+
+    def __init__(self):
+        self.digest = hashlib.sha256()
+        self._buffer = bytearray()
+        self._file = None
+
+    async def write(self, chunk: bytes):
+        self.digest.update(chunk)
+        if self._file is None and len(self._buffer) + len(chunk) <= SPOOL_MEMORY_BYTES:
+            self._buffer += chunk
+            return
+        loop = asyncio.get_running_loop()
+        if self._file is None:
+            self._file = await loop.run_in_executor(
+                io_executor, lambda: tempfile.NamedTemporaryFile(prefix="upload-", delete=False)
+            )
+            chunk, self._buffer = bytes(self._buffer) + chunk, bytearray()
+        await loop.run_in_executor(io_executor, self._file.write, chunk)
+
+    async def source(self) -> Union[bytes, str]:
+        """What :func:`render_derivatives` reads: the bytes or the file's path."""
+        if self._file is None:
+            return bytes(self._buffer)
+        await asyncio.get_running_loop().run_in_executor(io_executor, self._file.flush)
+        return self._file.name
+
+    async def close(self):
+        if self._file is not None:
+            file, self._file = self._file, None
+            await asyncio.get_running_loop().run_in_executor(io_executor, lambda: (file.close(), os.remove(file.name)))
+        self._buffer = bytearray()
+
+
+async def _spooled(chunks: AsyncIterator[bytes], spool: Spool) -> AsyncIterator[bytes]:
+    async for chunk in chunks:
+        await spool.write(chunk)
+        yield chunk
+
+
+def ingest_slots() -> asyncio.Semaphore:
+    """The semaphore bounding concurrent ingests, for the running loop."""
+    global _ingest_slots
+    loop = asyncio.get_running_loop()
+    if _ingest_slots is None or _ingest_slots[0] is not loop:
+        _ingest_slots = (loop, asyncio.Semaphore(INGEST_CONCURRENCY))
+    return _ingest_slots[1]
+
+
+def _lease_expiry() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=IMAGE_LEASE_SECONDS)
+
+
+def _lease(sha256: str, *criteria):
+    """UPDATE ... RETURNING that leases the asset stored for ``sha256``. It
+    returns nothing when there is none, or when a release deleting it got the
+    row first, so checking for known bytes and leasing them is one step."""
+    return (update(ImageAsset).where(ImageAsset.sha256 == sha256, *criteria)
+            .values(leased_until=_lease_expiry()).returning(ImageAsset))
+
+
+def blob_key(sha256: str, extension: str) -> str:
+    """Content-addressed storage key: equal bytes always map to one object."""
+    return f"images/{sha256[:2]}/{sha256}.{extension}"
+
+
+async def _new_blob(source: str, spool: Spool, content_type: str, owner_id: int) -> ImageAsset:
+    """Render the derivatives of an upload stored at ``source`` (and copied
+    into ``spool``), move it to its content-addressed key and return an
+    unsaved ``ImageAsset``."""
+    sha256 = spool.digest.hexdigest()
+    key = blob_key(sha256, IMAGE_TYPES[content_type])
+    try:
+        variants, image_hash = await derive(await spool.source(), key.rsplit(".", 1)[0])
+    except InvalidImage:
+        await storage.delete(source)
+        raise HTTPException(status_code=400, detail="The upload is not a readable image")
+    except BrokenProcessPool:
+        # Killed a fresh pool as well, so likely by this image: do not keep it
+        await storage.delete(source)
+        raise HTTPException(status_code=503, detail="Image processing is unavailable, try again shortly",
+                            headers={"Retry-After": "1"})
+    url = await storage.move(source, key)
+    return ImageAsset(key=key, url=url, owner_id=owner_id, content_type=content_type,
+                      sha256=sha256, variants=variants, image_hash=image_hash, leased_until=_lease_expiry())
+
+
+async def ingest_upload(request: Request, db: AsyncSession, owner_id: int) -> ImageAsset:
+    """Store the raw request body as an image, render its derivatives and
+    record it. Raises 413/415/400 for oversized, unsupported or unreadable images.
+
+    Bytes that are already stored resolve to the existing asset. A client
+    that sends ``X-Content-SHA256`` for bytes it uploaded itself before skips
+    the transfer entirely, which also makes retrying an upload free. Anyone
+    else has to send the bytes: a hash alone proves nothing.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in IMAGE_TYPES:
+        raise HTTPException(status_code=415, detail=f"Unsupported image type; use one of {', '.join(IMAGE_TYPES)}")
+    if int(request.headers.get("content-length") or 0) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Images are limited to {MAX_UPLOAD_BYTES} bytes")
+    claimed = request.headers.get("x-content-sha256", "").strip().lower() or None
+    if claimed is not None:
+        existing = await db.scalar(_lease(claimed, ImageAsset.owner_id == owner_id))
+        await db.commit()
+        if existing is not None:
+            return existing
+
+    async with ingest_slots():
+        # Stream to a scratch key while hashing; the content key is only known at the end
+        scratch = f"uploads/{uuid.uuid4().hex}.{IMAGE_TYPES[content_type]}"
+        spool = Spool()
+        try:
+            try:
+                await storage.put_stream(scratch, _spooled(request.stream(), spool), content_type)
+            except UploadTooLarge:
+                raise HTTPException(status_code=413, detail=f"Images are limited to {MAX_UPLOAD_BYTES} bytes")
+            sha256 = spool.digest.hexdigest()
+            if claimed is not None and claimed != sha256:
+                await storage.delete(scratch)
+                raise HTTPException(status_code=400, detail="X-Content-SHA256 does not match the uploaded bytes")
+
+            existing = await db.scalar(_lease(sha256))
+            await db.commit()
+            if existing is not None:
+                await storage.delete(scratch)
+                return existing
+            asset = await _new_blob(scratch, spool, content_type, owner_id)
+        finally:
+            await spool.close()
+    db.add(asset)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # The same bytes were uploaded concurrently and stored at the same key
+        await db.rollback()
+        asset = await db.scalar(_lease(sha256))
+        await db.commit()
+    return asset
+
+
+def direct_upload(owner_id: int, folder: str, content_type: str) -> dict:
+    """Presigned credentials for uploading one image straight to storage."""
+    if content_type not in IMAGE_TYPES:
+        raise HTTPException(status_code=415, detail=f"Unsupported image type; use one of {', '.join(IMAGE_TYPES)}")
+    key = f"{folder}/{owner_id}/{uuid.uuid4().hex}.{IMAGE_TYPES[content_type]}"
+    try:
+        target = storage.presign_upload(key, content_type, MAX_UPLOAD_BYTES, DIRECT_UPLOAD_EXPIRES)
+    except NotImplementedError:
+        raise HTTPException(status_code=501, detail="Direct uploads need the s3 storage backend")
+    return {"key": key, "expires_in": DIRECT_UPLOAD_EXPIRES, **target}
+
+
+async def _check_direct_upload(owner_id: int, folder: str, key: str) -> str:
+    """The content type of an issued, present and small enough upload key."""
+    content_types = {extension: content_type for content_type, extension in IMAGE_TYPES.items()}
+    issued = re.fullmatch(rf"{folder}/{owner_id}/[0-9a-f]{{32}}\.(\w+)", key)
+    if issued is None or issued.group(1) not in content_types:
+        raise HTTPException(status_code=403, detail="Not an upload key issued to this user")
+
+    size = await storage.stat(key)
+    if size is None:
+        raise HTTPException(status_code=404, detail="Nothing has been uploaded to this key")
+    if size > MAX_UPLOAD_BYTES:
+        await storage.delete(key)
+        raise HTTPException(status_code=413, detail=f"Images are limited to {MAX_UPLOAD_BYTES} bytes")
+    return content_types[issued.group(1)]
+
+
+async def _spool_object(key: str, spool: Spool):
+    async for chunk in storage.get_stream(key):
+        await spool.write(chunk)
+
+
+def complete_direct_upload(db: Session, owner_id: int, folder: str, key: str) -> ImageAsset:
+    """Check that a direct upload landed and is a readable image, and return
+    its asset: an existing one for known bytes, else a new one added to ``db``.
+    Rejected objects are deleted. Call from a sync route's worker thread; the
+    storage work is run on the event loop."""
+    content_type = anyio.from_thread.run(_check_direct_upload, owner_id, folder, key)
+    slots = anyio.from_thread.run_sync(ingest_slots)
+    anyio.from_thread.run(slots.acquire)
+    spool = Spool()
+    try:
+        # Streamed through a spool to hash and render it, never read whole
+        anyio.from_thread.run(_spool_object, key, spool)
+        # The caller retains the asset in this same transaction, so the lease
+        # is only there to claim the row against a concurrent release
+        asset = db.scalar(_lease(spool.digest.hexdigest()))
+        if asset is not None:
+            anyio.from_thread.run(storage.delete, key)
+            return asset
+        asset = anyio.from_thread.run(_new_blob, key, spool, content_type, owner_id)
+    finally:
+        anyio.from_thread.run(spool.close)
+        anyio.from_thread.run_sync(slots.release)
+    db.add(asset)
+    return asset
+
+
+def discard(db: Session, asset: ImageAsset):
+    """Roll back a transaction that added the new ``asset`` from
+    :func:`complete_direct_upload` and delete the files stored for it, unless
+    a concurrent upload of the same bytes has recorded them since. Call from
+    a sync route's worker thread."""
+    keys = _storage_keys(asset)
+    sha256 = asset.sha256
+    db.rollback()
+    if db.scalar(select(ImageAsset.id).where(ImageAsset.sha256 == sha256)) is None:
+        anyio.from_thread.run(purge, keys)
+
+
+def retain(db: Session, url: Optional[str]) -> Optional[ImageAsset]:
+    """Count a new artwork or profile picture using ``url`` and return its
+    asset, or None for images not uploaded here. Raises 400 for a URL of
+    this storage whose image has since been deleted. Does not commit."""
+    if not url:
+        return None
+    asset = db.scalar(update(ImageAsset).where(ImageAsset.url == url)
+                      .values(ref_count=ImageAsset.ref_count + 1).returning(ImageAsset))
+    if asset is None and storage.key_for_url(url) is not None:
+        raise HTTPException(status_code=400, detail="This image is no longer stored; upload it again")
+    return asset
+
+
+def _storage_keys(asset: ImageAsset) -> List[str]:
+    derived = [storage.key_for_url(variant) for name, variant in (asset.variants or {}).items() if name != "placeholder"]
+    return [asset.key] + [key for key in dict.fromkeys(derived) if key is not None]
+
+
+def release(db: Session, url: Optional[str]) -> List[str]:
+    """Drop one reference to ``url``. When it was the last, the asset row is
+    deleted and its storage keys are returned for :func:`purge` to remove once
+    the transaction has committed. Does not commit."""
+    if not url:
+        return []
+    db.execute(update(ImageAsset).where(ImageAsset.url == url, ImageAsset.ref_count > 0)
+               .values(ref_count=ImageAsset.ref_count - 1))
+    # A leased asset stays: its URL was just handed to an uploader
+    asset = db.scalar(select(ImageAsset).where(
+        ImageAsset.url == url,
+        ImageAsset.ref_count == 0,
+        or_(ImageAsset.leased_until.is_(None), ImageAsset.leased_until < datetime.utcnow())
+    ))
+    if asset is None:
+        return []
+    db.execute(delete(ImageAsset).where(ImageAsset.id == asset.id))
+    return _storage_keys(asset)
+
+
+def release_unused(db: Session) -> List[str]:
+    """Delete the assets whose upload lease ran out without anything using
+    them and return their storage keys for :func:`purge`. Commits."""
+    assets = db.scalars(delete(ImageAsset).where(
+        ImageAsset.ref_count == 0,
+        ImageAsset.leased_until < datetime.utcnow()
+    ).returning(ImageAsset)).all()
+    keys = [key for asset in assets for key in _storage_keys(asset)]
+    db.commit()
+    return keys
+
+
+def recount(db: Session) -> int:
+    """Recompute every asset's ``ref_count`` from the rows using its URL,
+    e.g. for assets uploaded before references were counted."""
+    uses = Counter(db.scalars(select(Artwork.image_url)))
+    uses.update(db.scalars(select(User.profile_picture_url).where(User.profile_picture_url.is_not(None))))
+    assets = db.query(ImageAsset).all()
+    for asset in assets:
+        asset.ref_count = uses.get(asset.url, 0)
+    db.commit()
+    return len(assets)
+
+
+async def purge(keys: List[str]):
+    """Delete released blobs from storage; failures only leave orphans behind."""
+    results = await asyncio.gather(*[storage.delete(key) for key in keys], return_exceptions=True)
+    for key, result in zip(keys, results):
+        if isinstance(result, Exception):
+            logger.warning("Could not delete %s from storage: %s", key, result)
+
+
+async def backfill(db: Session) -> Tuple[int, int]:
+    """Render variants and image hashes for artworks and profile pictures
+    stored before they existed. Returns ``(updated, failed)``. Flat images
+    never get a hash, so their artworks are rendered again on every run."""
+    rows = [(artwork, "image_url", "variants") for artwork in
+            db.query(Artwork).filter(or_(Artwork.variants.is_(None), Artwork.image_hash.is_(None)))]
+    rows += [(user, "profile_picture_url", "profile_picture_variants") for user in
+             db.query(User).filter(User.profile_picture_url.is_not(None), User.profile_picture_variants.is_(None))]
+    rendered: Dict[str, Tuple[Dict[str, str], Optional[int]]] = {}
+    updated = failed = 0
+    for row, url_field, variants_field in rows:
+        url = getattr(row, url_field)
+        try:
+            if url not in rendered:
+                rendered[url] = await derive_url(url)
+        except (InvalidImage, BrokenProcessPool, OSError, ValueError) as exc:
+            logger.warning("Could not derive images for %s: %s", url, exc)
+            failed += 1
+            continue
+        variants, image_hash = rendered[url]
+        setattr(row, variants_field, variants)
+        if isinstance(row, Artwork):
+            row.image_hash = image_hash
+            feed.sync_artwork(db, row)
+        updated += 1
+    for url, (_, image_hash) in rendered.items():
+        db.execute(update(ImageAsset).where(ImageAsset.url == url).values(image_hash=image_hash))
+    db.commit()
+    return updated, failed
@@ -0,0 +1,199 @@
+"""Near-duplicate artwork images (re-posts and stolen art) by perceptual hash.
+
+Each image gets a 64-bit dHash when its derivatives are rendered: one bit per
+pixel of a 9x8 grayscale thumbnail, set when it is brighter than its right
+neighbour. Resized, re-encoded or lightly edited copies of an image hash a few
+bits apart, so a near-duplicate is a hash within ``NEAR_DUPLICATE_DISTANCE``
+bits (Hamming distance).
+
+:class:`HashIndex` keeps every artwork's hash in one NumPy array and answers a
+lookup with a vectorized XOR and popcount over all of them (about 4 ms per
+million hashes, see ``bench_near_duplicates``), so ``create_artwork`` can check each new
+artwork against every other one. Pairs found there are stored in
+``near_duplicates``, which the admin listing groups into clusters.
+``NEAR_DUPLICATE_RELOAD_INTERVAL`` reloads the index in full.
+"""
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from decouple import config
+from PIL import Image
+from sqlalchemy import delete, insert, or_, select
+from sqlalchemy.orm import Session
+from ..models import Artwork, NearDuplicate
+
+NEAR_DUPLICATE_DISTANCE = config("NEAR_DUPLICATE_DISTANCE", default=6, cast=int)
+# Thumbnails with a smaller brightness range than this are too flat to
+# fingerprint: every blank or single-colour image would hash alike
+MIN_CONTRAST = 8
+
+_MASK = (1 << 64) - 1
+# SWAR popcount constants; the arithmetic wraps around in uint64 as intended
+_M1, _M2, _M4, _H01 = (np.uint64(mask) for mask in (
+    0x5555555555555555, 0x3333333333333333, 0x0F0F0F0F0F0F0F0F, 0x0101010101010101
+))
+_ONE, _TWO, _FOUR, _BYTE_SUM = np.uint64(1), np.uint64(2), np.uint64(4), np.uint64(56)
+# Hashes per block, small enough for the temporaries to stay in cache
+_BLOCK = 32768
+
+
+def dhash(image: Image.Image) -> Optional[int]:
+    """The image's 64-bit difference hash as an unsigned integer, or None for
+    images too flat to tell apart."""
+    pixels = np.asarray(image.convert("L").resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    if pixels.max() - pixels.min() < MIN_CONTRAST:
+        return None
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def to_signed(value: Optional[int]) -> Optional[int]:
+    """Pack an unsigned 64-bit hash into a signed BIGINT column."""
+    return value - (1 << 64) if value is not None and value >= 1 << 63 else value
+
+
+def hamming(hashes: np.ndarray, value: int) -> np.ndarray:
+    """Bits differing between each of ``hashes`` (uint64) and ``value``
+    (signed or unsigned), counted with in-place SWAR arithmetic per block."""
+    distances = np.empty(len(hashes), dtype=np.uint8)
+    value = np.uint64(value & _MASK)
+    x = np.empty(min(len(hashes), _BLOCK), dtype=np.uint64)
+    t = np.empty_like(x)
+    for start in range(0, len(hashes), _BLOCK):
+        block = hashes[start:start + _BLOCK]
+        xs, ts = x[:len(block)], t[:len(block)]
+        np.bitwise_xor(block, value, out=xs)
+        np.right_shift(xs, _ONE, out=ts); ts &= _M1; xs -= ts
+        np.right_shift(xs, _TWO, out=ts); ts &= _M2; xs &= _M2; xs += ts
+        np.right_shift(xs, _FOUR, out=ts); xs += ts; xs &= _M4
+        xs *= _H01; xs >>= _BYTE_SUM
+        distances[start:start + len(block)] = xs
+    return distances
+
+
+class HashIndex:
+    """Thread-safe array of artwork image hashes with their artwork and artist ids."""
+
+    def __init__(self):
+        self._hashes = np.zeros(0, dtype=np.uint64)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._artists = np.zeros(0, dtype=np.int64)
+        self._rows: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.lookups = 0
+
+    def load(self, db: Session) -> int:
+        """Rebuild the index from ``artworks`` and return how many it holds."""
+        rows = db.execute(
+            select(Artwork.id, Artwork.artist_id, Artwork.image_hash).where(Artwork.image_hash.is_not(None))
+        ).all()
+        hashes = np.array([image_hash for _, _, image_hash in rows], dtype=np.int64).view(np.uint64)
+        ids = np.array([artwork_id for artwork_id, _, _ in rows], dtype=np.int64)
+        artists = np.array([artist_id for _, artist_id, _ in rows], dtype=np.int64)
+        with self._lock:
+            self._hashes, self._ids, self._artists = hashes, ids, artists
+            self._rows = {artwork_id: row for row, artwork_id in enumerate(ids.tolist())}
+        return len(rows)
+
+    def upsert(self, artwork: Artwork):
+        """Index a new artwork's hash. Call after commit."""
+        if artwork.image_hash is None:
+            self.remove(artwork.id)
+            return
+        image_hash = np.uint64(artwork.image_hash & _MASK)
+        with self._lock:
+            row = self._rows.get(artwork.id)
+            if row is None:
+                row = len(self._rows)
+                if row == len(self._hashes):
+                    # Grow geometrically so inserts stay amortized O(1)
+                    capacity = max(16, 2 * row)
+                    self._hashes = np.resize(self._hashes, capacity)
+                    self._ids = np.resize(self._ids, capacity)
+                    self._artists = np.resize(self._artists, capacity)
+                self._rows[artwork.id] = row
+            self._hashes[row], self._ids[row], self._artists[row] = image_hash, artwork.id, artwork.artist_id
+
+    def remove(self, artwork_id: int):
+        with self._lock:
+            row = self._rows.pop(artwork_id, None)
+            if row is None:
+                return
+            # Move the last row into the hole
+            last = len(self._rows)
+            if row != last:
+                self._hashes[row], self._ids[row], self._artists[row] = (
+                    self._hashes[last], self._ids[last], self._artists[last]
+                )
+                self._rows[int(self._ids[row])] = row
+
+    def near(self, image_hash: int, max_distance: int = NEAR_DUPLICATE_DISTANCE) -> List[Tuple[int, int, int]]:
+        """``(artwork_id, artist_id, distance)`` for every hash within
+        ``max_distance`` bits, closest first."""
+        with self._lock:
+            self.lookups += 1
+            size = len(self._rows)
+            distances = hamming(self._hashes[:size], image_hash)
+            rows = np.flatnonzero(distances <= max_distance)
+            matches = zip(self._ids[rows].tolist(), self._artists[rows].tolist(), distances[rows].tolist())
+        return sorted(matches, key=lambda match: (match[2], match[0]))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"artworks": len(self._rows), "lookups": self.lookups}
+
+
+hash_index = HashIndex()
+
+
+def record_pairs(db: Session, artwork_id: int, matches: List[Tuple[int, int, int]]):
+    """Store the artwork's matches from :meth:`HashIndex.near`. Does not commit."""
+    rows = [
+        {"artwork_id": min(artwork_id, other), "duplicate_id": max(artwork_id, other), "distance": distance}
+        for other, _, distance in matches if other != artwork_id
+    ]
+    if rows:
+        db.execute(insert(NearDuplicate), rows)
+
+
+def remove_pairs(db: Session, artwork_id: int):
+    db.execute(delete(NearDuplicate).where(
+        or_(NearDuplicate.artwork_id == artwork_id, NearDuplicate.duplicate_id == artwork_id)
+    ))
+
+
+def clusters(db: Session) -> List[List[int]]:
+    """Groups of artwork ids connected by near-duplicate pairs, largest first."""
+    parent: Dict[int, int] = {}
+
+    def root(node: int) -> int:
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for first, second in db.execute(select(NearDuplicate.artwork_id, NearDuplicate.duplicate_id)):
+        parent[root(first)] = root(second)
+    groups: Dict[int, List[int]] = {}
+    for node in parent:
+        groups.setdefault(root(node), []).append(node)
+    return sorted((sorted(group) for group in groups.values()), key=lambda group: (-len(group), group[0]))
+
+
+def rebuild_pairs(db: Session) -> int:
+    """Recompute ``near_duplicates`` from every artwork's hash and return the
+    number of pairs. One index lookup per artwork, so this is quadratic; it is
+    meant for backfills, not request paths."""
+    index = HashIndex()
+    index.load(db)
+    db.execute(delete(NearDuplicate))
+    pairs = 0
+    for artwork_id, image_hash in db.execute(
+        select(Artwork.id, Artwork.image_hash).where(Artwork.image_hash.is_not(None))
+    ).all():
+        later = [match for match in index.near(image_hash) if match[0] > artwork_id]
+        record_pairs(db, artwork_id, later)
+        pairs += len(later)
+    db.commit()
+    return pairs
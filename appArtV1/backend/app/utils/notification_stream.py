@@ -0,0 +1,290 @@
+"""In-process pub/sub behind ``/notifications/stream`` (server-sent events).
+
+The write paths publish each notification to :data:`hub` after they commit,
+and every connected stream of the recipient receives it as an SSE frame
+(encoded once per notification and shared by the recipient's connections).
+Frames carry the notification id as the event id, so a reconnecting client
+sends ``Last-Event-ID`` and the stream replays what it missed from the
+database before going live; a connection that falls more than
+``STREAM_BUFFER`` events behind is caught up the same way.
+
+Idle connections cost no timers of their own: a subscriber is a few slots and
+a future that only exists while it waits, and one hub task wakes all of them
+every ``STREAM_HEARTBEAT_INTERVAL`` seconds to send a keep-alive
+comment and drop streams whose token has expired or been revoked.
+
+The hub lives in each worker process, like the in-memory indexes. With several
+workers a notification may be written by a worker other than the one holding
+the recipient's stream, so :func:`poll_new` (every ``STREAM_POLL_INTERVAL``
+seconds) picks up notifications for this worker's listeners with one query.
+Ids can commit out of order (PostgreSQL sequences: a large fan-out may commit
+after a later single insert), so each poll scans every id above the newest id
+seen ``STREAM_POLL_LOOKBACK`` seconds ago rather than only the ones above the
+last poll, and streams drop the ids they have recently sent.
+"""
+import asyncio
+import json
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+from decouple import config
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from ..models import Notification, NotificationType
+from ..schemas import Notification as NotificationSchema
+
+STREAM_HEARTBEAT_INTERVAL = config("STREAM_HEARTBEAT_INTERVAL", default=15.0, cast=float)
+# Events queued per connection before it is caught up from the database instead
+STREAM_BUFFER = config("STREAM_BUFFER", default=32, cast=int)
+# Seconds a notification may take to commit and still be found by poll_new
+STREAM_POLL_LOOKBACK = config("STREAM_POLL_LOOKBACK", default=60.0, cast=float)
+# Milliseconds clients wait before reconnecting (the SSE "retry" field)
+STREAM_RETRY_MS = 3000
+# Notification ids a stream remembers having sent, to drop repeats
+SENT_IDS = 64
+# Listening user ids bound per query, well under SQLite's parameter limit
+LISTENER_CHUNK = 500
+
+HEARTBEAT_FRAME = b": heartbeat\n\n"
+# More was missed than a stream replays: the client should reload its list
+RESYNC_FRAME = b"event: resync\ndata: {}\n\n"
+
+
+def format_event(event: str, data: str, event_id: Optional[int] = None) -> bytes:
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event}", f"data: {data}"]
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+def notification_frame(notification: Notification) -> bytes:
+    data = NotificationSchema.model_validate(notification).model_dump_json()
+    return format_event("notification", data, notification.id)
+
+
+def unread_frame(unread_count: int) -> bytes:
+    return format_event("unread", json.dumps({"unread_count": unread_count}))
+
+
+class Subscriber:
+    """One open stream: its pending frames and the future it sleeps on."""
+    __slots__ = ("user_id", "frames", "overflowed", "heartbeat", "closed", "sent", "_waiter")
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        # A plain list: an empty deque already allocates a 64-slot block
+        self.frames: list = []
+        self.overflowed = False
+        self.heartbeat = False
+        self.closed = False
+        # The newest SENT_IDS notification ids sent, created on the first one
+        self.sent: Optional[Set[int]] = None
+        self._waiter: Optional[asyncio.Future] = None
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def push(self, event_id: Optional[int], frame: bytes):
+        if len(self.frames) >= STREAM_BUFFER:
+            # Too far behind: drop the backlog and replay from the database
+            self.frames.clear()
+            self.overflowed = True
+        else:
+            self.frames.append((event_id, frame))
+        self._wake()
+
+    def first_send(self, event_id: int) -> bool:
+        """Record ``event_id`` as sent; False if it already was. The same
+        notification can arrive from a replay, in-process and from a poll."""
+        if self.sent is None:
+            self.sent = set()
+        elif event_id in self.sent:
+            return False
+        self.sent.add(event_id)
+        if len(self.sent) > SENT_IDS:
+            self.sent.remove(min(self.sent))
+        return True
+
+    def resume_point(self, floor: int) -> int:
+        """The id to replay from after an overflow: the oldest id it still
+        remembers sending, or ``floor`` while it remembers every one."""
+        if self.sent is not None and len(self.sent) >= SENT_IDS:
+            return min(self.sent)
+        return floor
+
+    def close(self):
+        """The client went away: end the stream at its next wake-up."""
+        self.closed = True
+        self._wake()
+
+    async def wait(self):
+        """Return once there is something to send (or the client has gone)."""
+        if self.frames or self.overflowed or self.heartbeat or self.closed:
+            return
+        self._waiter = asyncio.get_running_loop().create_future()
+        try:
+            await self._waiter
+        finally:
+            self._waiter = None
+
+
+class NotificationHub:
+    """Subscribers by user id, owned by the event loop serving the streams.
+
+    :meth:`publish` may be called from any thread (fan-out runs on the
+    threadpool); deliveries are handed to the loop with
+    ``call_soon_threadsafe``.
+    """
+
+    def __init__(self, heartbeat_interval: float):
+        self.heartbeat_interval = heartbeat_interval
+        self.counters = defaultdict(int)
+        # Lists rather than sets: a user rarely has more than a couple of streams
+        self._subscribers: Dict[int, List[Subscriber]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._heartbeats: Optional[asyncio.Task] = None
+
+    def subscribe(self, user_id: int) -> Subscriber:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # First stream in this process (or on a new loop, as in tests);
+            # a heartbeat task left on an old loop stops by itself
+            self._loop, self._subscribers = loop, {}
+            self._heartbeats = loop.create_task(self._send_heartbeats())
+        subscriber = Subscriber(user_id)
+        self._subscribers.setdefault(user_id, []).append(subscriber)
+        self.counters["connected"] += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self._subscribers.get(subscriber.user_id)
+        if subscribers is not None and subscriber in subscribers:
+            subscribers.remove(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.user_id]
+
+    def listening(self, user_ids: Optional[Iterable[int]] = None) -> List[int]:
+        """The given users (or all users) with an open stream."""
+        subscribed = list(self._subscribers)
+        if user_ids is None:
+            return subscribed
+        return [user_id for user_id in set(user_ids) if user_id in self._subscribers]
+
+    def publish(self, user_id: int, frame: bytes, event_id: Optional[int] = None):
+        loop = self._loop
+        if loop is None or user_id not in self._subscribers:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._deliver(user_id, frame, event_id)
+            return
+        try:
+            loop.call_soon_threadsafe(self._deliver, user_id, frame, event_id)
+        except RuntimeError:
+            pass  # the loop has closed
+
+    def _deliver(self, user_id: int, frame: bytes, event_id: Optional[int]):
+        self.counters["published"] += 1
+        for subscriber in self._subscribers.get(user_id, ()):
+            overflowed = subscriber.overflowed
+            subscriber.push(event_id, frame)
+            self.counters["overflows"] += subscriber.overflowed and not overflowed
+
+    async def _send_heartbeats(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            if loop is not self._loop:
+                return
+            for subscribers in list(self._subscribers.values()):
+                for subscriber in subscribers:
+                    subscriber.heartbeat = True
+                    subscriber._wake()
+
+    def stop(self):
+        if self._heartbeats is not None and not self._heartbeats.done():
+            self._heartbeats.cancel()
+        self._heartbeats = None
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._subscribers),
+            "connections": sum(len(subscribers) for subscribers in list(self._subscribers.values())),
+            **self.counters,
+        }
+
+
+hub = NotificationHub(STREAM_HEARTBEAT_INTERVAL)
+
+
+def _publish_rows(notifications: Iterable[Notification]):
+    for notification in notifications:
+        hub.publish(notification.user_id, notification_frame(notification), notification.id)
+        if _watermarks:
+            _published.add(notification.id)
+
+
+async def publish_notifications(db: AsyncSession, notifications: List[Notification]):
+    """Publish notifications the caller has just committed, to recipients
+    with an open stream."""
+    listening = set(hub.listening(notification.user_id for notification in notifications))
+    ids = [notification.id for notification in notifications if notification.user_id in listening]
+    if not ids:
+        return
+    # Reload for the server-generated created_at
+    rows = await db.scalars(
+        select(Notification).where(Notification.id.in_(ids)).order_by(Notification.id)
+        .execution_options(populate_existing=True)
+    )
+    _publish_rows(rows)
+
+
+def _for_listeners(db: Session, *criteria) -> List[Notification]:
+    """Notifications matching ``criteria`` for users with an open stream, in
+    id order. The users are bound in chunks of ``LISTENER_CHUNK``."""
+    listening = hub.listening()
+    rows = []
+    for start in range(0, len(listening), LISTENER_CHUNK):
+        rows += db.scalars(select(Notification).where(
+            *criteria, Notification.user_id.in_(listening[start:start + LISTENER_CHUNK])
+        ))
+    return sorted(rows, key=lambda row: row.id)
+
+
+def publish_request_fan_out(db: Session, request_id: int):
+    """Publish a committed new-request fan-out to the artists with an open stream."""
+    _publish_rows(_for_listeners(
+        db,
+        Notification.related_request_id == request_id,
+        Notification.type == NotificationType.NEW_REQUEST
+    ))
+
+
+# (time, newest notification id) of the polls within the lookback, plus the
+# last one before it, whose id is where the next scan starts
+_watermarks: Deque[Tuple[float, int]] = deque()
+# Ids above that point already published by this worker, in-process or polled
+_published: Set[int] = set()
+
+
+def poll_new(db: Session) -> int:
+    """Publish notifications written recently (by any worker) to this
+    worker's listeners, skipping the ones already published; returns how
+    many were published."""
+    latest = db.scalar(select(func.max(Notification.id))) or 0
+    now = time.monotonic()
+    _watermarks.append((now, latest))
+    while len(_watermarks) > 1 and _watermarks[1][0] <= now - STREAM_POLL_LOOKBACK:
+        _watermarks.popleft()
+    # The first poll only sets the starting point
+    start = _watermarks[0][1]
+    _published.difference_update([event_id for event_id in list(_published) if event_id <= start])
+    if latest <= start:
+        return 0
+    rows = [row for row in _for_listeners(db, Notification.id > start) if row.id not in _published]
+    _publish_rows(rows)
+    return len(rows)
@@ -0,0 +1,97 @@
+"""Notification fan-out that runs outside the HTTP request, and the per-user
+unread counters.
+
+Handlers schedule fan-out with FastAPI ``BackgroundTasks`` so the response is
+sent as soon as the triggering row is committed. Each job opens its own session
+and writes every notification with one set-based ``INSERT ... SELECT``.
+
+``users.unread_notifications`` lets the badge poll read one row instead of
+counting notifications. Every write that creates or reads notifications
+adjusts it in the same transaction (:func:`add_unread`, :func:`remove_unread`),
+and :func:`reconcile_unread` recomputes it from ``notifications`` to repair
+any drift, at startup and every ``UNREAD_RECONCILE_INTERVAL`` seconds.
+"""
+from collections import Counter, defaultdict
+from typing import Iterable, List
+from sqlalchemy import Update, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+from ..database import SessionLocal
+from ..models import Notification, NotificationType, Request, User
+from . import notification_stream
+
+
+def eligible_artists_query():
+    """Verified artists with a complete profile, as a ``SELECT users.id``."""
+    return select(User.id).where(
+        User.role == "artist",
+        User.is_artist_verified == True,
+        User.profile_picture_url.isnot(None),
+        User.bio.isnot(None),
+        User.bio != ""
+    )
+
+
+def fan_out_new_request(request_id: int) -> int:
+    """Notify every eligible artist about a new request; returns rows written."""
+    db = SessionLocal()
+    try:
+        request = db.get(Request, request_id)
+        if request is None:
+            return 0
+
+        artists = eligible_artists_query().subquery()
+        source = select(
+            artists.c.id,
+            literal(NotificationType.NEW_REQUEST, Notification.type.type),
+            literal("New Art Request"),
+            literal(f"New request: {request.title}"),
+            literal(request.id),
+            literal(False),
+        )
+        result = db.execute(insert(Notification).from_select(
+            ["user_id", "type", "title", "message", "related_request_id", "is_read"],
+            source
+        ))
+        db.execute(update(User).where(User.id.in_(select(artists.c.id))).values(
+            unread_notifications=User.unread_notifications + 1
+        ))
+        db.commit()
+        notification_stream.publish_request_fan_out(db, request.id)
+        return result.rowcount
+    finally:
+        db.close()
+
+
+def add_unread(user_ids: Iterable[int]) -> List[Update]:
+    """Statements counting one new unread notification per occurrence of a
+    user id, to execute in the transaction that inserts them."""
+    by_amount = defaultdict(list)
+    for user_id, amount in Counter(user_ids).items():
+        by_amount[amount].append(user_id)
+    return [
+        update(User).where(User.id.in_(ids)).values(unread_notifications=User.unread_notifications + amount)
+        for amount, ids in by_amount.items()
+    ]
+
+
+def remove_unread(user_id: int, amount: int) -> Update:
+    """Statement for ``amount`` of the user's notifications being marked read."""
+    return update(User).where(User.id == user_id).values(
+        unread_notifications=User.unread_notifications - amount
+    )
+
+
+def reconcile_unread(db: Session) -> int:
+    """Recompute every user's unread counter from ``notifications`` and return
+    how many were wrong."""
+    actual = (
+        select(func.count(Notification.id))
+        .where(Notification.user_id == User.id, Notification.is_read == False)
+        .scalar_subquery()
+    )
+    result = db.execute(
+        update(User).where(User.unread_notifications != actual).values(unread_notifications=actual)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
@@ -0,0 +1,97 @@
+"""Keyset (cursor) pagination shared by the list endpoints.
+
+Pages are ordered newest first on ``(created_at, id)`` and the cursor is an
+opaque token holding the last row's pair, so fetching a page is a single
+index range scan whatever its depth. The cursor for the next page is returned
+in the ``X-Next-Cursor`` response header and is absent on the last page.
+"""
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, literal, or_, String
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _created_at_bound(created_at: datetime, bind):
+    # SQLite stores server_default timestamps as 'YYYY-MM-DD HH:MM:SS' text while a
+    # bound DateTime is rendered with microseconds, which breaks equality on ties.
+    # Compare against the same text form the row was stored with instead.
+    # The bind is the engine the query runs on: a replica may not share the
+    # primary's dialect.
+    if bind.dialect.name == "sqlite":
+        return literal(created_at.replace(tzinfo=None).isoformat(sep=" "), String)
+    return created_at
+
+
+def clamp_limit(limit: int) -> int:
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def keyset_query(query, model, cursor: Optional[str], limit: int, bind=None):
+    """Order ``query`` newest first and position it after ``cursor``.
+
+    Fetches one extra row so :func:`split_page` can tell whether another page
+    follows. Works on both ORM ``Query`` objects and 2.0 ``select()`` statements;
+    the latter have no session, so pass the ``bind`` they will execute on.
+    """
+    query = query.order_by(model.created_at.desc(), model.id.desc())
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        bound = _created_at_bound(created_at, bind if bind is not None else query.session.get_bind())
+        query = query.filter(or_(
+            model.created_at < bound,
+            and_(model.created_at == bound, model.id < row_id)
+        ))
+    return query.limit(clamp_limit(limit) + 1)
+
+
+def split_page(rows: list, limit: int) -> Tuple[list, Optional[str]]:
+    """Trim the look-ahead row and return the page with the next cursor, if any."""
+    limit = clamp_limit(limit)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+
+def set_next_cursor(response: Optional[Response], next_cursor: Optional[str]):
+    if response is not None and next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+
+def fetch_page(query, model, cursor: Optional[str], limit: int) -> Tuple[list, Optional[str]]:
+    """Run a keyset-paginated ORM query; returns ``(rows, next_cursor)``."""
+    return split_page(keyset_query(query, model, cursor, limit).all(), limit)
+
+
+def paginate(query, model, cursor: Optional[str], limit: int, response: Optional[Response] = None) -> list:
+    """Run a keyset-paginated ORM query and return one page of rows."""
+    rows, next_cursor = fetch_page(query, model, cursor, limit)
+    set_next_cursor(response, next_cursor)
+    return rows
+
+
+async def paginate_async(db, statement, model, cursor: Optional[str], limit: int, response: Optional[Response] = None) -> list:
+    """:func:`paginate` for a ``select()`` statement on an ``AsyncSession``."""
+    rows = (await db.scalars(keyset_query(statement, model, cursor, limit, db.get_bind()))).all()
+    rows, next_cursor = split_page(list(rows), limit)
+    set_next_cursor(response, next_cursor)
+    return rows
@@ -0,0 +1,93 @@
+"""Password hashing off the request threadpool.
+
+pbkdf2 is deliberately slow (tens of milliseconds of pure CPU per hash), so a
+burst of logins run on the shared threadpool would hold the threads every sync
+endpoint needs. ``password_hasher`` instead sends each hash and verification
+to its own pool of ``PASSWORD_WORKERS`` processes, which the login and
+register handlers await on the event loop.
+
+At most ``PASSWORD_QUEUE_SIZE`` jobs are running or waiting for a worker; past
+that, requests fail fast with 503 and ``Retry-After`` rather than queueing
+without bound. Queue depth, rejections and latency are reported by ``stats()``.
+A pool whose worker died is replaced and the job retried once.
+"""
+import time
+from collections import defaultdict, deque
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+from decouple import config
+from fastapi import HTTPException
+from .auth import get_password_hash, verify_and_update_password
+from .process_pool import SpawnPool
+
+PASSWORD_WORKERS = config("PASSWORD_WORKERS", default=2, cast=int)
+PASSWORD_QUEUE_SIZE = config("PASSWORD_QUEUE_SIZE", default=64, cast=int)
+# Seconds clients are asked to wait when the queue is full
+RETRY_AFTER = 1
+
+
+class PasswordHasher:
+    """Bounded process pool for password hashes and verifications."""
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.counters = defaultdict(int)
+        self._pool = SpawnPool(workers)
+        self._latencies = deque(maxlen=1000)
+
+    async def _run(self, kind: str, function, *args):
+        unavailable = HTTPException(
+            status_code=503,
+            detail="Too many sign-ins in progress, try again shortly",
+            headers={"Retry-After": str(RETRY_AFTER)},
+        )
+        if self.pending >= self.max_pending:
+            self.counters["rejected"] += 1
+            raise unavailable
+        self.pending += 1
+        started = time.perf_counter()
+        try:
+            return await self._pool.run(function, *args)
+        except BrokenProcessPool:
+            raise unavailable
+        finally:
+            self.pending -= 1
+            self.counters[kind] += 1
+            self._latencies.append(time.perf_counter() - started)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hashed", get_password_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Whether the password matches, and a replacement hash when the stored
+        one uses outdated parameters (see ``PASSWORD_HASH_ROUNDS``)."""
+        return await self._run("verified", verify_and_update_password, password, hashed_password)
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+    def stats(self) -> dict:
+        # Latency covers the wait for a worker as well as the hash itself
+        ordered = sorted(self._latencies)
+        latency = {}
+        if ordered:
+            latency = {
+                "avg_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000, 2),
+                "p95_ms": round(ordered[int(len(ordered) * 0.95)] * 1000, 2),
+                "max_ms": round(ordered[-1] * 1000, 2),
+            }
+        return {
+            "workers": self.workers,
+            "running": min(self.pending, self.workers),
+            "queued": max(self.pending - self.workers, 0),
+            "max_pending": self.max_pending,
+            "pool_restarts": self._pool.restarts,
+            **self.counters,
+            "latency": latency,
+        }
+
+
+password_hasher = PasswordHasher(PASSWORD_WORKERS, PASSWORD_QUEUE_SIZE)
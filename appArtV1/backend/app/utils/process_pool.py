@@ -0,0 +1,51 @@
+"""Process pools for the CPU-bound work kept off the event loop and the
+request threadpool: password hashing and image rendering.
+
+A worker that dies (killed, out of memory) leaves a ``ProcessPoolExecutor``
+broken for good, so :class:`SpawnPool` replaces it and retries the job once.
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+
+class SpawnPool:
+    """``workers`` processes, started on first use."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.restarts = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _current(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, not fork: the API process has threads (DB pools, storage I/O)
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _replace_broken(self, executor: ProcessPoolExecutor):
+        # Every job in flight sees the same broken pool; only the first replaces it
+        if self._executor is executor:
+            self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.restarts += 1
+
+    async def run(self, function, *args):
+        """Run ``function(*args)`` in a worker. Raises ``BrokenProcessPool``
+        when the replacement pool breaks as well."""
+        for attempt in range(2):
+            executor = self._current()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+            except BrokenProcessPool:
+                self._replace_broken(executor)
+                if attempt:
+                    raise
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
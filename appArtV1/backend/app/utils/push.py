@@ -0,0 +1,283 @@
+"""Push delivery for notifications, run as a background asyncio task.
+
+``PushWorker`` takes the notifications not pushed yet in id order, looks up
+the recipients' ``DeviceToken`` rows, batches the sends per provider and hands them
+to a ``PushGateway``. Transient failures are retried with jittered exponential
+backoff and tokens the provider rejects are deleted. Nothing here runs on the
+API request path; database work is pushed to a thread so the loop never blocks.
+
+Each notification is marked ``pushed_at`` together with the batch's outcome
+(pruned tokens, ``push_failures`` rows for sends that ran out of attempts), so
+a restarted worker picks up every notification it had not finished. Tracking
+rows rather than an id position matters on databases where ids can commit out
+of order (PostgreSQL sequences): a large fan-out can commit after a later
+single insert, and its lower ids must still be delivered. Delivery is
+at-least-once. Only one process should run the worker (see
+``PUSH_WORKER_ENABLED``).
+"""
+import abc
+import asyncio
+import enum
+import logging
+import random
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+from sqlalchemy import delete, func, insert, update
+from ..database import SessionLocal
+from ..models import DeviceToken, Notification, PushCursor, PushFailure
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PushMessage:
+    token: str
+    provider: str
+    title: str
+    body: str
+    data: dict = field(default_factory=dict)
+
+
+class SendStatus(str, enum.Enum):
+    OK = "ok"
+    RETRY = "retry"                  # transient failure, worth another attempt
+    INVALID_TOKEN = "invalid_token"  # token unregistered/expired, prune it
+
+
+def provider_for(device_type: Optional[str]) -> str:
+    return {"ios": "apns", "android": "fcm", "web": "webpush"}.get(device_type or "", "fcm")
+
+
+class PushGateway(abc.ABC):
+    """Sends one batch of messages to a provider and reports a status per message."""
+    max_batch_size = 500
+
+    @abc.abstractmethod
+    async def send_batch(self, provider: str, messages: Sequence[PushMessage]) -> List[SendStatus]:
+        ...
+
+
+class FakePushGateway(PushGateway):
+    """Local stand-in for APNs/FCM used for development and offline load tests.
+
+    Sleeps ``latency`` seconds per batch, fails each message transiently with
+    probability ``failure_rate`` and rejects tokens prefixed with ``invalid:``.
+    """
+
+    def __init__(self, latency: float = 0.02, failure_rate: float = 0.0, max_batch_size: int = 500):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.max_batch_size = max_batch_size
+        self.sent: List[PushMessage] = []
+
+    async def send_batch(self, provider: str, messages: Sequence[PushMessage]) -> List[SendStatus]:
+        await asyncio.sleep(self.latency)
+        statuses = []
+        for message in messages:
+            if message.token.startswith("invalid:"):
+                statuses.append(SendStatus.INVALID_TOKEN)
+            elif random.random() < self.failure_rate:
+                statuses.append(SendStatus.RETRY)
+            else:
+                self.sent.append(message)
+                statuses.append(SendStatus.OK)
+        return statuses
+
+
+def build_gateway(name: str, **options) -> PushGateway:
+    if name == "fake":
+        return FakePushGateway(**options)
+    raise ValueError(f"Unknown push gateway: {name}")
+
+
+class PushWorker:
+    def __init__(
+        self,
+        gateway: PushGateway,
+        poll_interval: float = 1.0,
+        batch_size: int = 500,
+        max_attempts: int = 5,
+        base_backoff: float = 0.5,
+        cursor_name: str = "push",
+    ):
+        self.gateway = gateway
+        self.cursor_name = cursor_name
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.last_notification_id = 0
+        self.counters = defaultdict(int)
+        self._latencies: Dict[str, deque] = defaultdict(lambda: deque(maxlen=1000))
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self.last_notification_id = await asyncio.to_thread(self._load_position)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                delivered = await self.run_once()
+            except Exception:
+                logger.exception("Push delivery pass failed")
+                delivered = 0
+            # Keep draining while there is a backlog, otherwise wait for new rows
+            if delivered < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    async def run_once(self) -> int:
+        """Deliver the next batch of notifications; returns how many were read."""
+        notifications, messages = await asyncio.to_thread(self._load_batch)
+        if not notifications:
+            return 0
+
+        by_provider = defaultdict(list)
+        for message in messages:
+            by_provider[message.provider].append(message)
+
+        chunk = self.gateway.max_batch_size
+        results = await asyncio.gather(*[
+            self._deliver(provider, provider_messages[start:start + chunk])
+            for provider, provider_messages in by_provider.items()
+            for start in range(0, len(provider_messages), chunk)
+        ])
+        dead_tokens = set().union(*(dead for dead, _ in results))
+        failures = [message for _, failed in results for message in failed]
+        await asyncio.to_thread(
+            self._finish_batch, [notification.id for notification in notifications], dead_tokens, failures
+        )
+
+        self.last_notification_id = max(self.last_notification_id, notifications[-1].id)
+        self.counters["notifications"] += len(notifications)
+        return len(notifications)
+
+    async def _deliver(self, provider: str, messages: List[PushMessage]):
+        """Send with retries; returns ``(dead_tokens, messages_still_failing)``."""
+        dead_tokens = set()
+        pending = messages
+        for attempt in range(self.max_attempts):
+            if attempt:
+                self.counters["retried"] += len(pending)
+                await asyncio.sleep(self.base_backoff * 2 ** (attempt - 1) * (0.5 + random.random()))
+            started = time.perf_counter()
+            try:
+                statuses = await self.gateway.send_batch(provider, pending)
+            except Exception:
+                logger.exception("Push batch to %s failed", provider)
+                statuses = [SendStatus.RETRY] * len(pending)
+            self._latencies[provider].append(time.perf_counter() - started)
+            self.counters["batches"] += 1
+
+            retry = []
+            for message, status in zip(pending, statuses):
+                if status == SendStatus.OK:
+                    self.counters["sent"] += 1
+                elif status == SendStatus.INVALID_TOKEN:
+                    dead_tokens.add(message.token)
+                else:
+                    retry.append(message)
+            pending = retry
+            if not pending:
+                break
+        self.counters["failed"] += len(pending)
+        return dead_tokens, pending
+
+    def _load_position(self) -> int:
+        # A brand-new deployment starts at the newest notification rather than
+        # pushing the whole history; rows below the starting point (including
+        # those from before rows tracked their delivery) count as pushed
+        db = SessionLocal()
+        try:
+            cursor = db.get(PushCursor, self.cursor_name)
+            if cursor is None:
+                newest = db.query(func.max(Notification.id)).scalar() or 0
+                cursor = PushCursor(name=self.cursor_name, last_notification_id=newest)
+                db.add(cursor)
+            db.execute(update(Notification).where(
+                Notification.pushed_at.is_(None),
+                Notification.id <= cursor.last_notification_id
+            ).values(pushed_at=func.now()))
+            db.commit()
+            return cursor.last_notification_id
+        finally:
+            db.close()
+
+    def _load_batch(self):
+        db = SessionLocal()
+        try:
+            notifications = db.query(Notification).filter(
+                Notification.pushed_at.is_(None)
+            ).order_by(Notification.id).limit(self.batch_size).all()
+            if not notifications:
+                return [], []
+
+            tokens = defaultdict(list)
+            for user_id, token, device_type in db.query(
+                DeviceToken.user_id, DeviceToken.token, DeviceToken.device_type
+            ).filter(DeviceToken.user_id.in_({n.user_id for n in notifications})):
+                tokens[user_id].append((token, device_type))
+
+            messages = [
+                PushMessage(
+                    token=token,
+                    provider=provider_for(device_type),
+                    title=notification.title,
+                    body=notification.message,
+                    data={"notification_id": notification.id, "request_id": notification.related_request_id},
+                )
+                for notification in notifications
+                for token, device_type in tokens[notification.user_id]
+            ]
+            return notifications, messages
+        finally:
+            db.close()
+
+    def _finish_batch(self, notification_ids: List[int], dead_tokens: set, failures: List[PushMessage]):
+        """Record a batch's outcome and mark its notifications pushed in one transaction."""
+        db = SessionLocal()
+        try:
+            pruned = 0
+            if dead_tokens:
+                pruned = db.execute(delete(DeviceToken).where(DeviceToken.token.in_(dead_tokens))).rowcount
+            if failures:
+                db.execute(insert(PushFailure), [
+                    {"notification_id": message.data["notification_id"], "token": message.token,
+                     "provider": message.provider, "attempts": self.max_attempts}
+                    for message in failures
+                ])
+            db.execute(update(Notification).where(Notification.id.in_(notification_ids))
+                       .values(pushed_at=func.now()))
+            db.commit()
+            self.counters["pruned"] += pruned
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        latency = {}
+        for provider, samples in self._latencies.items():
+            ordered = sorted(samples)
+            latency[provider] = {
+                "batches": len(ordered),
+                "avg_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000, 2),
+                "p95_ms": round(ordered[int(len(ordered) * 0.95)] * 1000, 2),
+                "max_ms": round(ordered[-1] * 1000, 2),
+            }
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "last_notification_id": self.last_notification_id,
+            **self.counters,
+            "batch_latency": latency,
+        }
@@ -0,0 +1,214 @@
+"""Personalized ranking of the verified-artist feed (``/artworks/feed/for-you``).
+
+Candidates are every row of ``feed_entries``, held as NumPy arrays: creation
+times, an artist quality signal, and the candidates' normalized tags as flat
+``(row, tag)`` postings. A user's profile is a weight per tag taken from their
+own requests, the artists they hired and the requests they made offers on.
+Scoring a request is then a handful of array operations over all candidates:
+
+    score = W_RECENCY * 2 ** (-age / half_life)
+          + W_AFFINITY * sum(profile[tag] for the artwork's tags) / sqrt(#tags)
+          + W_QUALITY * log1p(completed commissions) / log1p(max completed)
+
+Pages are keyed on ``(score, id)`` at the ``as_of`` time of the first page,
+which the cursor carries, so later pages score against the same clock.
+Users without a profile get ``None`` and the caller falls back to the
+unranked feed.
+"""
+import base64
+import math
+import time
+from datetime import timezone
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from decouple import config
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from ..models import Artwork, ArtworkTag, FeedEntry, Offer, Request, RequestStatus
+from .cache import TTLCache
+from .style_tags import parse_tags
+
+W_RECENCY = 1.0
+W_AFFINITY = 2.0
+W_QUALITY = 0.5
+HALF_LIFE_HOURS = config("FEED_RANKING_HALF_LIFE_HOURS", default=72.0, cast=float)
+# Tag weights for each profile source
+OWN_REQUEST_WEIGHT = 1.0
+HIRED_ARTIST_WEIGHT = 0.5
+OFFERED_REQUEST_WEIGHT = 1.0
+
+CURSOR_PREFIX = "r."
+
+# The candidate arrays (one entry) and per-user tag profiles
+candidates_cache = TTLCache(
+    "feed_ranking",
+    maxsize=1,
+    ttl=config("FEED_RANKING_REFRESH", default=60.0, cast=float),
+)
+profile_cache = TTLCache(
+    "feed_profiles",
+    maxsize=config("FEED_PROFILE_CACHE_SIZE", default=4096, cast=int),
+    ttl=config("FEED_PROFILE_CACHE_TTL", default=300.0, cast=float),
+)
+
+
+class Candidates:
+    """Column arrays for every feed entry, row-aligned with ``ids``."""
+
+    def __init__(self, ids, created, quality, tag_rows, tag_ids, vocabulary: Dict[str, int]):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.created = np.asarray(created, dtype=np.float64)
+        self.quality = np.asarray(quality, dtype=np.float64)
+        self.tag_rows = np.asarray(tag_rows, dtype=np.int64)
+        self.tag_ids = np.asarray(tag_ids, dtype=np.int64)
+        self.vocabulary = vocabulary
+        counts = np.bincount(self.tag_rows, minlength=len(self.ids))
+        self.tag_norm = np.divide(1.0, np.sqrt(counts), out=np.zeros(len(self.ids)), where=counts > 0)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def profile_vector(self, profile: Dict[str, float]) -> Optional[np.ndarray]:
+        """The profile over this vocabulary, scaled to a max of 1; None if no overlap."""
+        vector = np.zeros(len(self.vocabulary))
+        for tag, weight in profile.items():
+            index = self.vocabulary.get(tag)
+            if index is not None:
+                vector[index] = weight
+        peak = vector.max(initial=0.0)
+        return vector / peak if peak > 0 else None
+
+
+def _timestamp(value) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def load_candidates(db: Session) -> Candidates:
+    entries = db.execute(
+        select(FeedEntry.id, FeedEntry.artist_id, FeedEntry.created_at).order_by(FeedEntry.id)
+    ).all()
+    rows = {entry.id: row for row, entry in enumerate(entries)}
+
+    completed = dict(db.execute(
+        select(Request.selected_artist_id, func.count())
+        .where(Request.status == RequestStatus.COMPLETED, Request.selected_artist_id.is_not(None))
+        .group_by(Request.selected_artist_id)
+    ).all())
+    scale = math.log1p(max(completed.values(), default=0)) or 1.0
+
+    vocabulary: Dict[str, int] = {}
+    tag_rows, tag_ids = [], []
+    for artwork_id, tag in db.execute(
+        select(ArtworkTag.artwork_id, ArtworkTag.tag).join(FeedEntry, FeedEntry.id == ArtworkTag.artwork_id)
+    ):
+        tag_rows.append(rows[artwork_id])
+        tag_ids.append(vocabulary.setdefault(tag, len(vocabulary)))
+
+    return Candidates(
+        ids=[entry.id for entry in entries],
+        created=[_timestamp(entry.created_at) for entry in entries],
+        quality=[math.log1p(completed.get(entry.artist_id, 0)) / scale for entry in entries],
+        tag_rows=tag_rows,
+        tag_ids=tag_ids,
+        vocabulary=vocabulary,
+    )
+
+
+def load_profile(db: Session, user_id: int) -> Dict[str, float]:
+    """Tag weights from the user's requests, hired artists and offers."""
+    profile: Dict[str, float] = {}
+
+    def add(tags: List[str], weight: float):
+        for tag in tags:
+            profile[tag] = profile.get(tag, 0.0) + weight
+
+    for style in db.scalars(select(Request.style).where(Request.customer_id == user_id, Request.style.is_not(None))):
+        add(parse_tags(style), OWN_REQUEST_WEIGHT)
+
+    hired = select(Request.selected_artist_id).where(
+        Request.customer_id == user_id, Request.selected_artist_id.is_not(None)
+    )
+    for tag, count in db.execute(
+        select(ArtworkTag.tag, func.count())
+        .join(Artwork, Artwork.id == ArtworkTag.artwork_id)
+        .where(Artwork.artist_id.in_(hired))
+        .group_by(ArtworkTag.tag)
+    ):
+        add([tag], HIRED_ARTIST_WEIGHT * count)
+
+    for style in db.scalars(
+        select(Request.style).join(Offer, Offer.request_id == Request.id)
+        .where(Offer.artist_id == user_id, Request.style.is_not(None))
+    ):
+        add(parse_tags(style), OFFERED_REQUEST_WEIGHT)
+
+    return profile
+
+
+def score(candidates: Candidates, vector: np.ndarray, as_of: float) -> np.ndarray:
+    age_hours = np.maximum(as_of - candidates.created, 0.0) / 3600.0
+    recency = np.exp2(-age_hours / HALF_LIFE_HOURS)
+    affinity = np.bincount(
+        candidates.tag_rows, weights=vector[candidates.tag_ids], minlength=len(candidates)
+    ) * candidates.tag_norm
+    return W_RECENCY * recency + W_AFFINITY * affinity + W_QUALITY * candidates.quality
+
+
+def top_page(scores: np.ndarray, ids: np.ndarray, after: Optional[Tuple[float, int]], limit: int) -> np.ndarray:
+    """Row indexes of the next ``limit + 1`` candidates by (score, id) descending."""
+    rows = np.arange(len(ids))
+    if after is not None:
+        last_score, last_id = after
+        rows = np.flatnonzero((scores < last_score) | ((scores == last_score) & (ids < last_id)))
+    if len(rows) > limit + 1:
+        # Keep every row tied with the cut-off score so ids break the tie below
+        cutoff = -np.partition(-scores[rows], limit)[limit]
+        rows = rows[scores[rows] >= cutoff]
+    return rows[np.lexsort((-ids[rows], -scores[rows]))][:limit + 1]
+
+
+def is_ranked_cursor(cursor: Optional[str]) -> bool:
+    return cursor is not None and cursor.startswith(CURSOR_PREFIX)
+
+
+def encode_cursor(as_of: float, last_score: float, last_id: int) -> str:
+    raw = f"{as_of!r}|{last_score!r}|{last_id}".encode()
+    return CURSOR_PREFIX + base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, float, int]:
+    token = cursor[len(CURSOR_PREFIX):]
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        as_of, last_score, last_id = raw.split("|")
+        return float(as_of), float(last_score), int(last_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def ranked_page(db: Session, user_id: int, cursor: Optional[str], limit: int) -> Optional[Tuple[list, Optional[str]]]:
+    """One page of the user's ranked feed as ``(entries, next_cursor)``,
+    or ``None`` when the user has no profile to rank with."""
+    profile = profile_cache.get_or_load(("profile", user_id), lambda: load_profile(db, user_id))
+    candidates = candidates_cache.get_or_load(("candidates",), lambda: load_candidates(db))
+    vector = candidates.profile_vector(profile)
+    if vector is None:
+        return None
+
+    as_of, after = time.time(), None
+    if cursor:
+        as_of, last_score, last_id = decode_cursor(cursor)
+        after = (last_score, last_id)
+    scores = score(candidates, vector, as_of)
+    rows = top_page(scores, candidates.ids, after, limit)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(as_of, float(scores[rows[-1]]), int(candidates.ids[rows[-1]]))
+    page_ids = [int(artwork_id) for artwork_id in candidates.ids[rows]]
+    entries = {entry.id: entry for entry in db.query(FeedEntry).filter(FeedEntry.id.in_(page_ids))}
+    return [entries[artwork_id] for artwork_id in page_ids if artwork_id in entries], next_cursor
@@ -0,0 +1,139 @@
+"""Full-text user search over name, username and bio (``user_search``).
+
+On SQLite this is an FTS5 table keyed by user id, so ``/users/search`` looks
+terms up in the index instead of scanning ``users`` with ``ILIKE '%q%'``.
+Every query term is matched as a word prefix ("ali smi" finds "Alice Smith")
+and results are ranked by bm25 with name and username weighted over bio.
+Rows are maintained explicitly by the write paths that change those columns,
+inside their own transaction, like ``app.utils.feed``.
+
+Other backends keep the unindexed ``ILIKE`` scan ordered by id.
+"""
+import base64
+import re
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import (
+    Column, Integer, MetaData, Table, Text, and_, delete, func, insert, inspect,
+    literal_column, or_, select
+)
+from sqlalchemy.orm import Session
+from ..database import IS_SQLITE
+from ..models import User
+from .pagination import clamp_limit
+
+# Kept out of Base.metadata: create_all() can't create virtual tables
+user_search = Table(
+    "user_search", MetaData(),
+    Column("rowid", Integer, primary_key=True),
+    Column("name", Text),
+    Column("username", Text),
+    Column("bio", Text),
+)
+
+CREATE_USER_SEARCH = (
+    "CREATE VIRTUAL TABLE user_search USING fts5("
+    "name, username, bio, "
+    "tokenize = 'unicode61 remove_diacritics 2', "
+    "prefix = '1 2 3')"
+)
+
+# bm25 weights for name, username and bio
+COLUMN_WEIGHTS = (10.0, 10.0, 1.0)
+
+_TERM = re.compile(r"\w+")
+
+
+def match_expression(q: str) -> Optional[str]:
+    """Turn free text into an FTS5 query: every term, as a prefix, must match."""
+    terms = _TERM.findall(q)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def encode_cursor(rank: float, user_id: int) -> str:
+    raw = f"{rank!r}|{user_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        rank, user_id = raw.split("|")
+        return float(rank), int(user_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def index_user(db: Session, user: User):
+    """Replace the user's row in the search index. Does not commit."""
+    if not IS_SQLITE:
+        return
+    db.execute(delete(user_search).where(user_search.c.rowid == user.id))
+    db.execute(insert(user_search).values(
+        rowid=user.id, name=user.name, username=user.username, bio=user.bio
+    ))
+
+
+def _copy_users(db: Session):
+    db.execute(insert(user_search).from_select(
+        ["rowid", "name", "username", "bio"],
+        select(User.id, User.name, User.username, User.bio)
+    ))
+
+
+def ensure_index(engine):
+    """Create the index on first start and fill it from ``users``."""
+    if not IS_SQLITE or inspect(engine).has_table("user_search"):
+        return
+    with Session(engine) as db:
+        db.connection().exec_driver_sql(CREATE_USER_SEARCH)
+        _copy_users(db)
+        db.commit()
+
+
+def rebuild_index(db: Session) -> int:
+    """Repopulate ``user_search`` from scratch and return its new size."""
+    if not IS_SQLITE:
+        return 0
+    # Only the API creates the table on startup, and this may run before it has
+    ensure_index(db.get_bind())
+    db.execute(delete(user_search))
+    _copy_users(db)
+    db.commit()
+    return db.scalar(select(func.count()).select_from(user_search))
+
+
+def search_page(db: Session, q: str, filters: list, cursor: Optional[str], limit: int):
+    """Best matches for ``q`` among users passing ``filters``.
+
+    Pages are keyed on ``(rank, id)`` and fetched with one look-ahead row;
+    returns ``(users, next_cursor)``.
+    """
+    limit = clamp_limit(limit)
+    if IS_SQLITE:
+        expression = match_expression(q)
+        if expression is None:
+            return [], None
+        rank = func.bm25(literal_column("user_search"), *COLUMN_WEIGHTS)
+        query = db.query(User, rank).join(user_search, user_search.c.rowid == User.id).filter(
+            literal_column("user_search").op("MATCH")(expression)
+        )
+    else:
+        rank = literal_column("0.0")
+        query = db.query(User, rank).filter(
+            User.name.ilike(f"%{q}%") | User.username.ilike(f"%{q}%") | User.bio.ilike(f"%{q}%")
+        )
+
+    query = query.filter(*filters)
+    if cursor:
+        last_rank, last_id = decode_cursor(cursor)
+        query = query.filter(or_(rank > last_rank, and_(rank == last_rank, User.id > last_id)))
+    rows = query.order_by(rank, User.id).limit(limit + 1).all()
+
+    if len(rows) <= limit:
+        return [user for user, _ in rows], None
+    rows = rows[:limit]
+    last_user, last_rank = rows[-1]
+    return [user for user, _ in rows], encode_cursor(last_rank, last_user.id)
@@ -0,0 +1,143 @@
+"""Session registry and the in-memory token denylist.
+
+Every login starts a ``UserSession`` and its tokens carry the session id as
+``sid`` (and their own ``jti``). Logging out or revoking a session marks the
+row revoked; refresh tokens rotate on each use, and presenting an older one
+revokes the whole session as a stolen-token signal.
+
+``get_current_user`` must not pay a database round trip to learn that a token
+is still good, so revoked session ids are mirrored in :class:`Denylist`: a
+Bloom filter answers the common "not revoked" case, and the exact set behind
+it confirms the filter's positives. Revocations are added here once they
+commit, and the set is reloaded every ``REVOCATION_SYNC_INTERVAL`` seconds,
+which bounds how long a session revoked through another worker stays usable.
+Only sessions that have not expired are loaded, so the set stays small.
+"""
+import hashlib
+import math
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+from decouple import config
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from ..models import UserSession
+from .auth import REFRESH_TOKEN_EXPIRE_DAYS, create_access_token, create_refresh_token
+
+# Bloom filter false-positive rate; a false positive only costs a set lookup
+FALSE_POSITIVE_RATE = 0.01
+MIN_CAPACITY = 1024
+# Seconds a locally revoked id survives reloads that started before its
+# commit was visible
+LOCAL_GRACE = 60.0
+
+
+class BloomFilter:
+    """Fixed-capacity Bloom filter over strings."""
+
+    def __init__(self, capacity: int, false_positive_rate: float = FALSE_POSITIVE_RATE):
+        self.capacity = max(capacity, MIN_CAPACITY)
+        bits = math.ceil(-self.capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        self.size = bits
+        self.hashes = max(1, round(bits / self.capacity * math.log(2)))
+        self._bits = bytearray((bits + 7) // 8)
+
+    def _positions(self, key: str) -> Iterable[int]:
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class Denylist:
+    """Thread-safe set of revoked session ids behind a Bloom filter."""
+
+    def __init__(self):
+        self._revoked: set = set()
+        self._filter = BloomFilter(0)
+        self._local: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.filter_hits = 0
+        self.revoked_hits = 0
+
+    def _rebuild(self, revoked: set):
+        bloom = BloomFilter(2 * len(revoked))
+        for session_id in revoked:
+            bloom.add(session_id)
+        self._revoked, self._filter = revoked, bloom
+
+    def load(self, db: Session) -> int:
+        """Reload the revoked, unexpired sessions and return how many there are."""
+        revoked = set(db.scalars(select(UserSession.id).where(
+            UserSession.revoked_at.is_not(None), UserSession.expires_at > datetime.utcnow()
+        )))
+        with self._lock:
+            cutoff = time.monotonic() - LOCAL_GRACE
+            self._local = {session_id: at for session_id, at in self._local.items() if at > cutoff}
+            revoked.update(self._local)
+            self._rebuild(revoked)
+        return len(revoked)
+
+    def add(self, *session_ids: str):
+        """Deny sessions revoked by this process. Call after commit."""
+        with self._lock:
+            now = time.monotonic()
+            for session_id in session_ids:
+                self._local[session_id] = now
+                self._revoked.add(session_id)
+                self._filter.add(session_id)
+            if len(self._revoked) > self._filter.capacity:
+                self._rebuild(self._revoked)
+
+    def is_revoked(self, session_id: Optional[str]) -> bool:
+        if session_id is None:
+            return False
+        with self._lock:
+            self.checks += 1
+            if session_id not in self._filter:
+                return False
+            self.filter_hits += 1
+            revoked = session_id in self._revoked
+            self.revoked_hits += revoked
+            return revoked
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "revoked_sessions": len(self._revoked),
+                "filter_bits": self._filter.size,
+                "checks": self.checks,
+                "filter_hits": self.filter_hits,
+                "revoked_hits": self.revoked_hits,
+            }
+
+
+denylist = Denylist()
+
+
+def start_session(user_id: int, user_agent: Optional[str]) -> UserSession:
+    """A new, unsaved session; :func:`issue_tokens` fills in its refresh token."""
+    return UserSession(id=uuid.uuid4().hex, user_id=user_id, user_agent=user_agent)
+
+
+def issue_tokens(email: str, session: UserSession) -> dict:
+    """Access and refresh tokens for the session, rotating its refresh token.
+    The caller commits the session."""
+    refresh_jti = uuid.uuid4().hex
+    session.refresh_jti = refresh_jti
+    session.expires_at = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    return {
+        "access_token": create_access_token(data={"sub": email, "sid": session.id}),
+        "refresh_token": create_refresh_token(data={"sub": email, "sid": session.id, "jti": refresh_jti}),
+        "token_type": "bearer",
+    }
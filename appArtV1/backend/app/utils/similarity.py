@@ -0,0 +1,132 @@
+"""In-process MinHash/LSH index for ``/artworks/{id}/similar``.
+
+An artwork's features are its normalized style tags plus the words of its
+title and description. Each feature set gets a MinHash signature of
+``NUM_HASHES`` values (computed with NumPy), split into ``BANDS`` bands;
+artworks whose band values collide share a bucket. A lookup reads the
+artwork's own buckets and ranks the artworks found there by how many bands
+they share, which tracks their Jaccard similarity, so no pair of artworks is
+ever compared at query time.
+
+The artworks router updates the index after each commit;
+``SIMILARITY_RELOAD_INTERVAL`` reloads it in full.
+"""
+import hashlib
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from ..models import Artwork
+from .style_tags import parse_tags
+
+NUM_HASHES = 64
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+# Buckets larger than this (e.g. a tag on most artworks) are too unspecific to
+# rank by and are skipped at query time
+MAX_BUCKET_SIZE = 1000
+DEFAULT_LIMIT = 12
+MAX_LIMIT = 50
+
+_PRIME = 4294967311  # smallest prime above 2**32
+_rng = np.random.default_rng(20240611)
+_A = _rng.integers(1, 2**32, NUM_HASHES, dtype=np.uint64)[:, None]
+_B = _rng.integers(0, 2**32, NUM_HASHES, dtype=np.uint64)[:, None]
+
+_WORD = re.compile(r"[^\W\d_]{3,}")
+STOPWORDS = frozenset("and the for with from this that into are was its our".split())
+
+
+def features(title: Optional[str], description: Optional[str], style_tags: Optional[str]) -> Set[str]:
+    words = _WORD.findall(f"{title or ''} {description or ''}".lower())
+    return {f"tag:{tag}" for tag in parse_tags(style_tags)} | {
+        f"word:{word}" for word in words if word not in STOPWORDS
+    }
+
+
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=4).digest(), "little")
+
+
+def signature(feature_set: Set[str]) -> np.ndarray:
+    """MinHash signature: for each hash function, the smallest feature hash."""
+    x = np.fromiter((_feature_hash(f) for f in feature_set), dtype=np.uint64, count=len(feature_set))
+    # a * x stays below 2**64 since both are below 2**32
+    return ((_A * x[None, :]) % _PRIME + _B).min(axis=1) % _PRIME
+
+
+def band_keys(sig: np.ndarray) -> List[Tuple[int, bytes]]:
+    return [(band, sig[band * ROWS:(band + 1) * ROWS].tobytes()) for band in range(BANDS)]
+
+
+class SimilarityIndex:
+    """Thread-safe LSH buckets over artwork MinHash signatures."""
+
+    def __init__(self):
+        self._buckets: Dict[Tuple[int, bytes], Set[int]] = {}
+        self._keys: Dict[int, List[Tuple[int, bytes]]] = {}
+        self._lock = threading.Lock()
+        self.lookups = 0
+
+    def load(self, db: Session) -> int:
+        """Rebuild the index from ``artworks`` and return how many it holds."""
+        buckets: Dict[Tuple[int, bytes], Set[int]] = {}
+        keys: Dict[int, List[Tuple[int, bytes]]] = {}
+        rows = db.execute(select(Artwork.id, Artwork.title, Artwork.description, Artwork.style_tags))
+        for artwork_id, title, description, tags in rows:
+            feature_set = features(title, description, tags)
+            if feature_set:
+                keys[artwork_id] = band_keys(signature(feature_set))
+                for key in keys[artwork_id]:
+                    buckets.setdefault(key, set()).add(artwork_id)
+        with self._lock:
+            self._buckets, self._keys = buckets, keys
+        return len(keys)
+
+    def upsert(self, artwork: Artwork):
+        """Index a new artwork or re-index an edited one. Call after commit."""
+        feature_set = features(artwork.title, artwork.description, artwork.style_tags)
+        keys = band_keys(signature(feature_set)) if feature_set else []
+        with self._lock:
+            self._discard(artwork.id)
+            if keys:
+                self._keys[artwork.id] = keys
+                for key in keys:
+                    self._buckets.setdefault(key, set()).add(artwork.id)
+
+    def remove(self, artwork_id: int):
+        with self._lock:
+            self._discard(artwork_id)
+
+    def _discard(self, artwork_id: int):
+        for key in self._keys.pop(artwork_id, []):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(artwork_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def similar(self, artwork_id: int, limit: int = DEFAULT_LIMIT) -> List[int]:
+        """Ids of the artworks sharing the most bands with ``artwork_id``."""
+        limit = max(1, min(limit, MAX_LIMIT))
+        shared: Counter = Counter()
+        with self._lock:
+            self.lookups += 1
+            for key in self._keys.get(artwork_id, []):
+                bucket = self._buckets[key]
+                if len(bucket) <= MAX_BUCKET_SIZE:
+                    shared.update(bucket)
+        shared.pop(artwork_id, None)
+        # Most shared bands first, newer artworks first among equals
+        ranked = sorted(shared.items(), key=lambda item: (-item[1], -item[0]))
+        return [other for other, _ in ranked[:limit]]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"artworks": len(self._keys), "buckets": len(self._buckets), "lookups": self.lookups}
+
+
+artwork_index = SimilarityIndex()
@@ -0,0 +1,321 @@
+"""Object storage for uploaded images.
+
+``ObjectStorage.put_stream`` takes an async iterator of byte chunks (e.g. the
+request body) and stores it without ever holding the whole file in memory:
+
+* ``S3Storage`` cuts the stream into ``part_size`` parts and sends them as an
+  S3 multipart upload, at most ``concurrency`` parts in flight per upload, so
+  memory stays around ``part_size * (concurrency + 1)``. Bodies smaller than
+  one part go up with a single ``put_object``.
+* ``LocalStorage`` writes to a file under ``root``; for development, tests and
+  single-host deployments.
+
+boto3 and file I/O are blocking, so every call runs on ``io_executor``, a
+bounded thread pool shared by all uploads; the event loop only awaits them.
+
+``S3Storage.presign_upload`` lets clients skip the API entirely: it signs a
+browser-style POST policy that S3 enforces (exact key, content type, size
+limit, expiry), and ``stat`` confirms the object arrived afterwards.
+``get_stream`` reads an object back in ``READ_CHUNK_SIZE`` chunks.
+"""
+import abc
+import asyncio
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional
+import boto3
+from botocore.exceptions import ClientError
+from decouple import config
+
+MAX_UPLOAD_BYTES = config("MAX_UPLOAD_BYTES", default=25 * 1024 * 1024, cast=int)
+S3_PART_SIZE = config("S3_PART_SIZE", default=8 * 1024 * 1024, cast=int)
+S3_UPLOAD_CONCURRENCY = config("S3_UPLOAD_CONCURRENCY", default=4, cast=int)
+# S3 rejects multipart parts below 5 MiB (except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
+READ_CHUNK_SIZE = 1024 * 1024
+
+io_executor = ThreadPoolExecutor(
+    max_workers=config("STORAGE_IO_WORKERS", default=16, cast=int),
+    thread_name_prefix="storage-io",
+)
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+async def _run(fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(io_executor, lambda: fn(*args, **kwargs))
+
+
+async def _limited(chunks: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+    received = 0
+    async for chunk in chunks:
+        received += len(chunk)
+        if received > max_bytes:
+            raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+        if chunk:
+            yield chunk
+
+
+class ObjectStorage(abc.ABC):
+    """Stores byte streams under keys and maps keys to public URLs."""
+
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes], content_type: str,
+                         max_bytes: int = MAX_UPLOAD_BYTES) -> str:
+        """Store the stream under ``key`` and return its URL.
+
+        Raises :class:`UploadTooLarge` (and stores nothing) past ``max_bytes``.
+        """
+        await self._put(key, _limited(chunks, max_bytes), content_type)
+        return self.url_for(key)
+
+    async def put_bytes(self, key: str, data: bytes, content_type: str) -> str:
+        async def single():
+            yield data
+        return await self.put_stream(key, single(), content_type, max_bytes=len(data))
+
+    @abc.abstractmethod
+    async def _put(self, key: str, chunks: AsyncIterator[bytes], content_type: str):
+        ...
+
+    @abc.abstractmethod
+    async def get_bytes(self, key: str) -> bytes:
+        ...
+
+    @abc.abstractmethod
+    def get_stream(self, key: str) -> AsyncIterator[bytes]:
+        """The stored object as chunks, without holding all of it in memory."""
+
+    @abc.abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    @abc.abstractmethod
+    async def move(self, source: str, target: str) -> str:
+        """Rename ``source`` to ``target`` and return the new URL."""
+
+    @abc.abstractmethod
+    async def stat(self, key: str) -> Optional[int]:
+        """The stored object's size in bytes, or None if there is none."""
+
+    def presign_upload(self, key: str, content_type: str, max_bytes: int, expires_in: int) -> dict:
+        """Credentials for a client to upload ``key`` directly, as
+        ``{"url": ..., "fields": {...}}`` for a multipart/form-data POST."""
+        raise NotImplementedError(f"{type(self).__name__} does not support direct uploads")
+
+    @abc.abstractmethod
+    def url_for(self, key: str) -> str:
+        ...
+
+    def key_for_url(self, url: str) -> Optional[str]:
+        """The key of a URL this storage handed out, or None for foreign URLs."""
+        prefix = self.url_for("")
+        return url[len(prefix):] if url.startswith(prefix) and len(url) > len(prefix) else None
+
+
+class S3Storage(ObjectStorage):
+    def __init__(self, client, bucket: str, region: str, public_base_url: Optional[str] = None,
+                 part_size: int = S3_PART_SIZE, concurrency: int = S3_UPLOAD_CONCURRENCY):
+        self.client = client
+        self.bucket = bucket
+        self.public_base_url = public_base_url or f"https://{bucket}.s3.{region}.amazonaws.com"
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.concurrency = concurrency
+
+    def url_for(self, key: str) -> str:
+        return f"{self.public_base_url}/{key}"
+
+    async def _put(self, key: str, chunks: AsyncIterator[bytes], content_type: str):
+        buffer = bytearray()
+        upload_id = None
+        parts: Dict[int, str] = {}
+        in_flight: List[asyncio.Task] = []
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def send_part(number: int, body: bytes):
+            try:
+                response = await _run(
+                    self.client.upload_part, Bucket=self.bucket, Key=key,
+                    UploadId=upload_id, PartNumber=number, Body=body
+                )
+                parts[number] = response["ETag"]
+            finally:
+                slots.release()
+
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                while len(buffer) >= self.part_size:
+                    if upload_id is None:
+                        response = await _run(
+                            self.client.create_multipart_upload,
+                            Bucket=self.bucket, Key=key, ContentType=content_type, ACL="public-read"
+                        )
+                        upload_id = response["UploadId"]
+                    # Waiting for a slot is what bounds memory and parallelism
+                    await slots.acquire()
+                    body, buffer = bytes(buffer[:self.part_size]), buffer[self.part_size:]
+                    in_flight.append(asyncio.create_task(send_part(len(in_flight) + 1, body)))
+                    await self._raise_failed(in_flight)
+
+            if upload_id is None:
+                await _run(
+                    self.client.put_object, Bucket=self.bucket, Key=key,
+                    Body=bytes(buffer), ContentType=content_type, ACL="public-read"
+                )
+                return
+            if buffer:
+                await slots.acquire()
+                in_flight.append(asyncio.create_task(send_part(len(in_flight) + 1, bytes(buffer))))
+            await asyncio.gather(*in_flight)
+            await _run(
+                self.client.complete_multipart_upload, Bucket=self.bucket, Key=key, UploadId=upload_id,
+                MultipartUpload={"Parts": [{"PartNumber": n, "ETag": parts[n]} for n in sorted(parts)]}
+            )
+        except BaseException:
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+            if upload_id is not None:
+                await _run(self.client.abort_multipart_upload, Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+
+    async def get_bytes(self, key: str) -> bytes:
+        response = await _run(self.client.get_object, Bucket=self.bucket, Key=key)
+        return await _run(response["Body"].read)
+
+    async def get_stream(self, key: str) -> AsyncIterator[bytes]:
+        response = await _run(self.client.get_object, Bucket=self.bucket, Key=key)
+        body = response["Body"]
+        try:
+            while True:
+                chunk = await _run(body.read, READ_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            body.close()
+
+    async def delete(self, key: str):
+        await _run(self.client.delete_object, Bucket=self.bucket, Key=key)
+
+    async def move(self, source: str, target: str) -> str:
+        # A server-side copy; the bytes never come back through this process
+        await _run(
+            self.client.copy_object, Bucket=self.bucket, Key=target,
+            CopySource={"Bucket": self.bucket, "Key": source}, ACL="public-read"
+        )
+        await self.delete(source)
+        return self.url_for(target)
+
+    async def stat(self, key: str) -> Optional[int]:
+        try:
+            response = await _run(self.client.head_object, Bucket=self.bucket, Key=key)
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return response["ContentLength"]
+
+    def presign_upload(self, key: str, content_type: str, max_bytes: int, expires_in: int) -> dict:
+        # A POST policy rather than a presigned PUT, because only the policy
+        # lets S3 itself reject bodies over max_bytes
+        fields = {"Content-Type": content_type, "acl": "public-read"}
+        return self.client.generate_presigned_post(
+            Bucket=self.bucket, Key=key, Fields=fields, ExpiresIn=expires_in,
+            Conditions=[{"Content-Type": content_type}, {"acl": "public-read"},
+                        ["content-length-range", 1, max_bytes]],
+        )
+
+    @staticmethod
+    async def _raise_failed(tasks: List[asyncio.Task]):
+        for task in tasks:
+            if task.done() and task.exception() is not None:
+                raise task.exception()
+
+
+class LocalStorage(ObjectStorage):
+    """Files under ``root``, served by this app under ``base_url``."""
+
+    def __init__(self, root: str, base_url: str = "/media"):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/")
+
+    def url_for(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    def path_for(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Key escapes the storage root: {key!r}")
+        return path
+
+    async def _put(self, key: str, chunks: AsyncIterator[bytes], content_type: str):
+        path = self.path_for(key)
+        await _run(os.makedirs, os.path.dirname(path), exist_ok=True)
+        # Write beside the target and rename, so readers never see partial files
+        fd, partial = await _run(tempfile.mkstemp, dir=os.path.dirname(path), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                async for chunk in chunks:
+                    await _run(file.write, chunk)
+            await _run(os.replace, partial, path)
+        except BaseException:
+            await _run(lambda: os.path.exists(partial) and os.remove(partial))
+            raise
+
+    async def get_bytes(self, key: str) -> bytes:
+        def read():
+            with open(self.path_for(key), "rb") as file:
+                return file.read()
+        return await _run(read)
+
+    async def get_stream(self, key: str) -> AsyncIterator[bytes]:
+        file = await _run(open, self.path_for(key), "rb")
+        try:
+            while True:
+                chunk = await _run(file.read, READ_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            file.close()
+
+    async def delete(self, key: str):
+        path = self.path_for(key)
+        await _run(lambda: os.path.exists(path) and os.remove(path))
+
+    async def move(self, source: str, target: str) -> str:
+        path = self.path_for(target)
+        await _run(os.makedirs, os.path.dirname(path), exist_ok=True)
+        await _run(os.replace, self.path_for(source), path)
+        return self.url_for(target)
+
+    async def stat(self, key: str) -> Optional[int]:
+        path = self.path_for(key)
+        return await _run(lambda: os.path.getsize(path) if os.path.isfile(path) else None)
+
+
+def build_storage(name: str, **options) -> ObjectStorage:
+    if name == "s3":
+        region = config("AWS_REGION", default="us-east-1")
+        client = boto3.client(
+            "s3",
+            aws_access_key_id=config("AWS_ACCESS_KEY_ID", default=""),
+            aws_secret_access_key=config("AWS_SECRET_ACCESS_KEY", default=""),
+            region_name=region,
+            endpoint_url=config("AWS_S3_ENDPOINT_URL", default="") or None,
+        )
+        return S3Storage(client, config("AWS_S3_BUCKET_NAME", default="appart-bucket"), region, **options)
+    if name == "local":
+        return LocalStorage(
+            config("STORAGE_ROOT", default="./media"),
+            config("STORAGE_BASE_URL", default="/media"),
+            **options
+        )
+    raise ValueError(f"Unknown storage backend: {name}")
+
+
+storage = build_storage(config("STORAGE_BACKEND", default="s3"))
@@ -0,0 +1,66 @@
+"""Normalized style tags (``artwork_tags``) behind ``/artworks/search``.
+
+``Artwork.style_tags`` stays the comma-separated string clients send; its
+tags are also stored lowercased and de-duplicated as one row per tag, so a tag
+filter reads that tag's posting list instead of ``LIKE``-scanning artworks.
+Every write path that changes an artwork's tags calls :func:`sync_tags` inside
+its own transaction, like ``app.utils.feed``.
+"""
+from typing import List, Optional
+from sqlalchemy import delete, insert, intersect, select, union
+from sqlalchemy.orm import Session
+from ..models import Artwork, ArtworkTag
+
+MAX_QUERY_TAGS = 10
+
+
+def parse_tags(style_tags: Optional[str]) -> List[str]:
+    """Split a comma-separated tag string into unique, lowercased tags."""
+    tags = (tag.strip().lower() for tag in (style_tags or "").split(","))
+    return list(dict.fromkeys(tag for tag in tags if tag))
+
+
+def sync_tags(db: Session, artwork: Artwork):
+    """Replace the artwork's index rows with its current tags. Does not commit."""
+    db.execute(delete(ArtworkTag).where(ArtworkTag.artwork_id == artwork.id))
+    tags = parse_tags(artwork.style_tags)
+    if tags:
+        db.execute(insert(ArtworkTag), [{"tag": tag, "artwork_id": artwork.id} for tag in tags])
+
+
+def remove_tags(db: Session, artwork_id: int):
+    db.execute(delete(ArtworkTag).where(ArtworkTag.artwork_id == artwork_id))
+
+
+def tagged_artwork_ids(tags: List[str], match_all: bool):
+    """Ids of artworks carrying any (or all) of ``tags``, as a subquery."""
+    postings = [select(ArtworkTag.artwork_id).where(ArtworkTag.tag == tag) for tag in tags]
+    if len(postings) == 1:
+        return postings[0]
+    return intersect(*postings) if match_all else union(*postings)
+
+
+def rebuild_tags(db: Session) -> int:
+    """Repopulate ``artwork_tags`` from every artwork's ``style_tags`` string
+    and return the number of rows written."""
+    db.execute(delete(ArtworkTag))
+    rows = [
+        {"tag": tag, "artwork_id": artwork_id}
+        for artwork_id, style_tags in db.execute(
+            select(Artwork.id, Artwork.style_tags).where(Artwork.style_tags.is_not(None))
+        )
+        for tag in parse_tags(style_tags)
+    ]
+    if rows:
+        db.execute(insert(ArtworkTag), rows)
+    db.commit()
+    return len(rows)
+
+
+def backfill_tags(db: Session) -> Optional[int]:
+    """Build the index once for databases created before it existed."""
+    if db.scalar(select(ArtworkTag.artwork_id).limit(1)) is not None:
+        return None
+    if db.scalar(select(Artwork.id).where(Artwork.style_tags.is_not(None), Artwork.style_tags != "").limit(1)) is None:
+        return None
+    return rebuild_tags(db)
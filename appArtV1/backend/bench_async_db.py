@@ -0,0 +1,129 @@
+"""Concurrent latency benchmark: sync Session inside `async def` vs the async DB path.
+
+Seeds a throwaway SQLite database, then drives two otherwise identical
+endpoints with concurrent requests in one event loop:
+
+* ``legacy`` runs the query on the synchronous ``SessionLocal`` from inside an
+  ``async def`` handler, which is what the requests/offers/notifications
+  routers used to do, so every query blocks the loop;
+* ``async`` runs it through ``AsyncSessionLocal`` (aiosqlite).
+
+While each batch runs, a monitor task measures event-loop lag (how late a
+5 ms timer fires), which is how long any other connection on the worker would
+be stalled. Request latency only starts counting once a request's task gets to
+run, so in the legacy case, where the blocked loop serializes everything, the
+loop lag is the number to compare. Run from the repository root:
+
+    python -m backend.bench_async_db --requests 400 --concurrency 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_async_db.db"
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import func, insert, select
+
+from .app.database import AsyncSessionLocal, Base, SessionLocal, engine
+from .app.models import Notification, NotificationType, User
+
+USER_ID = 1
+
+
+def seed(notifications: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User).values(
+            id=USER_ID, email="bench@example.com", name="Bench", hashed_password="x"
+        ))
+        conn.execute(insert(Notification), [
+            {"user_id": USER_ID, "type": NotificationType.NEW_REQUEST, "title": "t",
+             "message": "m", "is_read": i % 3 == 0}
+            for i in range(notifications)
+        ])
+
+
+def unread_count_query():
+    return select(func.count(Notification.id)).where(
+        Notification.user_id == USER_ID, Notification.is_read == False
+    )
+
+
+bench_app = FastAPI()
+
+
+@bench_app.get("/legacy")
+async def legacy_unread_count():
+    db = SessionLocal()
+    try:
+        return {"unread_count": db.scalar(unread_count_query())}
+    finally:
+        db.close()
+
+
+@bench_app.get("/async")
+async def async_unread_count():
+    async with AsyncSessionLocal() as db:
+        return {"unread_count": await db.scalar(unread_count_query())}
+
+
+def summarize(samples: list) -> str:
+    ordered = sorted(samples)
+    p95 = ordered[int(len(ordered) * 0.95)]
+    return (f"p50 {statistics.median(ordered) * 1000:7.2f} ms  "
+            f"p95 {p95 * 1000:7.2f} ms  max {ordered[-1] * 1000:7.2f} ms")
+
+
+async def run(path: str, requests: int, concurrency: int) -> None:
+    transport = httpx.ASGITransport(app=bench_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        latencies, loop_lag = [], []
+        semaphore = asyncio.Semaphore(concurrency)
+        done = asyncio.Event()
+
+        async def one():
+            started = time.perf_counter()
+            async with semaphore:
+                response = await client.get(path)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        async def monitor():
+            while not done.is_set():
+                started = time.perf_counter()
+                await asyncio.sleep(0.005)
+                loop_lag.append(time.perf_counter() - started - 0.005)
+
+        monitor_task = asyncio.create_task(monitor())
+        started = time.perf_counter()
+        await asyncio.gather(*[one() for _ in range(requests)])
+        elapsed = time.perf_counter() - started
+        done.set()
+        await monitor_task
+
+    print(f"{path:8s} {requests / elapsed:8.1f} req/s  request   {summarize(latencies)}")
+    print(f"{'':8s} {'':14s}  loop lag  {summarize(loop_lag)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notifications", type=int, default=50_000)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    seed(args.notifications)
+    for path in ("/legacy", "/async"):
+        asyncio.run(run(path, args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Latency of the vectorized personalized feed ranking stage.
+
+Builds synthetic candidate arrays (no database) shaped like ``feed_entries``
+and times scoring plus top-page selection for one user, first page and a
+deep page. Run from the repository root:
+
+    python -m backend.bench_feed_ranking --candidates 50000 --tags 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from .app.utils import ranking
+
+
+def build(candidates: int, tags: int, tags_per_artwork: int, rng) -> ranking.Candidates:
+    now = time.time()
+    return ranking.Candidates(
+        ids=np.arange(1, candidates + 1),
+        created=now - rng.exponential(30 * 86400, candidates),
+        quality=rng.random(candidates),
+        tag_rows=np.repeat(np.arange(candidates), tags_per_artwork),
+        tag_ids=rng.zipf(1.3, candidates * tags_per_artwork) % tags,
+        vocabulary={f"tag{i}": i for i in range(tags)},
+    )
+
+
+def timed(fn, repeat: int) -> str:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    ordered = sorted(samples)
+    return (f"p50 {statistics.median(ordered) * 1000:6.2f} ms  "
+            f"p95 {ordered[int(len(ordered) * 0.95)] * 1000:6.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--candidates", type=int, default=50_000)
+    parser.add_argument("--tags", type=int, default=2_000)
+    parser.add_argument("--tags-per-artwork", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    candidates = build(args.candidates, args.tags, args.tags_per_artwork, rng)
+    profile = {f"tag{i}": float(rng.random()) for i in rng.choice(args.tags, 40, replace=False)}
+    as_of = time.time()
+
+    def first_page():
+        vector = candidates.profile_vector(profile)
+        scores = ranking.score(candidates, vector, as_of)
+        return scores, ranking.top_page(scores, candidates.ids, None, args.limit)
+
+    scores, rows = first_page()
+    deep = (float(scores[rows[args.limit - 1]]) * 0.5, args.candidates)
+
+    def deep_page():
+        vector = candidates.profile_vector(profile)
+        ranking.top_page(ranking.score(candidates, vector, as_of), candidates.ids, deep, args.limit)
+
+    print(f"{args.candidates} candidates, {args.tags} tags")
+    print(f"first page  {timed(first_page, args.repeat)}")
+    print(f"deep page   {timed(deep_page, args.repeat)}")
+
+
+if __name__ == "__main__":
+    main()
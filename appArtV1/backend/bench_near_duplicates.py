@@ -0,0 +1,48 @@
+"""Latency of a near-duplicate lookup over the in-memory image hash index.
+
+Fills a ``HashIndex`` with random 64-bit hashes (no database) and times one
+vectorized Hamming-distance lookup across all of them. Run from the
+repository root:
+
+    python -m backend.bench_near_duplicates --hashes 1000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from .app.utils import near_duplicates
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hashes", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    hashes = rng.integers(np.iinfo(np.int64).min, np.iinfo(np.int64).max, args.hashes, dtype=np.int64)
+    index = near_duplicates.HashIndex()
+    started = time.perf_counter()
+    for artwork_id, image_hash in enumerate(hashes.tolist(), start=1):
+        index.upsert(SimpleNamespace(id=artwork_id, artist_id=artwork_id % 1000, image_hash=image_hash))
+    print(f"indexed {args.hashes} hashes in {time.perf_counter() - started:.2f} s")
+
+    samples = []
+    for probe in rng.choice(hashes, args.repeat).tolist():
+        started = time.perf_counter()
+        matches = index.near(probe ^ 0b101)  # two bits off an indexed hash
+        samples.append(time.perf_counter() - started)
+        assert matches, "the probe's source hash should match"
+    ordered = sorted(samples)
+    print(f"lookup  p50 {statistics.median(ordered) * 1000:6.2f} ms  "
+          f"p95 {ordered[int(len(ordered) * 0.95)] * 1000:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Memory and delivery latency of idle ``/notifications/stream`` connections.
+
+Seeds a throwaway SQLite database with one user per connection, opens that
+many streams against the ASGI app in this process (no sockets, so the figures
+cover the app's share: request, response, disconnect watcher, generator and hub
+subscriber, not the server's transport buffers), waits until every stream is
+idle, then publishes one event to every user and times until all of them have
+sent it. Run from the repository root:
+
+    python -m backend.bench_notification_stream --connections 10000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_notification_stream.db"
+
+from sqlalchemy import insert
+
+from .app.database import SessionLocal
+from .app.main import app
+from .app.models import User
+from .app.utils.auth import create_access_token
+from .app.utils.notification_stream import format_event, hub
+
+
+async def open_stream(token: str, disconnect: asyncio.Event, idle: asyncio.Event, delivered: asyncio.Event):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/notifications/stream", "raw_path": b"/notifications/stream",
+        "query_string": b"", "root_path": "", "client": ("bench", 1), "server": ("bench", 80),
+        "headers": [(b"authorization", f"Bearer {token}".encode())],
+    }
+
+    async def receive():
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        body = bytes(message.get("body", b""))
+        if b"event: unread" in body:
+            idle.set()
+        elif b"event: bench" in body:
+            delivered.set()
+
+    await app(scope, receive, send)
+
+
+async def run(connections: int) -> None:
+    disconnect = asyncio.Event()
+    idle = [asyncio.Event() for _ in range(connections)]
+    delivered = [asyncio.Event() for _ in range(connections)]
+    tokens = [create_access_token(data={"sub": f"user{i}@example.com"}) for i in range(connections)]
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    tasks = []
+    for start in range(0, connections, 500):
+        batch = range(start, min(start + 500, connections))
+        tasks += [asyncio.create_task(open_stream(tokens[i], disconnect, idle[i], delivered[i])) for i in batch]
+        await asyncio.gather(*[idle[i].wait() for i in batch])
+    print(f"opened {connections} streams in {time.perf_counter() - started:.1f} s")
+
+    tokens.clear()
+    await asyncio.sleep(0.5)
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    print(f"idle memory {used / 2**20:.1f} MiB, {used / connections / 1024:.1f} KiB per connection")
+
+    frame = format_event("bench", "{}")
+    started = time.perf_counter()
+    for user_id in hub.listening():
+        hub.publish(user_id, frame)
+    await asyncio.gather(*[event.wait() for event in delivered])
+    print(f"published to every stream in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    disconnect.set()
+    await asyncio.gather(*tasks)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=10_000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        db.execute(insert(User), [
+            {"email": f"user{i}@example.com", "name": f"user{i}", "hashed_password": "-", "role": "customer"}
+            for i in range(args.connections)
+        ])
+        db.commit()
+    finally:
+        db.close()
+    asyncio.run(run(args.connections))
+
+
+if __name__ == "__main__":
+    main()
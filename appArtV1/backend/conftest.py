@@ -0,0 +1,83 @@
+"""Shared fixtures for the backend tests.
+
+The app reads its settings when it is imported, so they are set here, once
+for the whole run: a temporary SQLite database, local storage in a temporary
+directory, 1 MiB uploads and one worker per process pool. Every test starts
+from empty tables, storage, caches and in-memory indexes.
+
+Run from the repository root: ``python -m pytest backend``
+"""
+import os
+import shutil
+import tempfile
+
+directory = tempfile.mkdtemp()
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{directory}/test.db",
+    "STORAGE_BACKEND": "local",
+    "STORAGE_ROOT": f"{directory}/media",
+    "MAX_UPLOAD_BYTES": str(1024 * 1024),
+    "IMAGE_WORKERS": "1",
+    "PASSWORD_WORKERS": "1",
+})
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.app.database import Base, engine, _sticky_until
+from backend.app.main import MEMORY_INDEXES, app, load_index
+from backend.app.utils import cache, notification_stream, search
+from backend.app.utils.storage import storage
+
+# Connection checks against a live MongoDB cluster, run by hand
+collect_ignore = ["test_mongo.py", "test_mongo_simple.py"]
+
+
+@pytest.fixture(autouse=True)
+def fresh_state():
+    with engine.begin() as connection:
+        for table in reversed(Base.metadata.sorted_tables):
+            connection.execute(table.delete())
+        connection.execute(search.user_search.delete())
+    shutil.rmtree(storage.root, ignore_errors=True)
+    for ttl_cache in cache._registry.values():
+        ttl_cache.invalidate()
+    _sticky_until.clear()
+    for index, _ in MEMORY_INDEXES.values():
+        load_index(index)
+    notification_stream.hub.counters.clear()
+    notification_stream._watermarks.clear()
+    notification_stream._published.clear()
+
+
+@pytest.fixture(scope="session")
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def register(client):
+    """Registers a user and returns their ``Authorization`` header."""
+    def register(email, role="customer", name=None, username=None):
+        response = client.post("/auth/register", json={
+            "email": email, "password": "secret", "name": name or email.split("@")[0],
+            "username": username, "role": role
+        })
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return register
+
+
+@pytest.fixture
+def artist_headers(client, register):
+    """Registers a verified artist (bio, profile picture and an artwork per
+    entry of ``style_tags``) and returns their ``Authorization`` header."""
+    def artist_headers(email, style_tags=(None, None, None), name=None, username=None):
+        headers = register(email, "artist", name, username)
+        client.put("/users/me", headers=headers, json={"bio": "Painter", "profile_picture_url": "https://example.com/me.jpg"})
+        for i, style in enumerate(style_tags):
+            client.post("/artworks/", headers=headers, json={
+                "title": f"{email} {i}", "description": None, "style_tags": style, "image_url": "https://example.com/w.jpg"
+            })
+        return headers
+    return artist_headers
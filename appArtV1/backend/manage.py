@@ -0,0 +1,113 @@
+"""Maintenance commands for the AppArt backend.
+
+Run from the repository root, e.g. ``python -m backend.manage rebuild-feed``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+
+from .app.database import SessionLocal, init_db
+from .app.utils import feed, images, near_duplicates, notifications, search, style_tags
+
+
+def rebuild_feed(args: argparse.Namespace) -> None:
+    """Repopulate the materialized artwork feed from artworks and users."""
+    db = SessionLocal()
+    try:
+        print(f"Rebuilt feed with {feed.rebuild_feed(db)} entries")
+    finally:
+        db.close()
+
+
+def rebuild_search_index(args: argparse.Namespace) -> None:
+    """Repopulate the full-text user search index from users."""
+    db = SessionLocal()
+    try:
+        print(f"Rebuilt user search index with {search.rebuild_index(db)} entries")
+    finally:
+        db.close()
+
+
+def rebuild_tags(args: argparse.Namespace) -> None:
+    """Repopulate the style-tag index from every artwork's style_tags string."""
+    db = SessionLocal()
+    try:
+        print(f"Rebuilt style-tag index with {style_tags.rebuild_tags(db)} entries")
+    finally:
+        db.close()
+
+
+def derive_images(args: argparse.Namespace) -> None:
+    """Render image derivatives for artworks and profile pictures that have none."""
+    db = SessionLocal()
+    try:
+        updated, failed = asyncio.run(images.backfill(db))
+        print(f"Derived images for {updated} rows ({failed} failed)")
+    finally:
+        db.close()
+        images.shutdown_pool()
+
+
+def rebuild_near_duplicates(args: argparse.Namespace) -> None:
+    """Recompute near-duplicate artwork pairs from every artwork's image hash."""
+    db = SessionLocal()
+    try:
+        print(f"Found {near_duplicates.rebuild_pairs(db)} near-duplicate pairs")
+    finally:
+        db.close()
+
+
+def recount_images(args: argparse.Namespace) -> None:
+    """Recompute image reference counts from artworks and profile pictures."""
+    db = SessionLocal()
+    try:
+        print(f"Recounted references for {images.recount(db)} images")
+    finally:
+        db.close()
+
+
+def purge_images(args: argparse.Namespace) -> None:
+    """Delete uploaded images whose lease ran out without anything using them."""
+    db = SessionLocal()
+    try:
+        keys = images.release_unused(db)
+        asyncio.run(images.purge(keys))
+        print(f"Deleted {len(keys)} unused image files")
+    finally:
+        db.close()
+
+
+def reconcile_unread(args: argparse.Namespace) -> None:
+    """Recompute every user's unread-notification counter from notifications."""
+    db = SessionLocal()
+    try:
+        print(f"Corrected unread counters for {notifications.reconcile_unread(db)} users")
+    finally:
+        db.close()
+
+
+COMMANDS = {
+    "derive-images": derive_images,
+    "purge-images": purge_images,
+    "rebuild-feed": rebuild_feed,
+    "rebuild-near-duplicates": rebuild_near_duplicates,
+    "rebuild-search-index": rebuild_search_index,
+    "rebuild-tags": rebuild_tags,
+    "reconcile-unread": reconcile_unread,
+    "recount-images": recount_images,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="AppArt backend maintenance commands")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args()
+
+    init_db()
+    COMMANDS[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
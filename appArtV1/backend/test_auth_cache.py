@@ -0,0 +1,68 @@
+"""Principal cache behaviour of get_current_user.
+
+Run from the repository root: ``python -m pytest backend/test_auth_cache.py``
+"""
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from backend.app.database import engine
+from backend.app.routers import auth
+from backend.app.utils.auth import create_access_token
+
+
+@contextmanager
+def count_user_lookups():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM users" in statement:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def test_profile_update_invalidates_the_cached_snapshot(client, register):
+    headers = register("snapshot@example.com", name="Before")
+    assert client.get("/users/me", headers=headers).json()["name"] == "Before"
+
+    client.put("/users/me", headers=headers, json={"name": "After"})
+
+    with count_user_lookups() as lookups:
+        assert client.get("/users/me", headers=headers).json()["name"] == "After"
+        assert client.get("/users/me", headers=headers).json()["name"] == "After"
+    assert len(lookups) == 1  # reloaded once, then served from the cache
+
+
+def test_unknown_user_is_not_cached(client, register):
+    token = create_access_token(data={"sub": "later@example.com"})
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/users/me", headers=headers).status_code == 401
+
+    register("later@example.com", name="Before")
+    assert client.get("/users/me", headers=headers).status_code == 200
+
+
+def test_zero_ttl_reads_the_user_from_the_database(client, register, monkeypatch):
+    headers = register("uncached@example.com", name="Before")
+    monkeypatch.setattr(auth, "AUTH_USER_CACHE_TTL", 0)
+
+    with count_user_lookups() as lookups:
+        for _ in range(3):
+            assert client.get("/users/me", headers=headers).status_code == 200
+    assert len(lookups) == 3
+
+
+def test_users_cannot_make_themselves_admin(client, register):
+    headers = register("climber@example.com", name="Before")
+    response = client.put("/users/me", headers=headers, json={"role": "admin"})
+    assert response.status_code == 403
+
+    assert client.get("/users/me", headers=headers).json()["role"] == "customer"
+    assert client.get("/cache-stats", headers=headers).status_code == 403
+    # Switching between customer and artist is still allowed
+    assert client.put("/users/me", headers=headers, json={"role": "artist"}).json()["role"] == "artist"
@@ -0,0 +1,68 @@
+"""In-memory autocomplete index and the /users/autocomplete endpoint.
+
+Run from the repository root: ``python -m pytest backend/test_autocomplete.py``
+"""
+from types import SimpleNamespace
+
+from sqlalchemy import event
+
+from backend.app.database import engine
+from backend.app.utils.autocomplete import PrefixIndex
+
+
+def user(user_id, name, username=None, role="customer", verified=False):
+    return SimpleNamespace(id=user_id, name=name, username=username, role=role, is_artist_verified=verified)
+
+
+def ids(suggestions):
+    return [suggestion.id for suggestion in suggestions]
+
+
+def test_prefix_lookup_folds_case_and_accents_and_matches_later_words():
+    index = PrefixIndex()
+    index.upsert(user(1, "Zoë Abara", "zoe_paints"))
+    index.upsert(user(2, "Abel Zamora", "abelz"))
+    index.upsert(user(3, "Zora", None))
+
+    assert ids(index.complete("ZO")) == [1, 3]
+    assert ids(index.complete("ab")) == [1, 2]
+    assert ids(index.complete("zoe a")) == [1]
+    assert ids(index.complete("ab", exclude_id=1)) == [2]
+    assert index.complete("  ") == []
+
+
+def test_updates_replace_old_keys_and_flags():
+    index = PrefixIndex()
+    index.upsert(user(1, "Mira Old", "mira"))
+    index.upsert(user(1, "Mira New", "mira", role="artist"))
+    index.upsert(user(2, "Mira Other", None, role="artist"))
+    index.set_verified(1, True)
+
+    assert ids(index.complete("old")) == []
+    assert ids(index.complete("new")) == [1]
+    assert ids(index.complete("mira", role="artist")) == [1, 2]
+    assert ids(index.complete("mira", eligible_only=True)) == [1]
+    assert ids(index.complete("mira", limit=1)) == [1]
+    assert index.stats()["users"] == 2
+
+
+def test_endpoint_tracks_writes_without_querying(client, register, artist_headers):
+    searcher = register("searcher@example.com", name="Searcher")
+    artist = artist_headers("artist@example.com", name="Quill Artist", username="quill")
+    client.put("/users/me", headers=artist, json={"name": "Quill Renamed"})
+    client.get("/users/autocomplete", params={"q": "warm"}, headers=searcher)
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        response = client.get("/users/autocomplete", params={"q": "qu", "eligible_only": True}, headers=searcher)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert response.status_code == 200, response.text
+    assert response.json() == [{
+        "id": response.json()[0]["id"], "username": "quill", "name": "Quill Renamed",
+        "role": "artist", "is_artist_verified": True,
+    }]
+    assert statements == []
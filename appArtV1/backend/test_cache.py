@@ -0,0 +1,91 @@
+"""Unit tests for the in-process TTL/LRU cache.
+
+Run from the repository root: ``python -m pytest backend/test_cache.py``
+"""
+import threading
+import time
+
+from backend.app.utils import cache as cache_module
+from backend.app.utils.cache import TTLCache
+
+
+def test_concurrent_misses_run_the_loader_once():
+    cache = TTLCache("test_single_flight", maxsize=8, ttl=30)
+    calls = []
+    release = threading.Event()
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return "page"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_load(("feed",), loader)))
+        for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    while cache.stats()["misses"] < 10:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert results == ["page"] * 10
+    assert cache.stats()["coalesced"] == 9
+    assert cache.get_or_load(("feed",), lambda: "reloaded") == "page"
+
+
+def test_invalidation_during_load_does_not_store_the_result():
+    cache = TTLCache("test_invalidate_in_flight", maxsize=8, ttl=30)
+
+    def loader():
+        cache.invalidate("feed")
+        return "stale"
+
+    assert cache.get_or_load(("feed", None), loader) == "stale"
+    assert cache.stats()["size"] == 0
+    assert cache.get_or_load(("feed", None), lambda: "fresh") == "fresh"
+
+
+def test_invalidate_drops_only_the_matching_prefix():
+    cache = TTLCache("test_invalidate_prefix", maxsize=8, ttl=30)
+    cache.get_or_load(("artist", 1, None), lambda: "one")
+    cache.get_or_load(("artist", 2, None), lambda: "two")
+
+    assert cache.invalidate("artist", 1) == 1
+    assert cache.get_or_load(("artist", 2, None), lambda: "reloaded") == "two"
+
+
+def test_none_results_are_not_cached():
+    cache = TTLCache("test_negative", maxsize=8, ttl=30)
+
+    assert cache.get_or_load(("user", "new@example.com"), lambda: None) is None
+    assert cache.stats()["size"] == 0
+    assert cache.get_or_load(("user", "new@example.com"), lambda: "found") == "found"
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = TTLCache("test_ttl", maxsize=8, ttl=30)
+
+    assert cache.get_or_load(("feed",), lambda: "first") == "first"
+    now[0] += 29
+    assert cache.get_or_load(("feed",), lambda: "second") == "first"
+    now[0] += 2
+    assert cache.get_or_load(("feed",), lambda: "second") == "second"
+
+
+def test_maxsize_evicts_least_recently_used():
+    cache = TTLCache("test_lru", maxsize=2, ttl=30)
+    cache.get_or_load(("a",), lambda: "a")
+    cache.get_or_load(("b",), lambda: "b")
+    cache.get_or_load(("a",), lambda: "unused")  # touch "a" so "b" is oldest
+    cache.get_or_load(("c",), lambda: "c")
+
+    assert cache.stats()["evictions"] == 1
+    assert cache.get_or_load(("a",), lambda: "reloaded") == "a"
+    assert cache.get_or_load(("b",), lambda: "reloaded") == "reloaded"
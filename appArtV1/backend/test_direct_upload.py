@@ -0,0 +1,156 @@
+"""Presigned direct-to-storage uploads: /artworks/upload-url and
+/artworks/uploads/complete against an in-memory S3 client.
+
+The fake client signs POST policies with a real botocore client, so the
+credentials are what S3 (or an emulator such as MinIO) would accept.
+
+Run from the repository root: ``python -m pytest backend/test_direct_upload.py``
+"""
+import base64
+import hashlib
+import io
+import json
+
+import boto3
+import numpy as np
+import pytest
+from botocore.exceptions import ClientError
+from PIL import Image
+
+from backend.app.utils import images
+from backend.app.utils.storage import S3Storage
+
+
+class FakeS3Client:
+    """The S3 calls direct uploads make, over a dict of objects."""
+
+    def __init__(self):
+        self.objects = {}
+        self.signer = boto3.client(
+            "s3", aws_access_key_id="test", aws_secret_access_key="test",
+            region_name="us-east-1", endpoint_url="http://localhost:9000"
+        )
+
+    def generate_presigned_post(self, **kwargs):
+        return self.signer.generate_presigned_post(**kwargs)
+
+    def put_object(self, Bucket, Key, Body, ContentType, ACL):
+        self.objects[Key] = Body
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+        return {"ContentLength": len(self.objects[Key])}
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def copy_object(self, Bucket, Key, CopySource, ACL):
+        self.objects[Key] = self.objects[CopySource["Key"]]
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    fake = FakeS3Client()
+    monkeypatch.setattr(images, "storage", S3Storage(fake, "bucket", "us-east-1"))
+    return fake
+
+
+def png_of(image):
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def png(size=(800, 600)):
+    return png_of(Image.new("RGB", size, (30, 120, 200)))
+
+
+def complete(client, headers, key, title="Direct"):
+    return client.post("/artworks/uploads/complete", headers=headers, json={
+        "key": key, "title": title, "description": None, "style_tags": "ink"
+    })
+
+
+def test_upload_url_is_a_policy_scoped_to_one_key(s3, client, register):
+    artist = register("signer@example.com", "artist")
+
+    response = client.post("/artworks/upload-url", headers=artist, json={"content_type": "image/png"})
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["key"].startswith("artworks/1/") and body["key"].endswith(".png")
+    assert body["url"] == "http://localhost:9000/bucket"
+    assert body["fields"]["key"] == body["key"] and body["fields"]["Content-Type"] == "image/png"
+    policy = json.loads(base64.b64decode(body["fields"]["policy"]))
+    assert ["content-length-range", 1, 1024 * 1024] in policy["conditions"]
+    assert {"key": body["key"]} in policy["conditions"]
+
+    customer = register("signer-customer@example.com", "customer")
+    assert client.post("/artworks/upload-url", headers=customer, json={"content_type": "image/png"}).status_code == 403
+    assert client.post("/artworks/upload-url", headers=artist, json={"content_type": "text/html"}).status_code == 415
+
+
+def test_completion_verifies_the_object_before_creating_the_artwork(s3, client, register):
+    artist = register("direct@example.com", "artist")
+    key = client.post("/artworks/upload-url", headers=artist, json={"content_type": "image/png"}).json()["key"]
+
+    assert complete(client, artist, key).status_code == 404
+
+    s3.objects[key] = png()  # what the client's POST to S3 does
+    response = complete(client, artist, key)
+
+    assert response.status_code == 200, response.text
+    artwork = response.json()
+    blob = images.blob_key(hashlib.sha256(png()).hexdigest(), "png")
+    assert artwork["image_url"] == f"https://bucket.s3.us-east-1.amazonaws.com/{blob}"
+    assert artwork["variants"]["w640"].endswith(blob.replace(".png", "_w640.jpg"))
+    assert blob.replace(".png", "_w320.webp") in s3.objects
+    # The object moved to its content-addressed key
+    assert key not in s3.objects and complete(client, artist, key).status_code == 404
+    assert [a["title"] for a in client.get(f"/artworks/artist/{artwork['artist_id']}").json()] == ["Direct"]
+
+
+def test_refused_completion_leaves_no_files_behind(s3, client, register):
+    blocks = np.random.default_rng(7).integers(0, 256, (24, 32, 3), dtype=np.uint8)
+    original = Image.fromarray(blocks).resize((640, 480), Image.NEAREST)
+    first = register("original@example.com", "artist")
+    key = client.post("/artworks/upload-url", headers=first, json={"content_type": "image/png"}).json()["key"]
+    s3.objects[key] = png_of(original)
+    assert complete(client, first, key).status_code == 200
+    stored = set(s3.objects)
+
+    # Another artist re-posts it, downscaled and recompressed
+    copier = register("copier@example.com", "artist")
+    key = client.post("/artworks/upload-url", headers=copier, json={"content_type": "image/jpeg"}).json()["key"]
+    buffer = io.BytesIO()
+    original.resize((500, 375), Image.BILINEAR).save(buffer, "JPEG", quality=70)
+    s3.objects[key] = buffer.getvalue()
+
+    assert complete(client, copier, key).status_code == 409
+    assert set(s3.objects) == stored
+
+
+def test_completion_rejects_foreign_keys_and_bad_objects(s3, client, register):
+    owner = register("owner@example.com", "artist")
+    other = register("other@example.com", "artist")
+    key = client.post("/artworks/upload-url", headers=owner, json={"content_type": "image/png"}).json()["key"]
+    s3.objects[key] = b"not an image"
+
+    assert complete(client, other, key).status_code == 403
+    assert complete(client, owner, "artworks/../secrets.png").status_code == 403
+    assert complete(client, owner, key).status_code == 400
+    assert key not in s3.objects
+
+    s3.objects[key] = b"x" * (1024 * 1024 + 1)
+    assert complete(client, owner, key).status_code == 413
+    assert key not in s3.objects
+
+
+def test_local_backend_has_no_direct_uploads(client, register):
+    artist = register("local@example.com", "artist")
+    response = client.post("/artworks/upload-url", headers=artist, json={"content_type": "image/png"})
+    assert response.status_code == 501
@@ -0,0 +1,75 @@
+"""Personalized feed ranking: scoring, ranked paging and the unranked fallback.
+
+Run from the repository root: ``python -m pytest backend/test_feed_ranking.py``
+"""
+import numpy as np
+
+from backend.app.utils import ranking
+
+
+def titles(response):
+    assert response.status_code == 200, response.text
+    return [artwork["title"] for artwork in response.json()]
+
+
+def test_top_page_matches_a_full_sort():
+    rng = np.random.default_rng(7)
+    scores = rng.integers(0, 20, 500).astype(float)
+    ids = rng.permutation(500)
+    expected = sorted(range(500), key=lambda row: (-scores[row], -ids[row]))
+
+    seen, after = [], None
+    while True:
+        rows = list(ranking.top_page(scores, ids, after, 40))
+        seen.extend(rows[:40])
+        if len(rows) <= 40:
+            break
+        after = (scores[rows[39]], ids[rows[39]])
+    assert seen == expected
+
+
+def test_score_combines_recency_affinity_and_quality():
+    candidates = ranking.Candidates(
+        ids=[1, 2, 3], created=[1000.0, 1000.0, 1000.0 - 3600 * ranking.HALF_LIFE_HOURS],
+        quality=[0.0, 1.0, 0.0], tag_rows=[0, 0, 2], tag_ids=[0, 1, 0], vocabulary={"ink": 0, "oil": 1},
+    )
+    vector = candidates.profile_vector({"ink": 2.0, "clay": 5.0})
+    scores = ranking.score(candidates, vector, as_of=1000.0)
+
+    expected = [
+        ranking.W_RECENCY + ranking.W_AFFINITY / np.sqrt(2),
+        ranking.W_RECENCY + ranking.W_QUALITY,
+        ranking.W_RECENCY / 2 + ranking.W_AFFINITY,
+    ]
+    assert np.allclose(scores, expected)
+    assert candidates.profile_vector({"clay": 1.0}) is None
+
+
+def test_for_you_ranks_by_affinity_and_falls_back_without_profile(client, register, artist_headers):
+    artist_headers("oils@example.com", ["oil"] * 3)
+    artist_headers("inks@example.com", ["ink, portrait"] * 3)
+    artist_headers("clay@example.com", ["clay"] * 3)
+    customer = register("fan@example.com", "customer")
+    newcomer = register("new@example.com", "customer")
+    client.post("/requests/", headers=customer, json={
+        "title": "Portrait", "description": "In ink", "dimensions_width": None, "dimensions_height": None,
+        "style": "Ink", "deadline": None, "reference_images": [],
+    })
+    ranking.candidates_cache.invalidate()
+
+    ranked = titles(client.get("/artworks/feed/for-you", headers=customer))
+    assert ranked[:3] == ["inks@example.com 2", "inks@example.com 1", "inks@example.com 0"]
+    assert len(ranked) == 9
+
+    unranked = titles(client.get("/artworks/feed/for-you", headers=newcomer))
+    assert unranked == titles(client.get("/artworks/feed"))
+
+    seen, params = [], {"limit": 4}
+    while True:
+        response = client.get("/artworks/feed/for-you", params=params, headers=customer)
+        seen.extend(titles(response))
+        if "X-Next-Cursor" not in response.headers:
+            break
+        assert ranking.is_ranked_cursor(response.headers["X-Next-Cursor"])
+        params["cursor"] = response.headers["X-Next-Cursor"]
+    assert seen == ranked
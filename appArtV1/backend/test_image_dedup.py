@@ -0,0 +1,177 @@
+"""Content-addressed image storage: identical uploads share one blob, a
+known X-Content-SHA256 skips the transfer, and blobs are deleted with their
+last reference once no upload lease protects them.
+
+Run from the repository root: ``python -m pytest backend/test_image_dedup.py``
+"""
+import asyncio
+import hashlib
+import io
+import os
+from datetime import datetime, timedelta
+
+from PIL import Image
+
+from backend.app.database import SessionLocal
+from backend.app.models import ImageAsset
+from backend.app.utils import images
+from backend.app.utils.storage import storage
+
+
+def png(color, size=(700, 400)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def upload(client, headers, data, path="/artworks/images", **extra):
+    return client.post(path, headers={**headers, "Content-Type": "image/png", **extra}, content=data)
+
+
+def create_artwork(client, headers, image_url):
+    response = client.post("/artworks/", headers=headers, json={
+        "title": "Shared", "description": None, "style_tags": None, "image_url": image_url
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def stored_files():
+    return sorted(name for _, _, files in os.walk(storage.root) for name in files)
+
+
+def ref_count(url):
+    db = SessionLocal()
+    try:
+        return db.query(ImageAsset.ref_count).filter(ImageAsset.url == url).scalar()
+    finally:
+        db.close()
+
+
+def expire_leases():
+    db = SessionLocal()
+    try:
+        db.query(ImageAsset).update({"leased_until": datetime.utcnow() - timedelta(seconds=1)})
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_identical_uploads_share_one_content_addressed_blob(client, register):
+    first, second = register("first@example.com", "artist"), register("second@example.com", "artist")
+    data = png((10, 20, 30))
+
+    one = upload(client, first, data).json()
+    before = stored_files()
+    two = upload(client, second, data).json()
+
+    sha256 = hashlib.sha256(data).hexdigest()
+    assert one["image_url"] == two["image_url"] == f"/media/{images.blob_key(sha256, 'png')}"
+    assert one["variants"] == two["variants"]
+    assert stored_files() == before
+
+
+def test_known_hash_skips_the_transfer_and_wrong_hashes_are_rejected(client, register):
+    artist = register("hasher@example.com", "artist")
+    data = png((40, 50, 60))
+    sha256 = hashlib.sha256(data).hexdigest()
+    stored = upload(client, artist, data, **{"X-Content-SHA256": sha256}).json()
+
+    retried = upload(client, artist, b"", **{"X-Content-SHA256": sha256})
+    assert retried.status_code == 200 and retried.json()["image_url"] == stored["image_url"]
+
+    # Another user has to send the bytes; knowing their hash is not enough
+    other = register("hash-guesser@example.com", "artist")
+    guessed = upload(client, other, b"", **{"X-Content-SHA256": sha256})
+    assert guessed.status_code == 400 and "image_url" not in guessed.json()
+    assert upload(client, other, data, **{"X-Content-SHA256": sha256}).json()["image_url"] == stored["image_url"]
+
+    before = stored_files()
+    wrong = upload(client, artist, png((70, 80, 90)), **{"X-Content-SHA256": "0" * 64})
+    assert wrong.status_code == 400
+    assert stored_files() == before
+
+
+def test_blob_is_deleted_with_its_last_reference(client, register):
+    artist = register("owner@example.com", "artist")
+    url = upload(client, artist, png((100, 110, 120))).json()["image_url"]
+    blob_files = [name for name in stored_files() if url.rsplit("/", 1)[1].split(".")[0] in name]
+    assert len(blob_files) == 5  # the original and two widths in two formats
+    assert ref_count(url) == 0
+
+    first = create_artwork(client, artist, url)
+    second = create_artwork(client, artist, url)
+    assert ref_count(url) == 2
+    expire_leases()
+
+    assert client.delete(f"/artworks/{first}", headers=artist).status_code == 200
+    assert ref_count(url) == 1 and set(blob_files) <= set(stored_files())
+
+    assert client.delete(f"/artworks/{second}", headers=artist).status_code == 200
+    assert ref_count(url) is None
+    assert not set(blob_files) & set(stored_files())
+
+
+def test_profile_picture_change_releases_the_previous_picture(client, register):
+    user = register("portrait@example.com", "customer")
+    old = upload(client, user, png((130, 140, 150)), "/users/me/images").json()["image_url"]
+    new = upload(client, user, png((160, 170, 180)), "/users/me/images").json()["image_url"]
+
+    client.put("/users/me", headers=user, json={"profile_picture_url": old})
+    assert ref_count(old) == 1
+    expire_leases()
+    client.put("/users/me", headers=user, json={"profile_picture_url": new})
+
+    assert ref_count(old) is None and ref_count(new) == 1
+    assert client.get(old).status_code == 404
+
+
+def test_leased_upload_survives_its_other_users(client, register):
+    artist = register("racer@example.com", "artist")
+    data = png((1, 2, 3))
+    url = upload(client, artist, data).json()["image_url"]
+    first = create_artwork(client, artist, url)
+    expire_leases()
+
+    # The same bytes again: the existing URL comes back, leased to the uploader
+    assert upload(client, artist, data).json()["image_url"] == url
+    assert client.delete(f"/artworks/{first}", headers=artist).status_code == 200
+    assert ref_count(url) == 0 and client.get(url).status_code == 200
+
+    create_artwork(client, artist, url)
+    assert ref_count(url) == 1 and client.get(url).status_code == 200
+
+
+def test_unused_uploads_are_purged_after_their_lease(client, register):
+    artist = register("abandoner@example.com", "artist")
+    url = upload(client, artist, png((4, 5, 6))).json()["image_url"]
+    key = images.storage.key_for_url(url)
+    db = SessionLocal()
+    try:
+        assert key not in images.release_unused(db)
+        expire_leases()
+        released = images.release_unused(db)
+        assert key in released
+        asyncio.run(images.purge(released))
+    finally:
+        db.close()
+
+    assert ref_count(url) is None and client.get(url).status_code == 404
+    response = client.post("/artworks/", headers=artist, json={
+        "title": "Gone", "description": None, "style_tags": None, "image_url": url
+    })
+    assert response.status_code == 400
+
+
+def test_recount_restores_counts_from_references(client, register):
+    artist = register("recount@example.com", "artist")
+    url = upload(client, artist, png((190, 200, 210))).json()["image_url"]
+    create_artwork(client, artist, url)
+    db = SessionLocal()
+    try:
+        db.query(ImageAsset).update({"ref_count": 0})
+        db.commit()
+        images.recount(db)
+    finally:
+        db.close()
+    assert ref_count(url) == 1
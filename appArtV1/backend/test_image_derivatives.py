@@ -0,0 +1,141 @@
+"""Image derivatives: resized and WebP copies plus a blur placeholder for
+uploaded artworks and profile pictures, rendered in the process pool.
+
+Run from the repository root: ``python -m pytest backend/test_image_derivatives.py``
+"""
+import asyncio
+import io
+import os
+
+from PIL import Image
+
+from backend.app.database import SessionLocal
+from backend.app.models import Artwork
+from backend.app.utils import images
+from backend.app.utils.storage import storage
+
+
+def encoded(size, mode="RGB", fmt="PNG"):
+    buffer = io.BytesIO()
+    Image.new(mode, size, (200, 40, 90, 128)[:len(mode)]).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def create_artwork(client, headers, title, image_url, style_tags=None):
+    return client.post("/artworks/", headers=headers, json={
+        "title": title, "description": None, "style_tags": style_tags, "image_url": image_url
+    })
+
+
+def media_files():
+    return sorted(name for _, _, files in os.walk(storage.root) for name in files)
+
+
+def test_render_skips_widths_above_the_original():
+    rendered, placeholder, image_hash = images.render_derivatives(encoded((700, 350)))
+    assert sorted(rendered) == ["w320", "w320_webp", "w640", "w640_webp"]
+    assert Image.open(io.BytesIO(rendered["w640"][0])).size == (640, 320)
+    assert rendered["w320"][1] == "jpg" and rendered["w320_webp"][1] == "webp"
+    assert placeholder.startswith("data:image/jpeg;base64,")
+    assert image_hash is None  # a single colour has nothing to fingerprint
+
+    rendered, _, _ = images.render_derivatives(encoded((100, 100), mode="RGBA"))
+    assert sorted(rendered) == ["w100", "w100_webp"]
+    assert rendered["w100"][1] == "png"
+
+
+def test_artwork_upload_stores_variants_and_copies_them_to_the_artwork(client, register):
+    artist = register("deriver@example.com", "artist")
+
+    response = client.post("/artworks/images", headers={**artist, "Content-Type": "image/jpeg"},
+                           content=encoded((1200, 800), fmt="JPEG"))
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    variants = body["variants"]
+    assert set(variants) == {"w320", "w320_webp", "w640", "w640_webp", "w1080", "w1080_webp", "placeholder"}
+    stem = body["image_url"].rsplit(".", 1)[0]
+    assert variants["w640"] == f"{stem}_w640.jpg" and variants["w640_webp"] == f"{stem}_w640.webp"
+    served = client.get(variants["w1080_webp"])
+    assert served.status_code == 200
+    assert Image.open(io.BytesIO(served.content)).size == (1080, 720)
+
+    # A complete profile and three artworks put the artist in the feed
+    client.put("/users/me", headers=artist, json={"bio": "Printmaker", "profile_picture_url": "https://example.com/me.jpg"})
+    for title in ("First", "Second"):
+        create_artwork(client, artist, title, "https://example.com/a.jpg")
+    created = create_artwork(client, artist, "Derived", body["image_url"], "ink")
+    assert created.status_code == 200, created.text
+    assert created.json()["variants"] == variants
+    feed = client.get("/artworks/feed").json()
+    assert [item["variants"] for item in feed if item["id"] == created.json()["id"]] == [variants]
+
+
+def test_unreadable_upload_is_rejected_and_removed(client, register):
+    artist = register("garbage@example.com", "artist")
+    before = media_files()
+
+    response = client.post("/artworks/images", headers={**artist, "Content-Type": "image/png"},
+                           content=b"definitely not a png" * 100)
+
+    assert response.status_code == 400
+    assert media_files() == before
+
+
+def test_uploads_recover_after_an_image_worker_dies(client, register):
+    artist = register("crashed@example.com", "artist")
+    first = client.post("/artworks/images", headers={**artist, "Content-Type": "image/png"},
+                        content=encoded((400, 300)))
+    assert first.status_code == 200, first.text
+    for process in list(images._pool._executor._processes.values()):
+        process.kill()
+        process.join()
+
+    second = client.post("/artworks/images", headers={**artist, "Content-Type": "image/png"},
+                         content=encoded((300, 400)))
+    assert second.status_code == 200, second.text
+    assert second.json()["variants"]["w300"].endswith(".jpg")
+
+
+def test_profile_picture_upload_sets_user_variants(client, register):
+    user = register("portrait@example.com", "customer")
+    upload = client.post("/users/me/images", headers={**user, "Content-Type": "image/png"},
+                         content=encoded((500, 500)))
+    assert upload.status_code == 200, upload.text
+    assert upload.json()["image_url"].startswith("/media/images/")
+
+    updated = client.put("/users/me", headers=user, json={"profile_picture_url": upload.json()["image_url"]})
+
+    assert updated.status_code == 200, updated.text
+    assert updated.json()["profile_picture_variants"] == upload.json()["variants"]
+
+
+def test_backfill_derives_variants_for_existing_images(client, register, monkeypatch):
+    def offline(url, timeout):
+        raise OSError(f"no network in tests: {url}")
+    monkeypatch.setattr(images.urllib.request, "urlopen", offline)
+    artist = register("legacy@example.com", "artist")
+    upload = client.post("/artworks/images", headers={**artist, "Content-Type": "image/png"},
+                         content=encoded((400, 300))).json()
+    artwork_id = create_artwork(client, artist, "Legacy", upload["image_url"]).json()["id"]
+    db = SessionLocal()
+    try:
+        # Rows from before uploads were recorded can point at missing files;
+        # the API itself refuses such URLs
+        broken = Artwork(artist_id=db.get(Artwork, artwork_id).artist_id, title="Broken",
+                         image_url="/media/missing/file.png")
+        db.add(broken)
+        db.commit()
+        broken_id = broken.id
+        db.query(Artwork).filter(Artwork.id == artwork_id).update({"variants": None})
+        db.commit()
+
+        updated, failed = asyncio.run(images.backfill(db))
+
+        # The missing file and the example.com URLs of earlier tests fail and
+        # are left without variants
+        assert updated >= 1 and failed >= 1
+        assert db.get(Artwork, artwork_id).variants == upload["variants"]
+        assert db.get(Artwork, broken_id).variants is None
+    finally:
+        db.close()
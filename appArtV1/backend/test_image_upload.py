@@ -0,0 +1,150 @@
+"""Streaming image uploads: the /artworks/images endpoint on the local backend
+and S3 multipart uploads against an in-memory S3 client.
+
+Run from the repository root: ``python -m pytest backend/test_image_upload.py``
+"""
+import asyncio
+import io
+import os
+import tempfile
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from backend.app.utils import images
+from backend.app.utils.storage import MIN_PART_SIZE, S3Storage, UploadTooLarge, storage
+
+
+def chunked(data, size=64 * 1024):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def test_upload_streams_to_local_storage_and_is_served(client, register):
+    artist = register("uploader@example.com", "artist")
+    # Random pixels keep the PNG large enough to arrive in several chunks
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (400, 300), os.urandom(400 * 300 * 3)).save(buffer, "PNG")
+    image = buffer.getvalue()
+
+    response = client.post("/artworks/images", headers={**artist, "Content-Type": "image/png"}, content=chunked(image))
+
+    assert response.status_code == 200, response.text
+    image_url = response.json()["image_url"]
+    assert image_url.startswith("/media/images/") and image_url.endswith(".png")
+    assert client.get(image_url).content == image
+    assert not [name for _, _, files in os.walk(storage.root) for name in files if name.endswith(".part")]
+
+
+def test_upload_is_rendered_from_a_spool_not_read_back(client, register, monkeypatch):
+    artist = register("spooler@example.com", "artist")
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (300, 200), os.urandom(300 * 200 * 3)).save(buffer, "PNG")
+    monkeypatch.setattr(images, "SPOOL_MEMORY_BYTES", 16 * 1024)
+    spooled = []
+    named_temporary_file = tempfile.NamedTemporaryFile
+
+    def spool_file(**kwargs):
+        spooled.append(named_temporary_file(**kwargs))
+        return spooled[-1]
+    monkeypatch.setattr(images.tempfile, "NamedTemporaryFile", spool_file)
+
+    async def no_get_bytes(key):
+        raise AssertionError("the upload was read back from storage")
+    monkeypatch.setattr(images.storage, "get_bytes", no_get_bytes)
+
+    response = client.post("/artworks/images", headers={**artist, "Content-Type": "image/png"},
+                           content=chunked(buffer.getvalue()))
+
+    assert response.status_code == 200, response.text
+    assert "w300" in response.json()["variants"]
+    # Past the in-memory limit the spool moved to a file, removed afterwards
+    assert len(spooled) == 1 and not os.path.exists(spooled[0].name)
+
+
+def test_upload_rejects_bad_requests(client, register):
+    artist = register("rejects@example.com", "artist")
+    customer = register("customer@example.com", "customer")
+    upload = lambda headers, body: client.post("/artworks/images", headers=headers, content=body).status_code
+
+    assert upload({**customer, "Content-Type": "image/png"}, b"x") == 403
+    assert upload({**artist, "Content-Type": "text/plain"}, b"x") == 415
+    assert upload({**artist, "Content-Type": "image/jpeg"}, chunked(b"x" * (2 * 1024 * 1024))) == 413
+
+
+class FakeS3Client:
+    """Just enough of boto3's S3 client to exercise multipart uploads."""
+
+    def __init__(self, fail_part=None):
+        self.objects = {}
+        self.parts = {}
+        self.aborted = []
+        self.fail_part = fail_part
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, ContentType, ACL):
+        self.objects[Key] = Body
+
+    def create_multipart_upload(self, Bucket, Key, ContentType, ACL):
+        self.parts[Key] = {}
+        return {"UploadId": f"upload-{Key}"}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(0.02)
+            if PartNumber == self.fail_part:
+                raise RuntimeError("part failed")
+            self.parts[Key][PartNumber] = Body
+            return {"ETag": f"etag-{PartNumber}"}
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+        assert numbers == sorted(self.parts[Key])
+        self.objects[Key] = b"".join(self.parts[Key][n] for n in numbers)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborted.append(Key)
+
+
+async def stream(data):
+    for chunk in chunked(data):
+        yield chunk
+
+
+def test_s3_multipart_upload_runs_parts_in_parallel_within_the_bound():
+    s3 = FakeS3Client()
+    storage = S3Storage(s3, "bucket", "us-east-1", part_size=MIN_PART_SIZE, concurrency=2)
+    data = os.urandom(4 * MIN_PART_SIZE + 1234)
+
+    url = asyncio.run(storage.put_stream("big.jpg", stream(data), "image/jpeg", max_bytes=len(data)))
+
+    assert url == "https://bucket.s3.us-east-1.amazonaws.com/big.jpg"
+    assert s3.objects["big.jpg"] == data
+    assert len(s3.parts["big.jpg"]) == 5
+    assert s3.max_active == 2
+
+
+def test_s3_small_body_is_one_put_and_failures_abort():
+    s3 = FakeS3Client(fail_part=2)
+    storage = S3Storage(s3, "bucket", "us-east-1", part_size=MIN_PART_SIZE, concurrency=2)
+
+    asyncio.run(storage.put_stream("small.jpg", stream(b"tiny"), "image/jpeg"))
+    assert s3.objects["small.jpg"] == b"tiny" and "small.jpg" not in s3.parts
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(storage.put_stream("broken.jpg", stream(os.urandom(3 * MIN_PART_SIZE)), "image/jpeg",
+                                       max_bytes=3 * MIN_PART_SIZE))
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(storage.put_stream("huge.jpg", stream(os.urandom(2 * MIN_PART_SIZE)), "image/jpeg",
+                                       max_bytes=MIN_PART_SIZE + 1))
+    assert s3.aborted == ["broken.jpg", "huge.jpg"] and "broken.jpg" not in s3.objects
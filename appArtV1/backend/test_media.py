@@ -0,0 +1,124 @@
+"""Local media serving: ETags, immutable caching, conditional requests and
+byte ranges, plus the zero-copy and memory-mapped body paths.
+
+Run from the repository root: ``python -m pytest backend/test_media.py``
+"""
+import asyncio
+
+import pytest
+
+from backend.app.routers import media
+from backend.app.utils.storage import storage
+
+DATA = bytes(range(256)) * 40
+URL = storage.url_for("images/ab/sample.jpg")
+
+
+@pytest.fixture(autouse=True)
+def sample():
+    asyncio.run(storage.put_bytes("images/ab/sample.jpg", DATA, "image/jpeg"))
+
+
+def test_full_response_is_cacheable(client):
+    response = client.get(URL)
+    assert response.status_code == 200
+    assert response.content == DATA
+    assert response.headers["content-type"] == "image/jpeg"
+    assert response.headers["content-length"] == str(len(DATA))
+    assert response.headers["accept-ranges"] == "bytes"
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["etag"].startswith('"')
+
+
+def test_head_has_headers_but_no_body(client):
+    response = client.head(URL)
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(len(DATA))
+    assert response.content == b""
+
+
+def test_if_none_match_returns_not_modified(client):
+    etag = client.get(URL).headers["etag"]
+    response = client.get(URL, headers={"If-None-Match": f'"other", {etag}'})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert client.get(URL, headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_byte_ranges(client):
+    response = client.get(URL, headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == DATA[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(DATA)}"
+
+    response = client.get(URL, headers={"Range": "bytes=-10"})
+    assert response.status_code == 206
+    assert response.content == DATA[-10:]
+
+    response = client.get(URL, headers={"Range": f"bytes={len(DATA) - 5}-"})
+    assert response.content == DATA[-5:]
+
+    response = client.get(URL, headers={"Range": f"bytes={len(DATA)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(DATA)}"
+
+    # Multiple ranges are not supported, so the whole file is sent
+    response = client.get(URL, headers={"Range": "bytes=0-1,5-6"})
+    assert response.status_code == 200
+    assert response.content == DATA
+
+
+def test_if_range_mismatch_sends_whole_file(client):
+    response = client.get(URL, headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == DATA
+
+    etag = client.get(URL).headers["etag"]
+    response = client.get(URL, headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert response.status_code == 206
+    assert response.content == DATA[:10]
+
+
+def test_missing_partial_and_escaping_paths_are_not_found(client):
+    asyncio.run(storage.put_bytes("images/ab/upload.jpg.part", b"partial", "image/jpeg"))
+    assert client.get(URL.replace("sample.jpg", "missing.jpg")).status_code == 404
+    assert client.get(URL.replace("sample.jpg", "upload.jpg.part")).status_code == 404
+    assert client.get(URL.replace("sample.jpg", "..%2F..%2F..%2Ftest.db")).status_code == 404
+    assert client.get(URL.replace("images/ab/sample.jpg", "images")).status_code == 404
+
+
+def run_response(extensions, chunk_size):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    media.CHUNK_SIZE, previous = chunk_size, media.CHUNK_SIZE
+    try:
+        response = media.MappedFileResponse(
+            storage.path_for("images/ab/sample.jpg"), 10, 3000, 206, {}, send_body=True
+        )
+        asyncio.run(response({"type": "http", "extensions": extensions}, receive, send))
+    finally:
+        media.CHUNK_SIZE = previous
+    return messages
+
+
+def test_bodies_are_slices_of_a_mapping():
+    messages = run_response({}, chunk_size=1024)
+    bodies = [message for message in messages if message["type"] == "http.response.body"]
+    assert len(bodies) == 3
+    assert all(isinstance(body["body"], memoryview) for body in bodies)
+    assert [body["more_body"] for body in bodies] == [True, True, False]
+    assert b"".join(bytes(body["body"]) for body in bodies) == DATA[10:3010]
+
+
+def test_zerocopy_extension_gets_the_file():
+    messages = run_response({"http.response.zerocopy": {}}, chunk_size=1024)
+    zerocopy = messages[-1]
+    assert zerocopy["type"] == "http.response.zerocopy"
+    assert (zerocopy["offset"], zerocopy["count"]) == (10, 3000)
+    assert zerocopy["file"].name == storage.path_for("images/ab/sample.jpg")
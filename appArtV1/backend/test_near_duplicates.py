@@ -0,0 +1,111 @@
+"""Near-duplicate artwork detection: image hashes, the vectorized hash index,
+the check on POST /artworks/ and the admin cluster listing.
+
+Run from the repository root: ``python -m pytest backend/test_near_duplicates.py``
+"""
+import io
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+
+from backend.app.database import SessionLocal
+from backend.app.models import User, UserRole
+from backend.app.utils import near_duplicates
+
+
+def make_admin(email):
+    db = SessionLocal()
+    try:
+        db.query(User).filter(User.email == email).update({"role": UserRole.ADMIN})
+        db.commit()
+    finally:
+        db.close()
+
+
+def artwork_image(seed):
+    """A blocky random picture, so it has structure for the hash to follow."""
+    blocks = np.random.default_rng(seed).integers(0, 256, (24, 32, 3), dtype=np.uint8)
+    return Image.fromarray(blocks).resize((640, 480), Image.NEAREST)
+
+
+def encoded(image, fmt="PNG", **options):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def repost(image):
+    """The kind of copy a re-post is: downscaled and recompressed."""
+    return encoded(image.resize((500, 375), Image.BILINEAR), "JPEG", quality=70)
+
+
+def publish(client, headers, data, content_type="image/png"):
+    url = client.post("/artworks/images", headers={**headers, "Content-Type": content_type}, content=data).json()["image_url"]
+    return client.post("/artworks/", headers=headers, json={
+        "title": "Piece", "description": None, "style_tags": None, "image_url": url
+    })
+
+
+def distance(first, second):
+    return int(near_duplicates.hamming(np.array([first], dtype=np.uint64), second)[0])
+
+
+def test_hash_survives_resizing_and_recompression():
+    original = artwork_image(1)
+    copy = Image.open(io.BytesIO(repost(original)))
+
+    assert distance(near_duplicates.dhash(original), near_duplicates.dhash(copy)) <= 6
+    assert distance(near_duplicates.dhash(original), near_duplicates.dhash(artwork_image(2))) > 16
+    assert near_duplicates.dhash(Image.new("RGB", (640, 480), (200, 30, 30))) is None
+
+
+def test_index_finds_close_hashes_and_tracks_removals():
+    index = near_duplicates.HashIndex()
+    for artwork_id, image_hash in [(1, 0), (2, 0b111), (3, -1), (4, 0b1)]:
+        index.upsert(SimpleNamespace(id=artwork_id, artist_id=10 * artwork_id, image_hash=image_hash))
+
+    assert index.near(0, max_distance=3) == [(1, 10, 0), (4, 40, 1), (2, 20, 3)]
+    assert index.near(near_duplicates.to_signed((1 << 64) - 2), max_distance=1) == [(3, 30, 1)]
+
+    index.remove(1)
+    index.upsert(SimpleNamespace(id=2, artist_id=20, image_hash=-1))
+    assert index.near(0, max_distance=3) == [(4, 40, 1)]
+    assert index.stats()["artworks"] == 3
+
+
+def test_reposting_another_artists_image_is_refused(client, register):
+    owner, thief = register("owner@example.com", "artist"), register("thief@example.com", "artist")
+    original = artwork_image(3)
+    first = publish(client, owner, encoded(original))
+    assert first.status_code == 200, first.text
+
+    stolen = publish(client, thief, repost(original), "image/jpeg")
+
+    assert stolen.status_code == 409
+    assert f"artwork {first.json()['id']}" in stolen.json()["detail"]
+    assert publish(client, thief, encoded(artwork_image(4))).status_code == 200
+
+
+def test_admin_lists_clusters_of_an_artists_own_near_duplicates(client, register):
+    artist, admin = register("series@example.com", "artist"), register("admin@example.com")
+    make_admin("admin@example.com")
+    original = artwork_image(5)
+    first = publish(client, artist, encoded(original)).json()["id"]
+    second = publish(client, artist, repost(original), "image/jpeg").json()["id"]
+
+    response = client.get("/artworks/near-duplicates", headers=admin)
+
+    assert response.status_code == 200, response.text
+    assert [[artwork["id"] for artwork in cluster] for cluster in response.json()] == [[first, second]]
+    assert client.get("/artworks/near-duplicates", headers=artist).status_code == 403
+
+    db = SessionLocal()
+    try:
+        assert near_duplicates.rebuild_pairs(db) == 1
+        assert near_duplicates.clusters(db) == [[first, second]]
+    finally:
+        db.close()
+
+    assert client.delete(f"/artworks/{second}", headers=artist).status_code == 200
+    assert client.get("/artworks/near-duplicates", headers=admin).json() == []
@@ -0,0 +1,294 @@
+"""The /notifications/stream server-sent events endpoint: live delivery from the
+notification write paths, resume with Last-Event-ID, heartbeats, revocation
+and catching up after a slow client overflows its buffer.
+
+TestClient collects a whole response body before returning, so streams are
+driven through the ASGI app directly. Run from the repository root:
+``python -m pytest backend/test_notification_stream.py``
+"""
+import asyncio
+
+from sqlalchemy import func
+
+from backend.app.database import SessionLocal
+from backend.app.main import app
+from backend.app.models import Notification, NotificationType, User
+from backend.app.routers import notifications as notifications_router
+from backend.app.utils import notification_stream
+from backend.app.utils.notification_stream import Subscriber, hub, notification_frame
+
+
+def create_request(client, headers, title):
+    response = client.post("/requests/", headers=headers, json={
+        "title": title, "description": "A portrait", "dimensions_width": None,
+        "dimensions_height": None, "style": None, "deadline": None,
+    })
+    return response.json()["id"]
+
+
+class Stream:
+    """An open GET /notifications/stream, parsed into SSE events."""
+
+    def __init__(self, headers, last_event_id=None):
+        headers = dict(headers)
+        if last_event_id is not None:
+            headers["Last-Event-ID"] = str(last_event_id)
+        self.scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": "/notifications/stream", "raw_path": b"/notifications/stream",
+            "query_string": b"", "root_path": "", "client": ("test", 1), "server": ("test", 80),
+            "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        }
+        self.messages = asyncio.Queue()
+        self.disconnected = asyncio.Event()
+        self.buffer = ""
+        self.finished = False
+
+    async def __aenter__(self):
+        async def receive():
+            await self.disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        self.task = asyncio.create_task(app(self.scope, receive, self.messages.put))
+        self.start = await asyncio.wait_for(self.messages.get(), 5)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.disconnected.set()
+        await asyncio.wait_for(self.task, 5)
+
+    async def event(self, timeout=5):
+        while "\n\n" not in self.buffer:
+            if self.finished:
+                return None
+            message = await asyncio.wait_for(self.messages.get(), timeout)
+            self.buffer += bytes(message.get("body", b"")).decode()
+            self.finished = not message.get("more_body", False)
+        block, self.buffer = self.buffer.split("\n\n", 1)
+        event = {}
+        for line in block.split("\n"):
+            name, _, value = line.partition(": ") if not line.startswith(":") else ("comment", "", line[2:])
+            event[name] = value
+        return event
+
+    async def next_of(self, kind, timeout=5):
+        while True:
+            event = await self.event(timeout)
+            if event is None or event.get("event") == kind:
+                return event
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_live_events_and_resume(client, register, artist_headers):
+    customer = register("customer@example.com", "customer")
+    artist = artist_headers("artist@example.com")
+    create_request(client, customer, "First")
+
+    async def scenario():
+        async with Stream(artist) as stream:
+            assert stream.start["status"] == 200
+            assert dict(stream.start["headers"])[b"content-type"].startswith(b"text/event-stream")
+            assert (await stream.event())["retry"] == "3000"
+            assert (await stream.event())["data"] == '{"unread_count": 1}'
+
+            # Fan-out runs on the threadpool of another loop; it still arrives
+            request_id = await asyncio.to_thread(create_request, client, customer, "Second")
+            event = await stream.next_of("notification")
+            assert '"title":"New Art Request"' in event["data"]
+            assert '"message":"New request: Second"' in event["data"]
+            seen = int(event["id"])
+
+            async with Stream(customer) as customer_stream:
+                await customer_stream.next_of("unread")
+                await asyncio.to_thread(client.post, f"/offers/request/{request_id}", headers=artist,
+                                        json={"price": 100, "delivery_days": 5, "message": None})
+                event = await customer_stream.next_of("notification")
+                assert '"type":"new_offer"' in event["data"]
+
+            await asyncio.to_thread(client.put, f"/notifications/{seen}/read", headers=artist)
+            assert (await stream.next_of("unread"))["data"] == '{"unread_count": 1}'
+            assert hub.stats()["connections"] == 1
+        assert hub.stats()["connections"] == 0
+
+        # Missed while disconnected, replayed after Last-Event-ID
+        await asyncio.to_thread(create_request, client, customer, "Third")
+        async with Stream(artist, last_event_id=seen) as stream:
+            await stream.event()
+            event = await stream.next_of("notification")
+            assert int(event["id"]) > seen
+            assert "Third" in event["data"]
+            assert (await stream.event())["event"] == "unread"
+
+    run(scenario())
+
+
+def test_heartbeats_and_revoked_sessions_end_the_stream(client, register):
+    headers = register("listener@example.com", "customer")
+    hub.heartbeat_interval = 0.05
+
+    async def scenario():
+        async with Stream(headers) as stream:
+            await stream.next_of("unread")
+            assert (await stream.event())["comment"] == "heartbeat"
+            await asyncio.to_thread(client.post, "/auth/logout", headers=headers)
+            while (await stream.event()) is not None:
+                pass
+            assert stream.finished
+
+    try:
+        run(scenario())
+    finally:
+        hub.heartbeat_interval = notification_stream.STREAM_HEARTBEAT_INTERVAL
+
+
+def test_slow_client_catches_up_from_the_database(register, monkeypatch):
+    headers = register("slow@example.com", "customer")
+    db = SessionLocal()
+    try:
+        user_id = db.query(User.id).filter(User.email == "slow@example.com").scalar()
+    finally:
+        db.close()
+
+    async def scenario():
+        async with Stream(headers) as stream:
+            await stream.next_of("unread")
+            monkeypatch.setattr(notification_stream, "STREAM_BUFFER", 1)
+            db = SessionLocal()
+            try:
+                rows = [Notification(user_id=user_id, type=NotificationType.NEW_OFFER, title=f"Offer {i}",
+                                     message="New offer") for i in range(3)]
+                db.add_all(rows)
+                db.commit()
+                # Published back to back before the stream runs: it overflows
+                for row in rows:
+                    db.refresh(row)
+                    hub.publish(user_id, notification_frame(row), row.id)
+            finally:
+                db.close()
+            titles = [(await stream.next_of("notification"))["data"] for _ in range(3)]
+            assert [f'"title":"Offer {i}"' in title for i, title in enumerate(titles)] == [True] * 3
+            assert hub.stats()["overflows"] >= 1
+
+    run(scenario())
+
+
+def test_poll_binds_listeners_in_chunks(register, monkeypatch):
+    monkeypatch.setattr(notification_stream, "_watermarks", notification_stream.deque())
+    monkeypatch.setattr(notification_stream, "_published", set())
+    monkeypatch.setattr(notification_stream, "LISTENER_CHUNK", 1)
+    listeners = [register(f"chunk{i}@example.com", "customer") for i in range(3)]
+    db = SessionLocal()
+    try:
+        user_ids = [db.query(User.id).filter(User.email == f"chunk{i}@example.com").scalar() for i in range(3)]
+    finally:
+        db.close()
+
+    def poll():
+        db = SessionLocal()
+        try:
+            return notification_stream.poll_new(db)
+        finally:
+            db.close()
+
+    async def scenario():
+        async with Stream(listeners[0]) as first, Stream(listeners[1]) as second, Stream(listeners[2]) as third:
+            streams = [first, second, third]
+            for stream in streams:
+                await stream.next_of("unread")
+            poll()
+            db = SessionLocal()
+            try:
+                db.add_all([Notification(user_id=user_id, type=NotificationType.NEW_OFFER, title="Chunked",
+                                         message="New offer") for user_id in user_ids])
+                db.commit()
+            finally:
+                db.close()
+            assert poll() == 3
+            for stream in streams:
+                assert '"title":"Chunked"' in (await stream.next_of("notification"))["data"]
+
+    run(scenario())
+
+
+def test_resume_from_an_old_id_replays_only_the_newest(register, monkeypatch):
+    headers = register("returning@example.com", "customer")
+    db = SessionLocal()
+    try:
+        user_id = db.query(User.id).filter(User.email == "returning@example.com").scalar()
+        db.add_all([Notification(user_id=user_id, type=NotificationType.NEW_OFFER, title=f"Offer {i}",
+                                 message="New offer") for i in range(4)])
+        db.commit()
+    finally:
+        db.close()
+    monkeypatch.setattr(notifications_router, "STREAM_BUFFER", 2)
+
+    async def scenario():
+        async with Stream(headers, last_event_id=0) as stream:
+            assert (await stream.event())["retry"] == "3000"
+            assert (await stream.event())["event"] == "resync"
+            replayed = [(await stream.event())["data"] for _ in range(2)]
+            assert ['"title":"Offer 2"' in replayed[0], '"title":"Offer 3"' in replayed[1]] == [True, True]
+            assert (await stream.event())["event"] == "unread"
+
+    run(scenario())
+
+
+def test_subscriber_buffer_overflow():
+    subscriber = Subscriber(1)
+    for event_id in range(notification_stream.STREAM_BUFFER):
+        subscriber.push(event_id, b"frame")
+    assert not subscriber.overflowed
+    subscriber.push(99, b"frame")
+    assert subscriber.overflowed and not subscriber.frames
+
+
+def test_poll_delivers_ids_that_commit_late(register, monkeypatch):
+    headers = register("late@example.com", "customer")
+    db = SessionLocal()
+    try:
+        user_id = db.query(User.id).filter(User.email == "late@example.com").scalar()
+    finally:
+        db.close()
+    monkeypatch.setattr(notification_stream, "_watermarks", notification_stream.deque())
+    monkeypatch.setattr(notification_stream, "_published", set())
+
+    def poll():
+        db = SessionLocal()
+        try:
+            return notification_stream.poll_new(db)
+        finally:
+            db.close()
+
+    def insert(row_id, title):
+        # Written straight to the database, as by another worker
+        db = SessionLocal()
+        try:
+            db.add(Notification(id=row_id, user_id=user_id, type=NotificationType.NEW_OFFER,
+                                title=title, message="New offer"))
+            db.commit()
+        finally:
+            db.close()
+
+    async def scenario():
+        async with Stream(headers) as stream:
+            await stream.next_of("unread")
+            assert poll() == 0
+            db = SessionLocal()
+            try:
+                newest = db.query(func.max(Notification.id)).scalar() or 0
+            finally:
+                db.close()
+            # The higher id commits first and is polled before the lower one exists
+            insert(newest + 2, "Second")
+            assert poll() == 1
+            assert '"title":"Second"' in (await stream.next_of("notification"))["data"]
+            insert(newest + 1, "First")
+            assert poll() == 1
+            event = await stream.next_of("notification")
+            assert event["id"] == str(newest + 1) and '"title":"First"' in event["data"]
+            assert poll() == 0
+
+    run(scenario())
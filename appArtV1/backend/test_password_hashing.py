@@ -0,0 +1,98 @@
+"""Password hashing in its own process pool: transparent rehashing on login,
+backpressure when the queue is full and the /password-stats metrics.
+
+Run from the repository root: ``python -m pytest backend/test_password_hashing.py``
+"""
+from passlib.hash import pbkdf2_sha256
+
+from backend.app.database import SessionLocal
+from backend.app.models import User
+from backend.app.schemas import UserRole
+from backend.app.utils.auth import PASSWORD_HASH_ROUNDS
+from backend.app.utils.passwords import password_hasher
+
+
+def stored_hash(email):
+    db = SessionLocal()
+    try:
+        return db.query(User).filter(User.email == email).one().hashed_password
+    finally:
+        db.close()
+
+
+def test_register_and_login(client, register):
+    register("painter@example.com", "artist")
+    assert pbkdf2_sha256.from_string(stored_hash("painter@example.com")).rounds == PASSWORD_HASH_ROUNDS
+
+    response = client.post("/auth/login", json={"email": "painter@example.com", "password": "secret"})
+    assert response.status_code == 200
+    assert response.json()["access_token"]
+
+    response = client.post("/auth/login", json={"email": "painter@example.com", "password": "wrong"})
+    assert response.status_code == 401
+    response = client.post("/auth/login", json={"email": "nobody@example.com", "password": "secret"})
+    assert response.status_code == 401
+
+
+def test_login_rehashes_outdated_hashes(client, register):
+    register("legacy@example.com")
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == "legacy@example.com").one()
+        user.hashed_password = pbkdf2_sha256.using(rounds=1000).hash("secret")
+        db.commit()
+    finally:
+        db.close()
+
+    # A failed attempt leaves the hash alone
+    assert client.post("/auth/login", json={"email": "legacy@example.com", "password": "wrong"}).status_code == 401
+    assert pbkdf2_sha256.from_string(stored_hash("legacy@example.com")).rounds == 1000
+
+    assert client.post("/auth/login", json={"email": "legacy@example.com", "password": "secret"}).status_code == 200
+    upgraded = stored_hash("legacy@example.com")
+    assert pbkdf2_sha256.from_string(upgraded).rounds == PASSWORD_HASH_ROUNDS
+    assert pbkdf2_sha256.verify("secret", upgraded)
+
+
+def test_full_queue_rejects_with_retry_after(client, register):
+    register("burst@example.com")
+    password_hasher.pending = password_hasher.max_pending
+    try:
+        response = client.post("/auth/login", json={"email": "burst@example.com", "password": "secret"})
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+        response = client.post("/auth/register", json={
+            "email": "late@example.com", "password": "secret", "name": "late", "role": "customer"
+        })
+        assert response.status_code == 503
+    finally:
+        password_hasher.pending = 0
+    assert client.post("/auth/login", json={"email": "burst@example.com", "password": "secret"}).status_code == 200
+
+
+def test_password_stats_for_admins(client, register):
+    headers = register("stats-admin@example.com")
+    db = SessionLocal()
+    try:
+        db.query(User).filter(User.email == "stats-admin@example.com").update({"role": UserRole.ADMIN})
+        db.commit()
+    finally:
+        db.close()
+
+    assert client.get("/password-stats", headers=register("visitor@example.com")).status_code == 403
+    stats = client.get("/password-stats", headers=headers).json()
+    assert stats["workers"] == 1
+    assert stats["queued"] == 0 and stats["running"] == 0
+    assert stats["hashed"] >= 1 and stats["verified"] >= 1 and stats["rejected"] >= 2
+    assert stats["latency"]["p95_ms"] > 0
+
+
+def test_pool_is_replaced_after_a_worker_dies(client, register):
+    register("survivor@example.com")
+    for process in list(password_hasher._pool._executor._processes.values()):
+        process.kill()
+        process.join()
+
+    response = client.post("/auth/login", json={"email": "survivor@example.com", "password": "secret"})
+    assert response.status_code == 200
+    assert password_hasher.stats()["pool_restarts"] == 1
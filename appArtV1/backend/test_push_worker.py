@@ -0,0 +1,134 @@
+"""Push worker delivery against FakePushGateway: retries, pruning, durable state.
+
+Run from the repository root: ``python -m pytest backend/test_push_worker.py``
+"""
+import asyncio
+from sqlalchemy import func, select
+
+from backend.app.database import Base, SessionLocal, engine
+from backend.app.models import DeviceToken, Notification, NotificationType, PushCursor, PushFailure, User
+from backend.app.utils.push import FakePushGateway, PushWorker, SendStatus
+
+Base.metadata.create_all(bind=engine)
+
+
+class FlakyGateway(FakePushGateway):
+    """Fails every message transiently for the first ``failures`` attempts."""
+
+    def __init__(self, failures: int):
+        super().__init__(latency=0)
+        self.failures = failures
+        self.calls = 0
+
+    async def send_batch(self, provider, messages):
+        self.calls += 1
+        if self.calls <= self.failures:
+            return [SendStatus.RETRY] * len(messages)
+        return await super().send_batch(provider, messages)
+
+
+def seed(email, tokens, notifications=1):
+    db = SessionLocal()
+    try:
+        user = User(email=email, name="Push", hashed_password="x")
+        db.add(user)
+        db.flush()
+        db.add_all(DeviceToken(user_id=user.id, token=token, device_type="ios") for token in tokens)
+        db.add_all(
+            Notification(user_id=user.id, type=NotificationType.NEW_OFFER, title="Offer", message="New offer")
+            for _ in range(notifications)
+        )
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def make_worker(gateway, name, **options):
+    # Each test uses its own cursor, positioned just before its own rows, so
+    # the worker's start marks every earlier row as pushed
+    db = SessionLocal()
+    try:
+        start = db.scalar(select(func.max(Notification.id))) or 0
+        db.merge(PushCursor(name=name, last_notification_id=start))
+        db.commit()
+    finally:
+        db.close()
+    return PushWorker(gateway, base_backoff=0, cursor_name=name, **options)
+
+
+async def start_and_drain(worker):
+    # start() loads the stored position; drain with run_once instead of polling
+    await worker.start()
+    await worker.stop()
+    while await worker.run_once():
+        pass
+
+
+def scalar(statement):
+    db = SessionLocal()
+    try:
+        return db.scalar(statement)
+    finally:
+        db.close()
+
+
+def test_retries_then_delivers_and_prunes_invalid_tokens():
+    gateway = FlakyGateway(failures=2)
+    worker = make_worker(gateway, "test-retry", max_attempts=5)
+    user_id = seed("retry@example.com", ["good-token", "invalid:gone"])
+
+    asyncio.run(start_and_drain(worker))
+
+    assert [message.token for message in gateway.sent] == ["good-token"]
+    assert worker.counters["retried"] == 4  # both messages, two failed attempts
+    assert worker.counters["pruned"] == 1
+    assert scalar(select(func.count(DeviceToken.id)).where(DeviceToken.user_id == user_id)) == 1
+    assert scalar(select(func.count(Notification.id)).where(Notification.pushed_at.is_(None))) == 0
+
+
+def test_exhausted_retries_are_recorded_and_position_survives_restart():
+    worker = make_worker(FlakyGateway(failures=100), "test-exhausted", max_attempts=3)
+    seed("exhausted@example.com", ["flaky-token"], notifications=2)
+
+    asyncio.run(start_and_drain(worker))
+
+    failures = scalar(select(func.count(PushFailure.id)).where(PushFailure.token == "flaky-token"))
+    assert failures == 2
+    assert scalar(select(func.max(PushFailure.attempts)).where(PushFailure.token == "flaky-token")) == 3
+
+    # A new worker resumes from the stored position and only sees new rows
+    seed("later@example.com", ["later-token"])
+    gateway = FakePushGateway(latency=0)
+    restarted = PushWorker(gateway, base_backoff=0, cursor_name="test-exhausted")
+    asyncio.run(start_and_drain(restarted))
+    assert [message.token for message in gateway.sent] == ["later-token"]
+
+
+def test_rows_committed_out_of_id_order_are_still_delivered():
+    worker = make_worker(FakePushGateway(latency=0), "test-order")
+    user_id = seed("order@example.com", ["order-token"], notifications=2)
+    db = SessionLocal()
+    try:
+        # Hold back the lower id, as if its transaction were still running
+        first, second = db.scalars(select(Notification).where(Notification.user_id == user_id)
+                                   .order_by(Notification.id)).all()
+        late = {column.name: getattr(first, column.name) for column in Notification.__table__.columns}
+        second_id = second.id
+        db.delete(first)
+        db.commit()
+    finally:
+        db.close()
+
+    asyncio.run(start_and_drain(worker))
+    assert [message.data["notification_id"] for message in worker.gateway.sent] == [second_id]
+
+    # The lower id commits after the higher one was pushed
+    db = SessionLocal()
+    try:
+        db.add(Notification(**late))
+        db.commit()
+    finally:
+        db.close()
+    asyncio.run(start_and_drain(worker))
+    assert [message.data["notification_id"] for message in worker.gateway.sent] == [second_id, late["id"]]
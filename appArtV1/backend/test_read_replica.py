@@ -0,0 +1,119 @@
+"""Replica routing with two SQLite files standing in for primary and replica.
+
+"Replication" is an explicit snapshot of the primary into the replica file, so
+the test controls the lag. Runs in a child interpreter because the database
+layer reads its settings at import time. Run from the repository root:
+``python -m pytest backend/test_read_replica.py``
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+STICKY_SECONDS = 1.0
+
+
+def test_replica_reads_with_read_your_writes():
+    directory = tempfile.mkdtemp()
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{directory}/primary.db",
+        "REPLICA_DATABASE_URL": f"sqlite:///{directory}/replica.db",
+        "REPLICA_STICKY_SECONDS": str(STICKY_SECONDS),
+    }
+    for name in ("ASYNC_DATABASE_URL", "ASYNC_REPLICA_DATABASE_URL", "SQLITE_PRODUCTION"):
+        env.pop(name, None)
+    result = subprocess.run(
+        [sys.executable, "-m", "backend.test_read_replica", directory],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+
+
+
+def test_cursor_bound_follows_the_executing_bind():
+    # A replica (or any session) may use another dialect than the primary:
+    # the cursor's timestamp is rendered for the engine the page is read from
+    from datetime import datetime
+    from types import SimpleNamespace
+    from sqlalchemy import column, select, table
+    from sqlalchemy.dialects import postgresql, sqlite
+    from backend.app.utils.pagination import encode_cursor, keyset_query
+
+    artworks = table("artworks", column("id"), column("created_at"))
+    cursor = encode_cursor(datetime(2024, 5, 1, 12, 30), 7)
+    for dialect, expected in ((sqlite.dialect(), "2024-05-01 12:30:00"), (postgresql.dialect(), datetime(2024, 5, 1, 12, 30))):
+        statement = keyset_query(select(artworks), artworks.c, cursor, 10, SimpleNamespace(dialect=dialect))
+        assert expected in statement.compile(dialect=dialect).params.values()
+
+def run_scenario(directory):
+    import sqlite3
+    from fastapi.testclient import TestClient
+    from backend.app.database import reads_from_primary
+    from backend.app.main import app
+
+    def replicate():
+        with sqlite3.connect(f"{directory}/primary.db") as primary, \
+                sqlite3.connect(f"{directory}/replica.db") as replica:
+            primary.backup(replica)
+
+    def replica_count(table):
+        with sqlite3.connect(f"{directory}/replica.db") as replica:
+            return replica.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    with TestClient(app) as client:
+        def register(email, role):
+            response = client.post("/auth/register", json={
+                "email": email, "password": "secret", "name": email.split("@")[0], "role": role
+            })
+            return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        def add_artwork(headers, i):
+            response = client.post("/artworks/", headers=headers, json={
+                "title": f"Work {i}", "description": None, "style_tags": None, "image_url": "https://example.com/w.jpg"
+            })
+            assert response.status_code == 200, response.text
+            return response.json()
+
+        artist = register("artist@example.com", "artist")
+        client.put("/users/me", headers=artist, json={"bio": "Painter", "profile_picture_url": "https://example.com/me.jpg"})
+        artist_id = client.get("/users/me", headers=artist).json()["id"]
+        for i in range(3):
+            add_artwork(artist, i)
+        customer = register("customer@example.com", "customer")
+        request_id = client.post("/requests/", headers=customer, json={
+            "title": "Portrait", "description": "A portrait", "dimensions_width": None,
+            "dimensions_height": None, "style": None, "deadline": None, "reference_images": [],
+        }).json()["id"]
+        replicate()
+        time.sleep(STICKY_SECONDS)
+
+        # Writes only ever reach the primary
+        add_artwork(artist, 3)
+        client.post(f"/offers/request/{request_id}", headers=artist, json={
+            "price": 100, "delivery_days": 5, "message": None
+        })
+        assert replica_count("artworks") == 3
+
+        # The writer reads its own writes; everyone else reads the lagging replica
+        assert len(client.get(f"/artworks/artist/{artist_id}", headers=artist).json()) == 4
+        assert len(client.get(f"/artworks/artist/{artist_id}", headers=customer).json()) == 3
+        assert len(client.get("/artworks/feed").json()) == 3
+        assert client.get("/notifications/", headers=customer).json() == []
+        assert client.get("/users/search", headers=customer, params={"q": "artist"}).json()[0]["id"] == artist_id
+
+        # Once the replica catches up, it serves the new rows
+        replicate()
+        assert len(client.get("/notifications/", headers=customer).json()) == 1
+
+        # The sticky window is per user and expires
+        assert reads_from_primary("artist@example.com")
+        time.sleep(STICKY_SECONDS)
+        assert not reads_from_primary("artist@example.com")
+
+
+if __name__ == "__main__":
+    run_scenario(sys.argv[1])
@@ -0,0 +1,81 @@
+"""Query-count regression test for the requests router.
+
+Run from the repository root: ``python -m pytest backend/test_request_queries.py``
+"""
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from backend.app.database import engine, async_engine
+
+
+# requests page + grouped offer counts + reference images; the user itself
+# comes from the principal cache warmed by the preceding requests
+EXPECTED_QUERIES = 3
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engines = [engine, async_engine.sync_engine]
+    for target in engines:
+        event.listen(target, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for target in engines:
+            event.remove(target, "before_cursor_execute", before_cursor_execute)
+
+
+def create_requests(client, headers, count):
+    for i in range(count):
+        response = client.post("/requests/", headers=headers, json={
+            "title": f"Request {i}", "description": "A portrait",
+            "dimensions_width": None, "dimensions_height": None, "style": None, "deadline": None,
+            "reference_images": [f"https://example.com/{i}-a.jpg", f"https://example.com/{i}-b.jpg"],
+        })
+        assert response.status_code == 200, response.text
+
+
+def test_request_lists_use_fixed_number_of_queries(client, register, artist_headers):
+    customer = register("customer@example.com", "customer")
+    artist = artist_headers("artist@example.com")
+    create_requests(client, customer, 2)
+
+    with count_queries() as small:
+        small_page = client.get("/requests/my-requests", headers=customer).json()
+
+    create_requests(client, customer, 30)
+    client.post(f"/offers/request/{small_page[0]['id']}", headers=artist, json={
+        "price": 100, "delivery_days": 5, "message": None
+    })
+
+    with count_queries() as large:
+        large_page = client.get("/requests/my-requests", headers=customer).json()
+    with count_queries() as open_requests:
+        open_page = client.get("/requests/open", headers=artist).json()
+
+    assert len(small_page) == 2 and len(large_page) == 32 and len(open_page) == 32
+    assert len(small) == len(large) == len(open_requests) == EXPECTED_QUERIES
+    offers_count = {request["id"]: request["offers_count"] for request in large_page}
+    assert offers_count[small_page[0]["id"]] == 1
+    assert all(len(request["reference_images"]) == 2 for request in open_page)
+
+
+def test_request_detail_uses_fixed_number_of_queries(client, register):
+    customer = register("detail@example.com", "customer")
+    create_requests(client, customer, 1)
+    request_id = client.get("/requests/my-requests", headers=customer).json()[0]["id"]
+
+    with count_queries() as statements:
+        detail = client.get(f"/requests/{request_id}", headers=customer).json()
+
+    # request row + offer count + reference images
+    assert len(statements) == 3
+    assert detail["reference_images"] == [
+        "https://example.com/0-a.jpg", "https://example.com/0-b.jpg"
+    ]
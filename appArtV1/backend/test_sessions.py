@@ -0,0 +1,148 @@
+"""Session registry: token ids, refresh rotation, logout/revoke endpoints and
+the in-memory denylist that get_current_user checks without a database read.
+
+Run from the repository root: ``python -m pytest backend/test_sessions.py``
+"""
+import uuid
+from datetime import datetime
+
+from sqlalchemy import event
+
+from backend.app.database import SessionLocal, engine
+from backend.app.models import UserSession
+from backend.app.utils.auth import create_refresh_token, decode_token
+from backend.app.utils.sessions import BloomFilter, Denylist, denylist
+
+
+def sign_up(client, email):
+    response = client.post("/auth/register", json={
+        "email": email, "password": "secret", "name": email.split("@")[0], "role": "customer"
+    })
+    assert response.status_code == 200
+    return response.json()
+
+
+def login(client, email):
+    response = client.post("/auth/login", json={"email": email, "password": "secret"},
+                           headers={"User-Agent": "phone"})
+    assert response.status_code == 200
+    return response.json()
+
+
+def bearer(tokens):
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+
+def test_tokens_carry_session_and_token_ids(client):
+    tokens = sign_up(client, "ids@example.com")
+    access = decode_token(tokens["access_token"], "access")
+    refresh = decode_token(tokens["refresh_token"], "refresh")
+    assert access["sid"] == refresh["sid"]
+    assert access["jti"] != refresh["jti"]
+    assert decode_token(login(client, "ids@example.com")["access_token"], "access")["sid"] != access["sid"]
+
+
+def test_logout_revokes_the_session_only(client):
+    sign_up(client, "logout@example.com")
+    first, second = login(client, "logout@example.com"), login(client, "logout@example.com")
+    assert client.get("/users/me", headers=bearer(first)).status_code == 200
+
+    assert client.post("/auth/logout", headers=bearer(first)).status_code == 200
+    assert client.get("/users/me", headers=bearer(first)).status_code == 401
+    assert client.post("/auth/refresh", json={"refresh_token": first["refresh_token"]}).status_code == 401
+    assert client.get("/users/me", headers=bearer(second)).status_code == 200
+
+
+def test_refresh_rotates_and_detects_reuse(client):
+    tokens = sign_up(client, "rotate@example.com")
+    response = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    rotated = response.json()
+    assert decode_token(rotated["refresh_token"], "refresh")["sid"] == decode_token(tokens["refresh_token"], "refresh")["sid"]
+
+    # Replaying the old refresh token ends the session, new tokens included
+    assert client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+    assert client.get("/users/me", headers=bearer(rotated)).status_code == 401
+    assert client.post("/auth/refresh", json={"refresh_token": rotated["refresh_token"]}).status_code == 401
+
+
+def test_refresh_tokens_without_a_session_are_rejected(client):
+    sign_up(client, "legacy@example.com")
+    legacy = create_refresh_token(data={"sub": "legacy@example.com"})
+    assert client.post("/auth/refresh", json={"refresh_token": legacy}).status_code == 401
+
+
+def test_list_and_revoke_sessions(client):
+    phone = sign_up(client, "many@example.com")
+    laptop = login(client, "many@example.com")
+    sessions = client.get("/auth/sessions", headers=bearer(laptop)).json()
+    assert len(sessions) == 2
+    assert [session["current"] for session in sessions].count(True) == 1
+    current = next(session for session in sessions if session["current"])
+    assert current["id"] == decode_token(laptop["access_token"], "access")["sid"]
+    assert current["user_agent"] == "phone"
+
+    other = next(session for session in sessions if not session["current"])
+    assert client.delete(f"/auth/sessions/{other['id']}", headers=bearer(laptop)).status_code == 200
+    assert client.get("/users/me", headers=bearer(phone)).status_code == 401
+    assert client.delete(f"/auth/sessions/{other['id']}", headers=bearer(laptop)).status_code == 404
+
+    # Another user's session cannot be revoked
+    stranger = sign_up(client, "stranger@example.com")
+    assert client.delete(f"/auth/sessions/{current['id']}", headers=bearer(stranger)).status_code == 404
+
+    login(client, "many@example.com")
+    response = client.delete("/auth/sessions", headers=bearer(laptop))
+    assert response.json()["revoked"] == 2
+    assert client.get("/users/me", headers=bearer(laptop)).status_code == 401
+
+
+def test_revocation_check_does_no_database_io(client):
+    tokens = sign_up(client, "hot@example.com")
+    client.get("/users/me", headers=bearer(tokens))
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        assert client.get("/users/me", headers=bearer(tokens)).status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert not [statement for statement in statements if "user_sessions" in statement]
+
+
+def test_denylist_syncs_from_the_database(client):
+    tokens = sign_up(client, "elsewhere@example.com")
+    sid = decode_token(tokens["access_token"], "access")["sid"]
+    # Revoked through another worker: only the database knows
+    db = SessionLocal()
+    try:
+        db.query(UserSession).filter(UserSession.id == sid).update({"revoked_at": datetime.utcnow()})
+        db.commit()
+        assert client.get("/users/me", headers=bearer(tokens)).status_code == 200
+        denylist.load(db)
+    finally:
+        db.close()
+    assert client.get("/users/me", headers=bearer(tokens)).status_code == 401
+
+
+def test_denylist_keeps_recent_local_revocations_across_reloads():
+    local = Denylist()
+    local.add("abc")
+    db = SessionLocal()
+    try:
+        local.load(db)
+    finally:
+        db.close()
+    assert local.is_revoked("abc")
+    assert not local.is_revoked("def")
+    assert not local.is_revoked(None)
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(1000)
+    keys = [uuid.uuid4().hex for _ in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(uuid.uuid4().hex in bloom for _ in range(10000))
+    assert false_positives < 300
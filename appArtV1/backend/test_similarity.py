@@ -0,0 +1,74 @@
+"""MinHash/LSH similar-artworks index and the /artworks/{id}/similar endpoint.
+
+Run from the repository root: ``python -m pytest backend/test_similarity.py``
+"""
+from types import SimpleNamespace
+
+from backend.app.utils import similarity
+from backend.app.utils.similarity import SimilarityIndex
+
+
+def artwork(artwork_id, title, description=None, style_tags=None):
+    return SimpleNamespace(id=artwork_id, title=title, description=description, style_tags=style_tags)
+
+
+def test_features_normalize_tags_and_words():
+    assert similarity.features("The Blue Harbor", "at dawn", "Watercolor, seascape") == {
+        "tag:watercolor", "tag:seascape", "word:blue", "word:harbor", "word:dawn"
+    }
+    assert similarity.features(None, None, " , ") == set()
+
+
+def test_signature_agreement_tracks_jaccard():
+    base = {f"word:w{i}" for i in range(40)}
+    close = (base - {"word:w0", "word:w1"}) | {"word:x0", "word:x1"}
+    far = {f"word:z{i}" for i in range(40)}
+    agreement = lambda a, b: (similarity.signature(a) == similarity.signature(b)).mean()
+
+    assert agreement(base, base) == 1.0
+    assert agreement(base, close) > 0.6
+    assert agreement(base, far) < 0.1
+
+
+def test_similar_ranks_by_shared_bands_and_follows_updates():
+    index = SimilarityIndex()
+    index.upsert(artwork(1, "Harbor at dawn", "Boats in the harbor", "watercolor, seascape"))
+    index.upsert(artwork(2, "Harbor at dusk", "Boats in the harbor", "watercolor, seascape"))
+    index.upsert(artwork(3, "City portrait", "A face in charcoal", "charcoal, portrait"))
+    index.upsert(artwork(4, None, None, None))
+
+    assert index.similar(1) == [2]
+    assert index.similar(3) == []
+    assert index.similar(4) == []
+
+    index.upsert(artwork(3, "Harbor at dawn", "Boats in the harbor", "watercolor, seascape"))
+    assert index.similar(1)[0] == 3
+    index.remove(3)
+    assert index.similar(1) == [2]
+    assert index.stats()["artworks"] == 2
+
+
+def create(client, headers, title, description, tags):
+    response = client.post("/artworks/", headers=headers, json={
+        "title": title, "description": description, "style_tags": tags, "image_url": "https://example.com/w.jpg"
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def test_endpoint_follows_artwork_writes(client, register):
+    headers = register("similar@example.com", "artist")
+    dawn = create(client, headers, "Harbor at dawn", "Boats in the harbor", "watercolor, seascape")
+    dusk = create(client, headers, "Harbor at dusk", "Boats in the harbor", "watercolor, seascape")
+    other = create(client, headers, "City portrait", "A face in charcoal", "charcoal, portrait")
+
+    similar = lambda artwork_id: [a["id"] for a in client.get(f"/artworks/{artwork_id}/similar").json()]
+    assert similar(dawn) == [dusk]
+
+    client.put(f"/artworks/{other}", headers=headers, json={
+        "title": "Harbor at dawn", "description": "Boats in the harbor", "style_tags": "watercolor, seascape"
+    })
+    assert similar(dawn)[0] == other
+    client.delete(f"/artworks/{other}", headers=headers)
+    assert similar(dawn) == [dusk]
+    assert client.get("/artworks/999999/similar").status_code == 404
@@ -0,0 +1,93 @@
+"""Concurrent write burst against the production SQLite profile.
+
+The database layer reads its settings at import time, so the burst runs in a
+child interpreter with ``SQLITE_PRODUCTION`` enabled rather than alongside the
+other test modules. Run from the repository root:
+``python -m pytest backend/test_sqlite_production.py``
+"""
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SYNC_WRITES = 40    # POST /artworks/ -> sync Session
+ASYNC_WRITES = 40   # POST /notifications/device-tokens -> AsyncSession
+REQUESTS = 10       # POST /requests/ -> AsyncSession + background sync fan-out
+
+
+def test_write_burst_serializes_sync_and_async_writers():
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tempfile.mkdtemp()}/test_sqlite_production.db",
+        "SQLITE_PRODUCTION": "true",
+        "SQLITE_WRITE_TIMEOUT": "30",
+    }
+    env.pop("ASYNC_DATABASE_URL", None)
+    # A hang here means pooled aiosqlite connections outlived the app
+    result = subprocess.run(
+        [sys.executable, "-m", "backend.test_sqlite_production"],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+
+
+def run_burst():
+    from fastapi.testclient import TestClient
+    from sqlalchemy import func, select, text
+
+    from backend.app.database import SQLITE_PRODUCTION, engine, read_engine
+    from backend.app.main import app
+    from backend.app.models import Artwork, DeviceToken, Notification, Request
+
+    assert SQLITE_PRODUCTION and read_engine is not engine
+
+    with TestClient(app) as client:
+        def register(email, role):
+            response = client.post("/auth/register", json={
+                "email": email, "password": "secret", "name": email.split("@")[0], "role": role
+            })
+            return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        artist = register("artist@example.com", "artist")
+        client.put("/users/me", headers=artist, json={"bio": "Painter", "profile_picture_url": "https://example.com/me.jpg"})
+        customer = register("customer@example.com", "customer")
+
+        def sync_write(i):
+            return client.post("/artworks/", headers=artist, json={
+                "title": f"Work {i}", "description": None, "style_tags": None, "image_url": "https://example.com/w.jpg"
+            })
+
+        def async_write(i):
+            return client.post("/notifications/device-tokens", headers=customer, json={
+                "token": f"token-{i}", "device_type": "ios"
+            })
+
+        def request_write(i):
+            return client.post("/requests/", headers=customer, json={
+                "title": f"Request {i}", "description": "A portrait", "dimensions_width": None,
+                "dimensions_height": None, "style": None, "deadline": None, "reference_images": [],
+            })
+
+        jobs = ([(sync_write, i) for i in range(SYNC_WRITES)]
+                + [(async_write, i) for i in range(ASYNC_WRITES)]
+                + [(request_write, i) for i in range(REQUESTS)])
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            responses = list(pool.map(lambda job: job[0](job[1]), jobs))
+
+    failed = [(r.status_code, r.text) for r in responses if r.status_code != 200]
+    assert not failed, failed
+
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.scalar(select(func.count(Artwork.id))) == SYNC_WRITES
+        assert conn.scalar(select(func.count(DeviceToken.id))) == ASYNC_WRITES
+        assert conn.scalar(select(func.count(Request.id))) == REQUESTS
+        # the artist is verified, so every request fanned out one notification
+        assert conn.scalar(select(func.count(Notification.id))) == REQUESTS
+
+
+if __name__ == "__main__":
+    run_burst()
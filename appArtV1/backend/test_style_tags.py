@@ -0,0 +1,78 @@
+"""Style-tag index maintenance and tag-filtered artwork search.
+
+Run from the repository root: ``python -m pytest backend/test_style_tags.py``
+"""
+from backend.app.database import SessionLocal
+from backend.app.models import ArtworkTag
+from backend.app.utils import style_tags
+
+
+def create_artwork(client, headers, title, tags):
+    response = client.post("/artworks/", headers=headers, json={
+        "title": title, "description": None, "style_tags": tags, "image_url": "https://example.com/w.jpg"
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def titles(client, params):
+    response = client.get("/artworks/search", params=params)
+    assert response.status_code == 200, response.text
+    return sorted(artwork["title"] for artwork in response.json())
+
+
+def test_parse_tags_normalizes_and_deduplicates():
+    assert style_tags.parse_tags(" Watercolor, ink,,watercolor ,PORTRAIT ") == ["watercolor", "ink", "portrait"]
+    assert style_tags.parse_tags(None) == []
+
+
+def test_search_any_and_all_follow_artwork_writes(client, register):
+    artist = register("tags@example.com", "artist")
+    lake = create_artwork(client, artist, "Lake", "Watercolor, Landscape")
+    create_artwork(client, artist, "Face", "watercolor,portrait")
+    doomed = create_artwork(client, artist, "Sketch", "ink, portrait")
+
+    assert titles(client, {"tags": "watercolor"}) == ["Face", "Lake"]
+    assert titles(client, {"tags": "landscape,portrait"}) == ["Face", "Lake", "Sketch"]
+    assert titles(client, {"tags": "Portrait, WATERCOLOR", "mode": "all"}) == ["Face"]
+
+    client.put(f"/artworks/{lake}", headers=artist, json={"title": "Lake", "description": None, "style_tags": "oil"})
+    client.delete(f"/artworks/{doomed}", headers=artist)
+
+    assert titles(client, {"tags": "watercolor"}) == ["Face"]
+    assert titles(client, {"tags": "oil"}) == ["Lake"]
+    assert titles(client, {"tags": "ink"}) == []
+    assert client.get("/artworks/search", params={"tags": "ink", "mode": "some"}).status_code == 400
+    assert client.get("/artworks/search", params={"tags": " , "}).status_code == 400
+
+
+def test_search_pages_with_cursor(client, register):
+    artist = register("pages@example.com", "artist")
+    for i in range(5):
+        create_artwork(client, artist, f"Mural {i}", "mural")
+
+    seen = []
+    params = {"tags": "mural", "limit": 2}
+    while True:
+        response = client.get("/artworks/search", params=params)
+        seen.extend(artwork["title"] for artwork in response.json())
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+
+    assert seen == [f"Mural {i}" for i in reversed(range(5))]
+
+
+def test_backfill_rebuilds_an_empty_index(client, register):
+    artist = register("backfill@example.com", "artist")
+    create_artwork(client, artist, "Old", "fresco")
+    db = SessionLocal()
+    try:
+        db.query(ArtworkTag).delete()
+        db.commit()
+        assert style_tags.backfill_tags(db) > 0
+        assert style_tags.backfill_tags(db) is None
+    finally:
+        db.close()
+
+    assert titles(client, {"tags": "fresco"}) == ["Old"]
@@ -0,0 +1,99 @@
+"""Maintained unread-notification counters: kept in step by the notification
+writes, read by /notifications/unread-count without counting rows, and
+repaired by reconcile_unread.
+
+Run from the repository root: ``python -m pytest backend/test_unread_counts.py``
+"""
+from sqlalchemy import event, func, select
+
+from backend.app.database import SessionLocal, async_engine
+from backend.app.models import Notification, User
+from backend.app.utils.notifications import reconcile_unread
+
+
+def unread(client, headers):
+    return client.get("/notifications/unread-count", headers=headers).json()["unread_count"]
+
+
+def counted(email):
+    db = SessionLocal()
+    try:
+        return db.scalar(select(func.count(Notification.id)).join(User, User.id == Notification.user_id).where(
+            User.email == email, Notification.is_read == False
+        ))
+    finally:
+        db.close()
+
+
+def test_counters_follow_notification_writes(client, register, artist_headers):
+    customer = register("customer@example.com", "customer")
+    first, second = artist_headers("first@example.com"), artist_headers("second@example.com")
+
+    response = client.post("/requests/", headers=customer, json={
+        "title": "Portrait", "description": "A portrait", "dimensions_width": None,
+        "dimensions_height": None, "style": None, "deadline": None,
+    })
+    request_id = response.json()["id"]
+    assert unread(client, first) == unread(client, second) == 1  # fan-out to eligible artists
+
+    offers = [
+        client.post(f"/offers/request/{request_id}", headers=artist, json={
+            "price": 100, "delivery_days": 5, "message": None
+        }).json()["id"]
+        for artist in (first, second)
+    ]
+    assert unread(client, customer) == 2
+
+    client.put(f"/requests/{request_id}/select-artist/{offers[0]}", headers=customer)
+    assert unread(client, first) == unread(client, second) == 2
+    for email, headers in (("customer@example.com", customer), ("first@example.com", first),
+                           ("second@example.com", second)):
+        assert unread(client, headers) == counted(email)
+
+    unread_only = client.get("/notifications/", headers=customer, params={"unread": True}).json()
+    assert len(unread_only) == 2
+    notification_id = unread_only[0]["id"]
+    assert client.put(f"/notifications/{notification_id}/read", headers=customer).status_code == 200
+    assert unread(client, customer) == 1
+    # Marking it again does not count it twice
+    assert client.put(f"/notifications/{notification_id}/read", headers=customer).status_code == 200
+    assert unread(client, customer) == 1
+    assert [n["id"] for n in client.get("/notifications/", headers=customer, params={"unread": True}).json()] \
+        == [unread_only[1]["id"]]
+    assert len(client.get("/notifications/", headers=customer).json()) == 2
+
+    # Someone else's notification is not found and changes nothing
+    assert client.put(f"/notifications/{notification_id}/read", headers=first).status_code == 404
+    assert unread(client, first) == 2
+
+    client.put("/notifications/mark-all-read", headers=first)
+    assert unread(client, first) == 0 == counted("first@example.com")
+    assert unread(client, second) == 2
+
+
+def test_badge_poll_does_not_count_notifications(client, register):
+    headers = register("poller@example.com", "customer")
+    unread(client, headers)
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", listener)
+    try:
+        assert unread(client, headers) == 0
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", listener)
+    assert len(statements) == 1
+    assert "from notifications" not in statements[0].lower()
+
+
+def test_reconcile_repairs_drift(client, register):
+    headers = register("drift@example.com", "customer")
+    db = SessionLocal()
+    try:
+        db.query(User).filter(User.email == "drift@example.com").update({"unread_notifications": 7})
+        db.commit()
+        assert unread(client, headers) == 7
+        assert reconcile_unread(db) == 1
+        assert reconcile_unread(db) == 0
+    finally:
+        db.close()
+    assert unread(client, headers) == 0
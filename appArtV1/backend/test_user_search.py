@@ -0,0 +1,94 @@
+"""Full-text user search: index maintenance, ranking and cursor paging.
+
+Run from the repository root: ``python -m pytest backend/test_user_search.py``
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+from backend.app.database import SessionLocal
+from backend.app.models import User
+from backend.app.utils import search
+from backend.app.utils.pagination import keyset_query
+
+
+def names(response):
+    assert response.status_code == 200, response.text
+    return [user["name"] for user in response.json()]
+
+
+def test_search_matches_prefixes_and_ranks_name_over_bio(client, register):
+    searcher = register("searcher@example.com", name="Searcher")
+    register("rosa@example.com", name="Rosa Marlowe", username="rosa_m")
+    painter = register("painter@example.com", name="Ink Painter", username="inkpainter")
+    client.put("/users/me", headers=painter, json={"bio": "Studied under Marlowe"})
+
+    assert names(client.get("/users/search", params={"q": "marl"}, headers=searcher)) == [
+        "Rosa Marlowe", "Ink Painter"
+    ]
+    assert names(client.get("/users/search", params={"q": "rosa_"}, headers=searcher)) == ["Rosa Marlowe"]
+    assert names(client.get("/users/search", params={"q": "ros mar"}, headers=searcher)) == ["Rosa Marlowe"]
+    assert names(client.get("/users/search", params={"q": "*\""}, headers=searcher)) == []
+
+
+def test_profile_updates_are_reindexed(client, register):
+    searcher = register("searcher2@example.com", name="Searcher Two")
+    renamed = register("renamed@example.com", name="Quentin Old")
+
+    client.put("/users/me", headers=renamed, json={"name": "Quentin Newname"})
+
+    assert names(client.get("/users/search", params={"q": "newname"}, headers=searcher)) == ["Quentin Newname"]
+    assert names(client.get("/users/search", params={"q": "quentin old"}, headers=searcher)) == []
+
+
+def test_search_pages_with_cursor(client, register):
+    searcher = register("searcher3@example.com", name="Searcher Three")
+    for i in range(5):
+        register(f"zephyr{i}@example.com", name=f"Zephyr {i}")
+
+    seen = []
+    params = {"q": "zephyr", "limit": 2}
+    while True:
+        response = client.get("/users/search", params=params, headers=searcher)
+        seen.extend(names(response))
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+
+    assert sorted(seen) == [f"Zephyr {i}" for i in range(5)]
+    assert client.get("/users/search", params={"q": "zephyr", "cursor": "bad"}, headers=searcher).status_code == 400
+
+
+def test_listing_without_a_query_reads_the_index_in_order():
+    db = SessionLocal()
+    try:
+        query = keyset_query(db.query(User).filter(User.id != 1), User, None, 10)
+        sql = str(query.statement.compile(db.get_bind(), compile_kwargs={"literal_binds": True}))
+        plan = " ".join(row[-1] for row in db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+    finally:
+        db.close()
+    assert "ix_users_created_at_id" in plan and "TEMP B-TREE" not in plan
+
+
+def test_rebuild_index_restores_rows(client, register):
+    register("rebuild@example.com", name="Xavier Rebuild")
+    db = SessionLocal()
+    try:
+        assert search.rebuild_index(db) == db.query(User).count()
+    finally:
+        db.close()
+    searcher = register("searcher4@example.com", name="Searcher Four")
+    assert names(client.get("/users/search", params={"q": "xavier"}, headers=searcher)) == ["Xavier Rebuild"]
+
+
+def test_rebuild_command_on_a_fresh_database():
+    # The API has never started against this database, so nothing created the index
+    environ = dict(os.environ, DATABASE_URL=f"sqlite:///{tempfile.mkdtemp()}/fresh.db")
+    result = subprocess.run(
+        [sys.executable, "-m", "backend.manage", "rebuild-search-index"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=environ, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    assert "Rebuilt user search index with 0 entries" in result.stdout
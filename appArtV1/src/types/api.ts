@@ -34,6 +34,7 @@ export interface Artwork {
   description?: string;
   image_url?: string | ImageSourcePropType;
   images?: ArtworkImages;
+  variants?: Record<string, string>;
   aspectRatio?: number;
   style_tags?: string;
   created_at: string;